@@ -3,8 +3,9 @@ Add Sample Products to Database
 Persian products for testing the shop
 """
 
+import os
 import sys
-sys.path.insert(0, '/home/user/Elnaz')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from backend.models import Product
 
@@ -0,0 +1,194 @@
+"""
+AI Response Cache
+Persistent cache of completion responses keyed on the normalised prompt,
+system prompt, history, model and token limit, with TTL and LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from .database import get_db
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Arabic code points commonly typed in Persian text, mapped to the Persian forms
+_PERSIAN_CHARACTERS = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', '\u200c': ' ',
+    '٠': '۰', '١': '۱', '٢': '۲', '٣': '۳', '٤': '۴', '٥': '۵', '٦': '۶', '٧': '۷', '٨': '۸', '٩': '۹',
+})
+
+
+def normalize_prompt(text):
+    """
+    Canonical form of prompt text for cache keys
+
+    Unicode NFKC, Persian/Arabic letter variants unified and whitespace
+    collapsed, so prompts that differ only in spacing or keyboard layout
+    share an entry.
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', str(text)).translate(_PERSIAN_CHARACTERS)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def cache_key(message, system_prompt, history, model, max_tokens):
+    """SHA-256 of everything that determines the completion"""
+    payload = json.dumps([
+        normalize_prompt(system_prompt),
+        [[entry.get('role'), normalize_prompt(entry.get('content'))] for entry in history or ()],
+        normalize_prompt(message),
+        model,
+        max_tokens,
+    ], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() not in ('0', 'false', 'no', 'off')
+
+
+class AIResponseCache:
+    """SQLite-backed response cache shared by all workers"""
+
+    def __init__(self):
+        # Settings are read from the environment on first use, like AIService
+        self._settings = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'enabled': _env_flag('AI_CACHE_ENABLED', '1'),
+                'ttl': int(os.getenv('AI_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+                'max_entries': int(os.getenv('AI_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                'max_bytes': int(os.getenv('AI_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (enabled, ttl, max_entries, max_bytes)"""
+        self.settings.update(settings)
+
+    @property
+    def enabled(self):
+        return self.settings['enabled']
+
+    def reset_stats(self):
+        """Zero the in-process counters"""
+        with self._lock:
+            self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'tokens_saved': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get(self, key):
+        """
+        Cached response for a key
+
+        Returns:
+            dict: The stored response, or None on a miss or expired entry
+        """
+        now = time.time()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT response, expires_at, tokens_used FROM ai_response_cache WHERE cache_key = ?', (key,))
+            row = cursor.fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            if row['expires_at'] < now:
+                cursor.execute('DELETE FROM ai_response_cache WHERE cache_key = ?', (key,))
+                self._count('expired')
+                self._count('misses')
+                return None
+            cursor.execute('''
+                UPDATE ai_response_cache SET hits = hits + 1, last_used_at = ?
+                WHERE cache_key = ?
+            ''', (now, key))
+
+        self._count('hits')
+        self._count('tokens_saved', row['tokens_used'] or 0)
+        return json.loads(row['response'])
+
+    def set(self, key, response):
+        """Store a successful response and evict entries over the size limits"""
+        settings = self.settings
+        payload = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO ai_response_cache
+                (cache_key, model, response, tokens_used, size_bytes, created_at, last_used_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, response.get('model'), payload, response.get('tokens_used', 0), len(payload.encode('utf-8')),
+                  now, now, now + settings['ttl']))
+            self._count('stores')
+            self._evict(cursor, now, settings)
+
+    def _evict(self, cursor, now, settings):
+        """Drop expired entries, then least recently used ones beyond max_entries / max_bytes"""
+        cursor.execute('DELETE FROM ai_response_cache WHERE expires_at < ?', (now,))
+        self._count('expired', cursor.rowcount)
+
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ai_response_cache')
+        entries, total_bytes = cursor.fetchone()
+        if entries <= settings['max_entries'] and total_bytes <= settings['max_bytes']:
+            return
+
+        cursor.execute('SELECT cache_key, size_bytes FROM ai_response_cache ORDER BY last_used_at ASC')
+        victims = []
+        for key, size in cursor.fetchall():
+            if entries <= settings['max_entries'] and total_bytes <= settings['max_bytes']:
+                break
+            victims.append((key,))
+            entries -= 1
+            total_bytes -= size
+        cursor.executemany('DELETE FROM ai_response_cache WHERE cache_key = ?', victims)
+        self._count('evictions', len(victims))
+
+    def clear(self):
+        """Remove every cached response"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM ai_response_cache')
+            return cursor.rowcount
+
+    def stats(self):
+        """Counters for this process plus what is currently stored"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(hits), 0)
+                FROM ai_response_cache
+            ''')
+            entries, total_bytes, stored_hits = cursor.fetchone()
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            **counters,
+            'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': total_bytes,
+            'lifetime_hits': stored_hits,
+            'settings': dict(self.settings),
+        }
+
+
+# Create singleton instance
+ai_cache = AIResponseCache()
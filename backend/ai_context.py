@@ -0,0 +1,333 @@
+"""
+AI Conversation Context
+Server-side chat sessions whose history is rebuilt from ai_conversations
+within a token budget; turns that fall out of the window are folded into a
+running summary
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from .database import get_db, dict_from_row
+
+# Tokens for summary + history sent with each message
+DEFAULT_CONTEXT_TOKENS = 2000
+
+# After a compaction the newest turns fill at most this share of the budget,
+# so the next few messages fit without summarising again
+DEFAULT_KEEP_RATIO = 0.5
+
+DEFAULT_SUMMARY_MAX_TOKENS = 300
+
+# Sessions whose composed context is kept in memory per process
+DEFAULT_CACHE_SESSIONS = 256
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a website administrator and an AI assistant. "
+    "Keep facts, decisions, names, numbers and open questions; drop pleasantries. "
+    "Answer in the language of the conversation."
+)
+
+_encoding = None
+_encoding_checked = False
+
+
+def _get_encoding():
+    """tiktoken encoding if the package (and its data) is available"""
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def estimate_tokens(text):
+    """
+    Token count of a text
+
+    Uses tiktoken when installed; otherwise about four ASCII characters per
+    token and two per token for other scripts (Persian text tokenises much
+    more densely than English).
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get('content')) + MESSAGE_OVERHEAD_TOKENS
+
+
+def trim_history(history, budget=None):
+    """Newest messages of a client-supplied history that fit in the token budget"""
+    if not history:
+        return []
+    budget = budget or ai_context.settings['context_tokens']
+    kept = []
+    used = 0
+    for message in reversed(history):
+        used += message_tokens(message)
+        if used > budget:
+            break
+        kept.append(message)
+    kept.reverse()
+    # Don't start the window with an orphaned assistant reply
+    while kept and kept[0].get('role') == 'assistant':
+        kept.pop(0)
+    return kept
+
+
+def _turn(row):
+    return {
+        'id': row['id'],
+        'message': row['message'],
+        'response': row['response'],
+        'tokens': estimate_tokens(row['message']) + estimate_tokens(row['response']) + 2 * MESSAGE_OVERHEAD_TOKENS,
+    }
+
+
+class ConversationContext:
+    """Builds the history for session chats and keeps it within budget"""
+
+    def __init__(self):
+        self._settings = None
+        self._lock = threading.Lock()
+        # session_id -> {'summary_upto', 'last_id', 'turns'}; turns after the summary, oldest first
+        self._cache = OrderedDict()
+        self.counters = {'builds': 0, 'cache_hits': 0, 'compactions': 0, 'summary_failures': 0}
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'context_tokens': int(os.getenv('AI_CONTEXT_TOKENS', DEFAULT_CONTEXT_TOKENS)),
+                'keep_ratio': float(os.getenv('AI_CONTEXT_KEEP_RATIO', DEFAULT_KEEP_RATIO)),
+                'summary_max_tokens': int(os.getenv('AI_SUMMARY_MAX_TOKENS', DEFAULT_SUMMARY_MAX_TOKENS)),
+                'cache_sessions': int(os.getenv('AI_CONTEXT_CACHE_SESSIONS', DEFAULT_CACHE_SESSIONS)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (context_tokens, keep_ratio, summary_max_tokens, cache_sessions)"""
+        self.settings.update(settings)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    # Sessions
+
+    def create_session(self, admin_id, title=None):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO ai_sessions (admin_id, title) VALUES (?, ?)', (admin_id, title))
+            session_id = cursor.lastrowid
+        return self.get_session(session_id, admin_id)
+
+    def get_session(self, session_id, admin_id=None):
+        """Session row (restricted to one admin when admin_id is given), or None"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if admin_id is None:
+                cursor.execute('SELECT * FROM ai_sessions WHERE id = ?', (session_id,))
+            else:
+                cursor.execute('SELECT * FROM ai_sessions WHERE id = ? AND admin_id = ?', (session_id, admin_id))
+            row = cursor.fetchone()
+            return dict_from_row(row) if row else None
+
+    def list_sessions(self, admin_id, limit=20):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.id, s.title, s.created_at, s.updated_at, COUNT(c.id) AS turns
+                FROM ai_sessions s
+                LEFT JOIN ai_conversations c ON c.session_id = s.id
+                WHERE s.admin_id = ?
+                GROUP BY s.id
+                ORDER BY s.updated_at DESC
+                LIMIT ?
+            ''', (admin_id, limit))
+            return [dict_from_row(row) for row in cursor.fetchall()]
+
+    def delete_session(self, session_id, admin_id):
+        """Delete a session; its messages stay in the conversation history"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM ai_sessions WHERE id = ? AND admin_id = ?', (session_id, admin_id))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute('UPDATE ai_conversations SET session_id = NULL WHERE session_id = ?', (session_id,))
+        self.invalidate(session_id)
+        return True
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    # Context
+
+    def _load_turns(self, session_id, session):
+        """Turns after the summary, reusing this process's cached copy when it is still current"""
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry['summary_upto'] == session['summary_upto']:
+                self._cache.move_to_end(session_id)
+                entry = {**entry, 'turns': list(entry['turns'])}
+            else:
+                entry = None
+
+        if entry is None:
+            entry = {'summary_upto': session['summary_upto'], 'last_id': session['summary_upto'], 'turns': []}
+        else:
+            self._count('cache_hits')
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, message, response FROM ai_conversations
+                WHERE session_id = ? AND id > ?
+                ORDER BY id
+            ''', (session_id, entry['last_id']))
+            for row in cursor.fetchall():
+                entry['turns'].append(_turn(row))
+                entry['last_id'] = row['id']
+        return entry
+
+    def _store(self, session_id, entry):
+        with self._lock:
+            self._cache[session_id] = entry
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.settings['cache_sessions']:
+                self._cache.popitem(last=False)
+
+    def _summarize(self, summary, turns, admin_id=None):
+        """New running summary covering the previous one plus `turns`, or None on failure"""
+        from .ai_service import ai_service
+
+        lines = []
+        if summary:
+            lines.append(f'Summary so far:\n{summary}\n')
+        lines.append('New messages:')
+        for turn in turns:
+            lines.append(f"Administrator: {turn['message']}")
+            lines.append(f"Assistant: {turn['response']}")
+        lines.append('\nWrite the updated summary.')
+
+        response = ai_service.chat('\n'.join(lines), system_prompt=SUMMARY_SYSTEM_PROMPT,
+                                   max_tokens=self.settings['summary_max_tokens'], admin_id=admin_id,
+                                   feature='chat-summary')
+        if response.get('error') or not response.get('text'):
+            return None, response.get('tokens_used', 0)
+        return response['text'].strip(), response.get('tokens_used', 0)
+
+    def _compact(self, session_id, session, entry):
+        """
+        Fold the older turns into the summary so that the newest ones fill
+        keep_ratio of the budget. Returns tokens spent on summarising.
+        """
+        settings = self.settings
+        keep_budget = settings['context_tokens'] * settings['keep_ratio']
+        kept = []
+        used = 0
+        for turn in reversed(entry['turns']):
+            if used + turn['tokens'] > keep_budget:
+                break
+            kept.append(turn)
+            used += turn['tokens']
+        kept.reverse()
+        older = entry['turns'][:len(entry['turns']) - len(kept)]
+        if not older:
+            return 0
+
+        summary, tokens_used = self._summarize(session['summary'], older, session['admin_id'])
+        if summary is None:
+            self._count('summary_failures')
+            return tokens_used
+
+        upto = older[-1]['id']
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # Only if no other worker compacted this session meanwhile
+            cursor.execute('''
+                UPDATE ai_sessions SET summary = ?, summary_upto = ?, summary_tokens = ?
+                WHERE id = ? AND summary_upto = ?
+            ''', (summary, upto, estimate_tokens(summary), session_id, session['summary_upto']))
+            if cursor.rowcount == 0:
+                return tokens_used
+
+        self._count('compactions')
+        session.update(summary=summary, summary_upto=upto, summary_tokens=estimate_tokens(summary))
+        entry.update(summary_upto=upto, turns=kept)
+        return tokens_used
+
+    def build(self, session_id, admin_id=None, compact=True):
+        """
+        Chat history for the next message of a session
+
+        With compact=False nothing is summarised (no AI call); turns over
+        the budget are just left out.
+
+        Returns:
+            dict: {'history': messages for AIService.chat, 'tokens': estimated
+            size, 'turns': turns included verbatim, 'summarized': whether a
+            summary stands in for older turns, 'summary_tokens_used': tokens
+            spent summarising during this call}, or None if the session does
+            not exist
+        """
+        session = self.get_session(session_id, admin_id)
+        if session is None:
+            return None
+        self._count('builds')
+        budget = self.settings['context_tokens']
+
+        entry = self._load_turns(session_id, session)
+        summary_tokens_used = 0
+        if compact and session['summary_tokens'] + sum(turn['tokens'] for turn in entry['turns']) > budget:
+            summary_tokens_used = self._compact(session_id, session, entry)
+        self._store(session_id, entry)
+
+        # Whatever still does not fit (e.g. summarising failed) is left out, oldest first
+        available = budget - session['summary_tokens']
+        turns = []
+        for turn in reversed(entry['turns']):
+            if turn['tokens'] > available:
+                break
+            turns.append(turn)
+            available -= turn['tokens']
+        turns.reverse()
+
+        history = []
+        if session['summary']:
+            history.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{session['summary']}"})
+        for turn in turns:
+            history.append({'role': 'user', 'content': turn['message']})
+            history.append({'role': 'assistant', 'content': turn['response']})
+
+        return {
+            'history': history,
+            'tokens': budget - available,
+            'turns': len(turns),
+            'summarized': bool(session['summary']),
+            'summary_tokens_used': summary_tokens_used,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'cached_sessions': len(self._cache), 'settings': dict(self.settings)}
+
+
+# Create singleton instance
+ai_context = ConversationContext()
@@ -0,0 +1,394 @@
+"""
+AI Jobs
+Background AI requests on a bounded pool with per-admin concurrency limits,
+timeouts and cancellation; job state lives in the database so any worker
+process can report on it
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .database import get_db, dict_from_row
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 50
+DEFAULT_PER_ADMIN = 2
+DEFAULT_TIMEOUT_SECONDS = 120
+
+# Finished jobs are kept this long for polling
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Running jobs write partial text and check for cancellation this often
+FLUSH_INTERVAL = 0.5
+
+# Seconds between database polls while watching a job
+WATCH_POLL_SECONDS = 0.25
+
+# Extra time after the deadline before a job nobody is running is marked timed out
+ORPHAN_GRACE_SECONDS = 30
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled', 'timed_out')
+
+
+class AIJobRejected(Exception):
+    """A job could not be queued"""
+    status_code = 503
+
+
+class AIJobLimitExceeded(AIJobRejected):
+    """The admin already has the maximum number of active jobs"""
+    status_code = 429
+
+
+class AIJobQueueFull(AIJobRejected):
+    """This process's queue is full"""
+    status_code = 503
+
+
+def _job_events(kind, params, use_cache, admin_id=None):
+    """stream_chat() events for a job kind (imports the AI service on first use)"""
+    from .ai_service import ai_service
+
+    if kind == 'chat':
+        from .ai_context import ai_context, trim_history
+
+        if params.get('session_id') is not None:
+            # The session may have been deleted since the job was queued
+            context = ai_context.build(params['session_id'], admin_id)
+            if context is None:
+                raise ValueError('Session not found')
+            history = context['history']
+        else:
+            history = trim_history(params.get('history'))
+        return ai_service.stream_chat(params['message'], history, use_cache=use_cache, admin_id=admin_id)
+    if kind == 'seo-suggestions':
+        return ai_service.generate_seo_suggestions(
+            params.get('content', ''), params.get('current_seo') or {}, use_cache=use_cache, stream=True,
+            admin_id=admin_id)
+    if kind == 'marketing-insights':
+        return ai_service.generate_marketing_insights(
+            params.get('analytics', {}), use_cache=use_cache, stream=True, admin_id=admin_id)
+    if kind == 'content-improvement':
+        return ai_service.suggest_content_improvements(
+            params.get('content', ''), params.get('type', 'general'), use_cache=use_cache, stream=True,
+            admin_id=admin_id)
+    if kind == 'email-response':
+        return ai_service.generate_email_response(
+            params.get('message', ''), params.get('context', 'general'), use_cache=use_cache, stream=True,
+            admin_id=admin_id)
+    raise ValueError(f'Unknown job kind: {kind}')
+
+
+JOB_KINDS = ('chat', 'seo-suggestions', 'marketing-insights', 'content-improvement', 'email-response')
+
+
+def _job_to_dict(row):
+    job = dict_from_row(row)
+    if job['status'] not in FINAL_STATUSES and job['deadline'] < time.time() - ORPHAN_GRACE_SECONDS:
+        # Orphaned; reported as timed out here and persisted by the next submit's sweep
+        job['status'] = 'timed_out'
+        job['error'] = job['error'] or 'Timed out'
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+class AIJobPool:
+    """Runs AI jobs on a fixed number of threads per process"""
+
+    def __init__(self):
+        self._settings = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._cancel_events = {}
+        self.queued = 0
+        self.running = 0
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'workers': int(os.getenv('AI_JOB_WORKERS', DEFAULT_WORKERS)),
+                'queue_size': int(os.getenv('AI_JOB_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)),
+                'per_admin': int(os.getenv('AI_JOB_PER_ADMIN', DEFAULT_PER_ADMIN)),
+                'timeout': float(os.getenv('AI_JOB_TIMEOUT', DEFAULT_TIMEOUT_SECONDS)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (workers, queue_size, per_admin, timeout) before the first job"""
+        self.settings.update(settings)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.settings['workers'],
+                                                    thread_name_prefix='ai-job')
+            return self._executor
+
+    def submit(self, admin_id, kind, params, use_cache=True, timeout=None, on_done=None):
+        """
+        Queue an AI job
+
+        Args:
+            admin_id (int): Owner; limits and visibility are per admin
+            kind (str): One of JOB_KINDS
+            params (dict): Same fields as the matching /api/ai endpoint body
+            use_cache (bool): Allow answers from the AI response cache
+            timeout (float): Seconds until the job is abandoned (queue time
+                included), at most the configured timeout
+            on_done (callable): on_done(job_id, result) run after a successful job
+
+        Returns:
+            dict: The queued job
+
+        Raises:
+            ValueError: Unknown kind, missing parameters or invalid timeout
+            AIJobLimitExceeded: The admin has too many active jobs
+            AIJobQueueFull: Too many jobs waiting in this process
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind: {kind}')
+        if kind == 'chat' and not params.get('message'):
+            raise ValueError('Message is required')
+
+        settings = self.settings
+        if timeout is not None:
+            try:
+                timeout = float(timeout)
+            except (TypeError, ValueError):
+                raise ValueError('timeout must be a number of seconds')
+            if not timeout > 0:
+                raise ValueError('timeout must be positive')
+            # A longer deadline would keep the job from being expired
+            timeout = min(timeout, settings['timeout'])
+        with self._lock:
+            if self.queued + self.running >= settings['workers'] + settings['queue_size']:
+                raise AIJobQueueFull('Too many AI jobs queued, please retry shortly')
+            self.queued += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        deadline = now + (timeout or settings['timeout'])
+        try:
+            self._expire_stale()
+            with get_db() as conn:
+                cursor = conn.cursor()
+                # Count-and-insert in one statement so concurrent submits (from any worker) can't exceed the limit
+                cursor.execute('''
+                    INSERT INTO ai_jobs (id, admin_id, kind, params, status, created_at, deadline, use_cache)
+                    SELECT ?, ?, ?, ?, 'queued', ?, ?, ?
+                    WHERE (SELECT COUNT(*) FROM ai_jobs
+                           WHERE admin_id = ? AND status IN ('queued', 'running')) < ?
+                ''', (job_id, admin_id, kind, json.dumps(params, ensure_ascii=False), now, deadline,
+                      1 if use_cache else 0, admin_id, settings['per_admin']))
+                if cursor.rowcount == 0:
+                    raise AIJobLimitExceeded(
+                        f"You already have {settings['per_admin']} AI jobs running; wait for one to finish")
+                # Housekeeping: forget old finished jobs
+                cursor.execute('DELETE FROM ai_jobs WHERE finished_at < ?', (now - JOB_RETENTION_SECONDS,))
+
+            cancel_event = threading.Event()
+            self._cancel_events[job_id] = cancel_event
+            self._get_executor().submit(self._run, job_id, admin_id, kind, params, use_cache, deadline,
+                                       cancel_event, on_done)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+            self._cancel_events.pop(job_id, None)
+            raise
+        return self.get(job_id)
+
+    def _run(self, job_id, admin_id, kind, params, use_cache, deadline, cancel_event, on_done):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            if cancel_event.is_set() or self._cancel_requested(job_id):
+                self._finish(job_id, 'cancelled')
+                return
+            if time.time() >= deadline:
+                self._finish(job_id, 'timed_out', error='Timed out while queued')
+                return
+
+            with get_db() as conn:
+                conn.execute('''
+                    UPDATE ai_jobs SET status = 'running', started_at = ?, worker_pid = ?
+                    WHERE id = ?
+                ''', (time.time(), os.getpid(), job_id))
+
+            self._consume(job_id, _job_events(kind, params, use_cache, admin_id), deadline, cancel_event, on_done)
+        except Exception as e:
+            self._finish(job_id, 'failed', error=str(e))
+        finally:
+            self._cancel_events.pop(job_id, None)
+            with self._lock:
+                self.running -= 1
+
+    def _consume(self, job_id, events, deadline, cancel_event, on_done):
+        """Read stream events, flushing partial text and honouring cancel/timeout between chunks"""
+        parts = []
+        flushed = 0
+        last_flush = time.time()
+        try:
+            for event in events:
+                if event['type'] == 'delta':
+                    parts.append(event['text'])
+                elif event['type'] == 'done':
+                    result = {key: event.get(key) for key in ('text', 'tokens_used', 'model', 'finish_reason', 'cached')}
+                    result['cached'] = bool(result['cached'])
+                    if on_done is not None:
+                        try:
+                            result.update(on_done(job_id, result) or {})
+                        except Exception as e:
+                            print(f"⚠️  AI job completion handler failed: {e}")
+                    self._finish(job_id, 'completed', result=result, partial=result['text'])
+                    return
+                else:
+                    self._finish(job_id, 'failed', error=event.get('error'), partial=''.join(parts))
+                    return
+
+                now = time.time()
+                if now >= deadline:
+                    self._finish(job_id, 'timed_out', error='Timed out', partial=''.join(parts))
+                    return
+                if now - last_flush >= FLUSH_INTERVAL:
+                    last_flush = now
+                    self._append_partial(job_id, ''.join(parts[flushed:]))
+                    flushed = len(parts)
+                    if cancel_event.is_set() or self._cancel_requested(job_id):
+                        self._finish(job_id, 'cancelled', partial=''.join(parts))
+                        return
+                elif cancel_event.is_set():
+                    self._finish(job_id, 'cancelled', partial=''.join(parts))
+                    return
+            self._finish(job_id, 'failed', error='Stream ended without a result', partial=''.join(parts))
+        finally:
+            # Stops the upstream HTTP stream when leaving early
+            events.close()
+
+    def _append_partial(self, job_id, text):
+        """Add newly streamed text to the job's partial text"""
+        if not text:
+            return
+        with get_db() as conn:
+            conn.execute("UPDATE ai_jobs SET partial_text = COALESCE(partial_text, '') || ? WHERE id = ?",
+                         (text, job_id))
+
+    def _cancel_requested(self, job_id):
+        """Check the cancel flag set by any process"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT cancel_requested FROM ai_jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            return bool(row and row[0])
+
+    def _finish(self, job_id, status, result=None, error=None, partial=None):
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE ai_jobs SET status = ?, result = ?, error = ?, partial_text = COALESCE(?, partial_text),
+                                   tokens_used = ?, finished_at = ?
+                WHERE id = ? AND status IN ('queued', 'running')
+            ''', (status, json.dumps(result, ensure_ascii=False) if result else None, error, partial,
+                  (result or {}).get('tokens_used', 0), time.time(), job_id))
+
+    def _expire_stale(self):
+        """Time out jobs whose process died or that were never picked up"""
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE ai_jobs SET status = 'timed_out', error = 'Timed out', finished_at = ?
+                WHERE status IN ('queued', 'running') AND deadline < ?
+            ''', (time.time(), time.time() - ORPHAN_GRACE_SECONDS))
+
+    def get(self, job_id, admin_id=None):
+        """Job by id (restricted to one admin when admin_id is given), or None"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if admin_id is None:
+                cursor.execute('SELECT * FROM ai_jobs WHERE id = ?', (job_id,))
+            else:
+                cursor.execute('SELECT * FROM ai_jobs WHERE id = ? AND admin_id = ?', (job_id, admin_id))
+            row = cursor.fetchone()
+            return _job_to_dict(row) if row else None
+
+    def list(self, admin_id, limit=20, status=None):
+        """Most recent jobs of an admin"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if status:
+                cursor.execute('''
+                    SELECT * FROM ai_jobs WHERE admin_id = ? AND status = ?
+                    ORDER BY created_at DESC LIMIT ?
+                ''', (admin_id, status, limit))
+            else:
+                cursor.execute('''
+                    SELECT * FROM ai_jobs WHERE admin_id = ?
+                    ORDER BY created_at DESC LIMIT ?
+                ''', (admin_id, limit))
+            return [_job_to_dict(row) for row in cursor.fetchall()]
+
+    def cancel(self, job_id, admin_id):
+        """
+        Ask for a job to stop; queued jobs never start, running ones stop at the next chunk
+
+        Returns:
+            dict: The job, or None if it does not exist
+        """
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE ai_jobs SET cancel_requested = 1
+                WHERE id = ? AND admin_id = ? AND status IN ('queued', 'running')
+            ''', (job_id, admin_id))
+        cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is not None:
+            cancel_event.set()
+        return self.get(job_id, admin_id)
+
+    def watch(self, job_id, admin_id, heartbeat=15):
+        """
+        Follow a job until it finishes
+
+        Yields ('status', job) on every status change, ('delta', text) for
+        new partial text, ('done', job) once it is final, and None as a
+        heartbeat when nothing changed for `heartbeat` seconds. Works from
+        any worker process; polling only reads the database (orphaned jobs
+        are reported as timed out and persisted by submit()).
+        """
+        status = None
+        sent = 0
+        quiet_since = time.time()
+        while True:
+            job = self.get(job_id, admin_id)
+            if job is None:
+                return
+            if job['status'] != status:
+                status = job['status']
+                quiet_since = time.time()
+                yield 'status', job
+            text = job['partial_text'] or ''
+            if len(text) > sent:
+                quiet_since = time.time()
+                yield 'delta', text[sent:]
+                sent = len(text)
+            if status in FINAL_STATUSES:
+                yield 'done', job
+                return
+            if time.time() - quiet_since >= heartbeat:
+                quiet_since = time.time()
+                yield None
+            time.sleep(WATCH_POLL_SECONDS)
+
+    def stats(self):
+        """Jobs waiting and running in this process"""
+        with self._lock:
+            return {'queued': self.queued, 'running': self.running, **self.settings}
+
+
+# Create singleton instance
+ai_jobs = AIJobPool()
@@ -0,0 +1,284 @@
+"""
+AI Providers
+Completion backends behind AIService: OpenAI, and a local deterministic stub
+for tests, benchmarks and offline development (AI_PROVIDER=stub)
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class AIProviderError(Exception):
+    """A provider request failed (retryable: worth trying again after a pause)"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class AIProviderTimeout(AIProviderError):
+    """The provider did not answer within the read timeout"""
+
+    def __init__(self, message='AI provider timed out'):
+        super().__init__(message, retryable=True)
+
+
+class AIProvider(ABC):
+    """
+    Interface for completion backends
+
+    complete() returns {'text', 'tokens_used', 'finish_reason'}; stream()
+    yields {'type': 'delta', 'text'} events and ends with one
+    {'type': 'finish', 'tokens_used', 'finish_reason'}. Both take
+    OpenAI-style message lists and raise on failure. `timeout`, when given,
+    shortens the read timeout to the seconds left for the request.
+    """
+
+    name = None
+
+    def __init__(self, model):
+        self.model = model
+
+    @abstractmethod
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=None):
+        """One completion as {'text', 'tokens_used', 'finish_reason'}"""
+
+    @abstractmethod
+    def stream(self, messages, max_tokens, temperature=0.7, timeout=None):
+        """Generator of delta events ending with a finish event"""
+
+
+class OpenAIProvider(AIProvider):
+    """OpenAI chat completions"""
+
+    name = 'openai'
+
+    def __init__(self, model, client):
+        super().__init__(model)
+        self.client = client
+
+    @classmethod
+    def from_env(cls):
+        """Provider from OPENAI_API_KEY / OPENAI_MODEL, or None without a usable key"""
+        from .ai_resilience import ai_resilience
+
+        model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+        api_key = os.getenv('OPENAI_API_KEY', '')
+        if not api_key or api_key == 'your-openai-api-key-here':
+            return None
+        try:
+            # The openai package takes ~0.5s to import; defer it to the first call
+            import httpx
+            from openai import OpenAI
+            settings = ai_resilience.settings
+            return cls(model, OpenAI(
+                api_key=api_key,
+                # Read timeout applies per chunk, so a stalled stream is cut off too
+                timeout=httpx.Timeout(settings['read_timeout'], connect=settings['connect_timeout']),
+                # Retries are done by ai_resilience, with the circuit breaker in the loop
+                max_retries=0
+            ))
+        except Exception as e:
+            print(f"Warning: Failed to initialize OpenAI client: {e}")
+            return None
+
+    def _request_options(self, timeout):
+        """Per-request timeout, capped at the time left for the call"""
+        if timeout is None:
+            return {}
+        import httpx
+        from .ai_resilience import ai_resilience
+
+        settings = ai_resilience.settings
+        return {'timeout': httpx.Timeout(min(settings['read_timeout'], timeout),
+                                         connect=min(settings['connect_timeout'], timeout))}
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=None):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **self._request_options(timeout)
+        )
+        return {
+            'text': response.choices[0].message.content,
+            'tokens_used': response.usage.total_tokens,
+            'finish_reason': response.choices[0].finish_reason
+        }
+
+    def stream(self, messages, max_tokens, temperature=0.7, timeout=None):
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            # Final chunk carries token usage
+            stream_options={'include_usage': True},
+            **self._request_options(timeout)
+        )
+        tokens_used = 0
+        finish_reason = None
+        try:
+            for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    tokens_used = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta and choice.delta.content:
+                    yield {'type': 'delta', 'text': choice.delta.content}
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+        finally:
+            # Stop the HTTP stream if the consumer goes away early
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        yield {'type': 'finish', 'tokens_used': tokens_used, 'finish_reason': finish_reason}
+
+
+_STUB_WORDS = (
+    'content', 'customers', 'product', 'quality', 'design', 'page', 'search', 'brand', 'offer', 'shop',
+    'improve', 'clear', 'simple', 'handmade', 'gift', 'price', 'order', 'delivery', 'style', 'collection',
+    'محصول', 'کیفیت', 'طراحی', 'فروشگاه', 'مشتری', 'سفارش', 'هدیه', 'دست‌ساز', 'ارسال', 'مجموعه',
+)
+
+
+class StubProvider(AIProvider):
+    """
+    Deterministic offline backend
+
+    The answer depends only on the messages: the same prompt always gives
+    the same text and token counts. Prompts asking for JSON get a JSON
+    object with SEO-style fields. Latency is simulated as `latency` seconds
+    before the first token plus `tokens_per_second` while generating (0
+    disables the delay); `error_rate` makes that share of calls fail with a
+    retryable error. A wait longer than `read_timeout` (or the call's
+    `timeout`) raises AIProviderTimeout after that long, like a stalled
+    upstream.
+    """
+
+    name = 'stub'
+
+    def __init__(self, model='stub', latency=0.2, tokens_per_second=50.0, error_rate=0.0, seed=0,
+                 read_timeout=None):
+        super().__init__(model)
+        self.latency = latency
+        self.read_timeout = read_timeout
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls):
+        from .ai_resilience import ai_resilience
+
+        return cls(
+            model=os.getenv('AI_STUB_MODEL', 'stub'),
+            latency=float(os.getenv('AI_STUB_LATENCY', 0.2)),
+            tokens_per_second=float(os.getenv('AI_STUB_TOKENS_PER_SECOND', 50)),
+            error_rate=float(os.getenv('AI_STUB_ERROR_RATE', 0)),
+            seed=int(os.getenv('AI_STUB_SEED', 0)),
+            read_timeout=ai_resilience.settings['read_timeout'],
+        )
+
+    def _answer(self, messages, max_tokens):
+        """Completion tokens and prompt token count for a request"""
+        from .ai_context import estimate_tokens
+
+        prompt = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        rng = random.Random(digest)
+        prompt_tokens = sum(estimate_tokens(message.get('content')) for message in messages)
+
+        last = (messages[-1].get('content') or '') if messages else ''
+        if 'JSON' in last:
+            words = [rng.choice(_STUB_WORDS) for _ in range(12)]
+            text = json.dumps({
+                'meta_title': ' '.join(words[:5]).capitalize(),
+                'meta_description': ' '.join(words).capitalize() + '.',
+                'keywords': words[5:11],
+                'content_tips': ['Stub answer generated offline.'],
+            }, ensure_ascii=False)
+            tokens = text.split(' ')
+            tokens = [token + ' ' for token in tokens[:-1]] + tokens[-1:]
+        else:
+            count = rng.randint(20, 80)
+            tokens = [rng.choice(_STUB_WORDS) + ' ' for _ in range(count)]
+            tokens[-1] = tokens[-1].rstrip() + '.'
+            tokens[0] = tokens[0].capitalize()
+
+        finish_reason = 'stop'
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = 'length'
+        return tokens, prompt_tokens, finish_reason
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise AIProviderError('Simulated provider error', retryable=True)
+
+    def _wait(self, seconds, timeout=None):
+        limit = self.read_timeout
+        if timeout is not None:
+            limit = min(limit, timeout) if limit else timeout
+        if limit is not None and seconds > limit:
+            time.sleep(limit)
+            raise AIProviderTimeout()
+        if seconds:
+            time.sleep(seconds)
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+
+    def complete(self, messages, max_tokens, temperature=0.7, timeout=None):
+        tokens, prompt_tokens, finish_reason = self._answer(messages, max_tokens)
+        self._wait(self.latency + len(tokens) * self._token_delay(), timeout)
+        self._maybe_fail()
+        return {'text': ''.join(tokens), 'tokens_used': prompt_tokens + len(tokens), 'finish_reason': finish_reason}
+
+    def stream(self, messages, max_tokens, temperature=0.7, timeout=None):
+        tokens, prompt_tokens, finish_reason = self._answer(messages, max_tokens)
+        self._wait(self.latency, timeout)
+        self._maybe_fail()
+        delay = self._token_delay()
+        for token in tokens:
+            self._wait(delay, timeout)
+            yield {'type': 'delta', 'text': token}
+        yield {'type': 'finish', 'tokens_used': prompt_tokens + len(tokens), 'finish_reason': finish_reason}
+
+
+# Name (AI_PROVIDER) -> factory returning a provider, or None when it is not configured
+PROVIDERS = {
+    'openai': OpenAIProvider.from_env,
+    'stub': StubProvider.from_env,
+}
+
+
+def register_provider(name, factory):
+    """Make a backend selectable with AI_PROVIDER=<name>"""
+    PROVIDERS[name] = factory
+
+
+def create_provider(name):
+    """
+    Provider instance for a name
+
+    Raises:
+        ValueError: Unknown provider name
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown AI provider '{name}' (available: {', '.join(sorted(PROVIDERS))})")
+    return PROVIDERS[name]()
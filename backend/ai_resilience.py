@@ -0,0 +1,317 @@
+"""
+AI Resilience
+Retries with jittered exponential backoff and a circuit breaker around the
+completion backend, so transient provider errors are retried and a degraded
+provider is failed fast instead of tying up workers
+"""
+
+import os
+import random
+import threading
+import time
+from .ai_providers import AIProviderError
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 8
+DEFAULT_TOTAL_TIMEOUT = 90
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = (408, 409, 429)
+
+BREAKER_STATES = ('closed', 'open', 'half_open')
+
+
+class AICircuitOpen(AIProviderError):
+    """The provider is failing; requests are refused until the breaker resets"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'AI provider is unavailable, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+def is_retryable(exc):
+    """Whether an error from a provider call is transient"""
+    retryable = getattr(exc, 'retryable', None)
+    if retryable is not None:
+        return retryable
+    status = getattr(exc, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # openai.APITimeoutError / APIConnectionError, without importing openai
+    return any(cls.__name__ in ('APITimeoutError', 'APIConnectionError') for cls in type(exc).__mro__)
+
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on the error's HTTP response, if any"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientProvider:
+    """Provider wrapper that sends every call through AIResilience"""
+
+    def __init__(self, provider, resilience):
+        self.provider = provider
+        self.resilience = resilience
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    @property
+    def model(self):
+        return self.provider.model
+
+    def complete(self, messages, max_tokens, temperature=0.7):
+        return self.resilience.call(
+            lambda timeout: self.provider.complete(messages, max_tokens, temperature=temperature, timeout=timeout))
+
+    def stream(self, messages, max_tokens, temperature=0.7):
+        return self.resilience.stream(
+            lambda timeout: self.provider.stream(messages, max_tokens, temperature=temperature, timeout=timeout))
+
+
+class AIResilience:
+    """
+    Retry policy and circuit breaker for provider calls (per process)
+
+    The breaker opens after `breaker_failures` consecutive retryable
+    failures and refuses calls for `breaker_reset_seconds`. Then one probe
+    call is let through (half open): success closes the breaker, failure
+    opens it again. Errors the provider returns for a bad request do not
+    count as failures.
+
+    All attempts of one call, and the pauses between them, share a budget
+    of `total_timeout` seconds: each attempt may wait at most the time that
+    is left, and no retry is started that would end past it.
+    """
+
+    def __init__(self):
+        self._settings = None
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.counters = {'retries': 0, 'failures': 0, 'timeouts': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'connect_timeout': float(os.getenv('AI_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+                'read_timeout': float(os.getenv('AI_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)),
+                'retry_attempts': max(1, int(os.getenv('AI_RETRY_ATTEMPTS', DEFAULT_RETRY_ATTEMPTS))),
+                'retry_base_delay': float(os.getenv('AI_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY)),
+                'retry_max_delay': float(os.getenv('AI_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)),
+                'total_timeout': float(os.getenv('AI_TOTAL_TIMEOUT', DEFAULT_TOTAL_TIMEOUT)),
+                'breaker_failures': max(1, int(os.getenv('AI_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES))),
+                'breaker_reset_seconds': float(os.getenv('AI_BREAKER_RESET_SECONDS', DEFAULT_BREAKER_RESET_SECONDS)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (timeouts only apply to providers created afterwards)"""
+        self.settings.update(settings)
+
+    def wrap(self, provider):
+        """Provider with retries and the breaker applied (None stays None)"""
+        if provider is None or isinstance(provider, ResilientProvider):
+            return provider
+        return ResilientProvider(provider, self)
+
+    def reset(self):
+        """Close the breaker and forget recent failures"""
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    # Breaker
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == 'open' and time.time() - self._opened_at >= self.settings['breaker_reset_seconds']:
+            return 'half_open'
+        return self._state
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through (0 unless open)"""
+        with self._lock:
+            if self._current_state() != 'open':
+                return 0
+            return max(0.0, self._opened_at + self.settings['breaker_reset_seconds'] - time.time())
+
+    def _before_call(self):
+        """Raise AICircuitOpen unless a call may go out; returns whether it is the half-open probe"""
+        with self._lock:
+            state = self._current_state()
+            if state == 'closed':
+                return False
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.counters['rejected'] += 1
+            wait = max(1.0, self._opened_at + self.settings['breaker_reset_seconds'] - time.time())
+        raise AICircuitOpen(wait)
+
+    def _on_success(self):
+        with self._lock:
+            if self._state != 'closed':
+                print("✅ AI provider recovered, circuit breaker closed")
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def _abandon_probe(self):
+        """A probe ended without an outcome (e.g. interrupted); let the next call probe"""
+        with self._lock:
+            self._probing = False
+
+    def _on_failure(self, exc):
+        """Record a failed call; returns whether it is worth retrying"""
+        if not is_retryable(exc):
+            # The provider answered; it just refused this request
+            self._on_success()
+            return False
+        with self._lock:
+            self.counters['failures'] += 1
+            if isinstance(exc, TimeoutError) or 'Timeout' in type(exc).__name__:
+                self.counters['timeouts'] += 1
+            self._failures += 1
+            if self._probing or self._failures >= self.settings['breaker_failures']:
+                if self._current_state() == 'closed':
+                    print(f"⚠️  AI provider failing ({exc}), circuit breaker open")
+                self._state = 'open'
+                self._opened_at = time.time()
+                self._probing = False
+                self.counters['opened'] += 1
+        return True
+
+    # Retries
+
+    def _deadline(self):
+        total = self.settings['total_timeout']
+        return time.monotonic() + total if total > 0 else None
+
+    @staticmethod
+    def _time_left(deadline):
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _backoff(self, attempt, exc, deadline):
+        """
+        Sleep before retry number `attempt` (full-jitter exponential delay)
+
+        Returns False, without sleeping, if the retry could not start before
+        the deadline.
+        """
+        settings = self.settings
+        ceiling = min(settings['retry_max_delay'], settings['retry_base_delay'] * 2 ** (attempt - 1))
+        delay = self._random.uniform(0, ceiling)
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            delay = max(delay, min(hinted, settings['retry_max_delay']))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return False
+        with self._lock:
+            self.counters['retries'] += 1
+        time.sleep(delay)
+        return True
+
+    def call(self, fn):
+        """
+        Run a non-streaming provider call with retries
+
+        Args:
+            fn (callable): fn(timeout) makes one attempt; timeout is the
+                seconds left in the total budget (None without a budget)
+        """
+        deadline = self._deadline()
+        attempts = self.settings['retry_attempts']
+        for attempt in range(1, attempts + 1):
+            probe = self._before_call()
+            recorded = False
+            try:
+                result = fn(self._time_left(deadline))
+            except Exception as e:
+                recorded = True
+                if not self._on_failure(e) or attempt == attempts or not self._backoff(attempt, e, deadline):
+                    raise
+                continue
+            finally:
+                if probe and not recorded:
+                    self._abandon_probe()
+            self._on_success()
+            return result
+
+    def stream(self, fn):
+        """
+        Run a streaming provider call with retries
+
+        A stream is only retried if it fails before its first event; once
+        text has been passed on, the error goes to the caller. fn(timeout)
+        is called as for call().
+        """
+        deadline = self._deadline()
+        attempts = self.settings['retry_attempts']
+        for attempt in range(1, attempts + 1):
+            probe = self._before_call()
+            recorded = False
+            events = None
+            started = False
+            try:
+                events = fn(self._time_left(deadline))
+                for event in events:
+                    started = True
+                    yield event
+            except GeneratorExit:
+                # Consumer went away; the provider was answering
+                recorded = True
+                self._on_success()
+                raise
+            except Exception as e:
+                recorded = True
+                retry = self._on_failure(e) and not started and attempt < attempts
+                if not (retry and self._backoff(attempt, e, deadline)):
+                    raise
+                continue
+            else:
+                recorded = True
+                self._on_success()
+                return
+            finally:
+                if events is not None:
+                    events.close()
+                if probe and not recorded:
+                    self._abandon_probe()
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            failures = self._failures
+        return {'state': state, 'consecutive_failures': failures, **self.counters,
+                'retry_after': self.retry_after(), 'settings': self.settings}
+
+
+# Create singleton instance
+ai_resilience = AIResilience()
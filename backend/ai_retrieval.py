@@ -0,0 +1,428 @@
+"""
+AI Retrieval
+Local BM25 index over products, site content, shop pages and SEO settings,
+kept in SQLite (FTS5) and used to ground AI prompts with a few relevant
+snippets of the site's own text
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from .ai_cache import normalize_prompt
+from .database import get_db
+
+DEFAULT_TOP_K = 4
+DEFAULT_MAX_TOKENS = 400
+DEFAULT_PAGE_TOKENS = 600
+DEFAULT_PASSAGE_WORDS = 60
+DEFAULT_SYNC_SECONDS = 1.0
+
+# Queued changes applied per transaction (and per sync on the request path)
+SYNC_BATCH_ROWS = 500
+
+# Only the most frequent terms of a long query are scored
+MAX_QUERY_TERMS = 64
+
+# A passage (of at least SELF_MATCH_MIN_TERMS terms) sharing this much of its
+# vocabulary with the query is the query's own text, not context for it
+SELF_MATCH_RATIO = 0.8
+SELF_MATCH_MIN_TERMS = 5
+
+SOURCE_LABELS = {
+    'product': 'Product',
+    'content': 'Site content',
+    'shop_page': 'Shop page',
+    'seo': 'SEO',
+}
+
+# source -> (query over indexable rows, row -> (title, text))
+_SOURCES = {
+    'product': (
+        'SELECT id, name_fa, name_en, category, description_fa, description_en FROM products WHERE is_available = 1',
+        lambda row: (row['name_fa'] or row['name_en'], ' '.join(filter(None, (
+            row['name_fa'], row['name_en'], row['category'], row['description_fa'], row['description_en']))))
+    ),
+    'content': (
+        "SELECT id, section, content_key, content_value FROM site_content "
+        "WHERE COALESCE(content_type, 'text') NOT IN ('image', 'url')",
+        lambda row: (f"{row['section']}/{row['content_key']}", row['content_value'])
+    ),
+    'shop_page': (
+        'SELECT id, title_fa, content_fa FROM shop_pages WHERE is_active = 1',
+        lambda row: (row['title_fa'], row['content_fa'])
+    ),
+    'seo': (
+        "SELECT id, page, title, description, keywords FROM seo_settings WHERE page != ''",
+        lambda row: (row['page'], ' '.join(filter(None, (row['title'], row['description'], row['keywords']))))
+    ),
+}
+
+_TAGS = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+_TOKEN = re.compile(r'\w+')
+
+STOPWORDS = frozenset((
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'was', 'you', 'your', 'our', 'from', 'have', 'has',
+    'not', 'but', 'all', 'can', 'will', 'its', 'into', 'about', 'more', 'they', 'their', 'what', 'when',
+    'از', 'به', 'با', 'در', 'که', 'این', 'را', 'برای', 'است', 'یک', 'آن', 'هم', 'تا', 'بر', 'می', 'ها',
+    'های', 'شود', 'کنید', 'هر', 'اما', 'یا', 'ما', 'شما', 'نیز', 'هست', 'بود', 'شده', 'کند', 'دارد',
+))
+
+
+def clean_text(text):
+    """Plain text without HTML tags, on one line"""
+    return _WHITESPACE.sub(' ', _TAGS.sub(' ', text or '')).strip()
+
+
+def tokenize(text):
+    """
+    Index terms: lowercased words of two or more letters, stopwords and
+    numbers dropped, normalised like cache keys (Arabic ي/ك as Persian ی/ک)
+    """
+    return [
+        token for token in _TOKEN.findall(normalize_prompt(_TAGS.sub(' ', text or '')).lower())
+        if len(token) > 1 and token not in STOPWORDS and not token.isdigit()
+    ]
+
+
+class RetrievalIndex:
+    """
+    BM25 full-text index over the site's content, stored in the database
+
+    Rows are split into passages of about `passage_words` words and kept in
+    ai_retrieval_passages with an FTS5 index over their normalised terms,
+    so every worker process shares one persisted index. Writes to the
+    indexed tables are queued by triggers in ai_retrieval_changes; sync()
+    re-indexes queued rows in batches of SYNC_BATCH_ROWS and removes them
+    from the queue. The server drains the queue before forking workers, and
+    `python -m backend.ai_retrieval` does it offline.
+    """
+
+    def __init__(self):
+        self._settings = None
+        self._lock = threading.Lock()
+        # One thread per process syncs at a time; the others skip
+        self._sync_lock = threading.Lock()
+        self._checked_at = 0.0
+        self.counters = {'queries': 0, 'rebuilds': 0, 'updates': 0}
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'enabled': os.getenv('AI_RETRIEVAL_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off'),
+                'top_k': int(os.getenv('AI_RETRIEVAL_TOP_K', DEFAULT_TOP_K)),
+                'max_tokens': int(os.getenv('AI_RETRIEVAL_MAX_TOKENS', DEFAULT_MAX_TOKENS)),
+                'page_tokens': int(os.getenv('AI_RETRIEVAL_PAGE_TOKENS', DEFAULT_PAGE_TOKENS)),
+                'passage_words': max(10, int(os.getenv('AI_RETRIEVAL_PASSAGE_WORDS', DEFAULT_PASSAGE_WORDS))),
+                'sync_seconds': float(os.getenv('AI_RETRIEVAL_SYNC_SECONDS', DEFAULT_SYNC_SECONDS)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (passage_words applies to rows indexed afterwards; see rebuild())"""
+        self.settings.update(settings)
+
+    # Indexing
+
+    def _passages(self, text):
+        words = clean_text(text).split(' ')
+        size = self.settings['passage_words']
+        for start in range(0, len(words), size):
+            passage = ' '.join(words[start:start + size]).strip()
+            if passage:
+                yield passage
+
+    def _load_rows(self, conn, source, ids):
+        """(row_id, title, text) for the indexable rows among some ids of a source"""
+        sql, extract = _SOURCES[source]
+        cursor = conn.cursor()
+        cursor.execute(f"{sql} AND id IN ({', '.join('?' * len(ids))})", ids)
+        for row in cursor.fetchall():
+            title, text = extract(row)
+            if text:
+                yield row['id'], title or '', text
+
+    def _index_rows(self, conn, source, ids):
+        """Replace the passages of some rows (rows no longer indexable just lose theirs)"""
+        cursor = conn.cursor()
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                INSERT INTO ai_retrieval_fts (ai_retrieval_fts, rowid, terms)
+                SELECT 'delete', id, terms FROM ai_retrieval_passages WHERE source = ? AND row_id IN ({placeholders})
+            ''', (source, *chunk))
+            cursor.execute(f'DELETE FROM ai_retrieval_passages WHERE source = ? AND row_id IN ({placeholders})',
+                           (source, *chunk))
+
+            passages = []
+            for row_id, title, text in self._load_rows(conn, source, chunk):
+                title_terms = dict.fromkeys(tokenize(title))
+                for passage in self._passages(text):
+                    # Title terms count in every passage so any part of a product or page can match its name
+                    terms = tokenize(passage)
+                    terms.extend(term for term in title_terms if term not in terms)
+                    if terms:
+                        passages.append((source, row_id, title, passage, ' '.join(terms)))
+            cursor.executemany('''
+                INSERT INTO ai_retrieval_passages (source, row_id, title, passage, terms) VALUES (?, ?, ?, ?, ?)
+            ''', passages)
+            cursor.execute(f'''
+                INSERT INTO ai_retrieval_fts (rowid, terms)
+                SELECT id, terms FROM ai_retrieval_passages WHERE source = ? AND row_id IN ({placeholders})
+            ''', (source, *chunk))
+
+    def sync(self, force=False):
+        """
+        Index queued writes: one batch at most every `sync_seconds`, or the
+        whole queue when forced
+
+        Returns:
+            int: Queued changes applied
+        """
+        now = time.time()
+        if not force and now - self._checked_at < self.settings['sync_seconds']:
+            return 0
+        if not self._sync_lock.acquire(blocking=force):
+            return 0
+        try:
+            self._checked_at = now
+            applied = 0
+            while True:
+                count = self._apply_changes()
+                applied += count
+                if not force or count < SYNC_BATCH_ROWS:
+                    return applied
+        finally:
+            self._sync_lock.release()
+
+    def _apply_changes(self):
+        """Re-index the rows named by the oldest queued changes and dequeue them"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM ai_retrieval_changes LIMIT 1')
+            if cursor.fetchone() is None:
+                return 0
+            # Hold the write lock from reading the queue on, so no other process applies the same changes
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT id, source, row_id FROM ai_retrieval_changes ORDER BY id LIMIT ?',
+                           (SYNC_BATCH_ROWS,))
+            changes = cursor.fetchall()
+            if not changes:
+                return 0
+
+            changed = {}
+            for change in changes:
+                if change['source'] in _SOURCES:
+                    changed.setdefault(change['source'], set()).add(change['row_id'])
+            for source, ids in changed.items():
+                self._index_rows(conn, source, ids)
+            cursor.execute('DELETE FROM ai_retrieval_changes WHERE id <= ?', (changes[-1]['id'],))
+
+        with self._lock:
+            self.counters['updates'] += len(changes)
+        return len(changes)
+
+    def rebuild(self):
+        """
+        Index every source from scratch (after changing passage_words);
+        the index is empty until the queue is drained again
+
+        Returns:
+            int: Rows queued and indexed
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("INSERT INTO ai_retrieval_fts (ai_retrieval_fts) VALUES ('delete-all')")
+            cursor.execute('DELETE FROM ai_retrieval_passages')
+            cursor.execute('DELETE FROM ai_retrieval_changes')
+            for source, (sql, _extract) in _SOURCES.items():
+                cursor.execute(f'INSERT INTO ai_retrieval_changes (source, row_id) SELECT ?, id FROM ({sql})',
+                               (source,))
+        with self._lock:
+            self.counters['rebuilds'] += 1
+        return self.sync(force=True)
+
+    # Querying
+
+    def _term_weights(self, conn, terms):
+        """BM25 idf of each indexed term"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM ai_retrieval_passages')
+        count = cursor.fetchone()[0]
+        weights = {}
+        for term in terms:
+            cursor.execute('SELECT doc FROM ai_retrieval_vocab WHERE term = ?', (term,))
+            row = cursor.fetchone()
+            if row:
+                weights[term] = math.log(1 + (count - row[0] + 0.5) / (row[0] + 0.5))
+        return weights
+
+    def search(self, query, k=None, sources=None):
+        """
+        Passages most relevant to a text, best first
+
+        Passages that are mostly the query's own text are skipped, and each
+        row contributes at most one passage.
+
+        Returns:
+            list: {'source', 'id', 'title', 'text', 'score'} dicts
+        """
+        self.sync()
+        k = k or self.settings['top_k']
+        query_terms = Counter(tokenize(query))
+        terms = [term for term, _count in query_terms.most_common(MAX_QUERY_TERMS)]
+        with self._lock:
+            self.counters['queries'] += 1
+        if not terms:
+            return []
+
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if sources:
+                cursor.execute(f'''
+                    SELECT p.source, p.row_id, p.title, p.passage, -f.rank AS score
+                    FROM ai_retrieval_fts f
+                    JOIN ai_retrieval_passages p ON p.id = f.rowid
+                    WHERE ai_retrieval_fts MATCH ? AND p.source IN ({', '.join('?' * len(sources))})
+                    ORDER BY f.rank LIMIT ?
+                ''', (match, *sources, k * 4))
+            else:
+                # Ranked inside FTS5 first so only the best passages are joined
+                cursor.execute('''
+                    SELECT p.source, p.row_id, p.title, p.passage, -f.rank AS score
+                    FROM (SELECT rowid, rank FROM ai_retrieval_fts WHERE ai_retrieval_fts MATCH ?
+                          ORDER BY rank LIMIT ?) f
+                    JOIN ai_retrieval_passages p ON p.id = f.rowid
+                    ORDER BY f.rank
+                ''', (match, k * 4))
+            rows = cursor.fetchall()
+
+        results = []
+        seen_rows = set()
+        for source, row_id, title, passage, score in rows:
+            if (source, row_id) in seen_rows:
+                continue
+            passage_terms = set(tokenize(passage))
+            if (len(passage_terms) >= SELF_MATCH_MIN_TERMS
+                    and len(passage_terms & query_terms.keys()) / len(passage_terms) >= SELF_MATCH_RATIO):
+                continue
+            seen_rows.add((source, row_id))
+            results.append({'source': source, 'id': row_id, 'title': title, 'text': passage,
+                            'score': round(score, 4)})
+            if len(results) == k:
+                break
+        return results
+
+    def context_for(self, query, k=None, max_tokens=None):
+        """
+        Prompt section listing the snippets most relevant to `query`, within
+        a token budget ('' when disabled, nothing matches or the index fails)
+        """
+        from .ai_context import estimate_tokens
+
+        if not self.settings['enabled'] or not query:
+            return ''
+        try:
+            results = self.search(query, k)
+        except Exception as e:
+            print(f"⚠️  AI retrieval failed: {e}")
+            return ''
+
+        budget = max_tokens or self.settings['max_tokens']
+        lines = []
+        for result in results:
+            line = f"- [{SOURCE_LABELS[result['source']]}] {result['title']}: {result['text']}"
+            tokens = estimate_tokens(line)
+            if tokens > budget:
+                continue
+            budget -= tokens
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def excerpt(self, text, max_tokens=None):
+        """
+        The passages of a long text that best represent it, in their
+        original order, within a token budget (short texts are returned whole)
+
+        Passages are ranked by the terms they share with the whole text,
+        weighted by how often the text uses them (log-damped) and by their
+        site-wide idf, so a page's recurring, distinctive terms count most.
+        """
+        from .ai_context import estimate_tokens
+
+        text = clean_text(text)
+        budget = max_tokens or self.settings['page_tokens']
+        if estimate_tokens(text) <= budget:
+            return text
+
+        passages = list(self._passages(text))
+        weights = {}
+        if self.settings['enabled']:
+            try:
+                self.sync()
+                with get_db() as conn:
+                    weights = self._term_weights(conn, set(tokenize(text)))
+            except Exception as e:
+                print(f"⚠️  AI retrieval failed: {e}")
+        frequencies = Counter(tokenize(text))
+        ranked = sorted(
+            range(len(passages)),
+            key=lambda index: -sum((1 + math.log(frequencies[term])) * weights.get(term, 1.0)
+                                   for term in set(tokenize(passages[index])))
+        )
+        chosen = []
+        for index in ranked:
+            tokens = estimate_tokens(passages[index])
+            if tokens <= budget:
+                chosen.append(index)
+                budget -= tokens
+        if not chosen:
+            # Budget smaller than a passage: the start of the best one
+            words = passages[ranked[0]].split(' ')
+            keep = max(1, len(words) * budget // estimate_tokens(passages[ranked[0]]))
+            return ' '.join(words[:keep])
+        return ' … '.join(passages[index] for index in sorted(chosen))
+
+    def stats(self):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM ai_retrieval_passages')
+            passages = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM (SELECT DISTINCT source, row_id FROM ai_retrieval_passages)')
+            rows = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM ai_retrieval_changes')
+            pending = cursor.fetchone()[0]
+        with self._lock:
+            counters = dict(self.counters)
+        return {'rows': rows, 'passages': passages, 'pending': pending, **counters, 'settings': self.settings}
+
+
+# Create singleton instance
+ai_retrieval = RetrievalIndex()
+
+
+if __name__ == '__main__':
+    # Build or refresh the index offline: python -m backend.ai_retrieval [--rebuild]
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index site content for AI prompts')
+    parser.add_argument('--rebuild', action='store_true', help='Re-index everything, e.g. after changing passage size')
+    args = parser.parse_args()
+
+    from .database import init_db
+    init_db()
+    started = time.time()
+    applied = ai_retrieval.rebuild() if args.rebuild else ai_retrieval.sync(force=True)
+    stats = ai_retrieval.stats()
+    print(f"✅ Applied {applied} change(s) in {time.time() - started:.1f}s: "
+          f"{stats['passages']} passages from {stats['rows']} rows")
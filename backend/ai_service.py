@@ -1,38 +1,105 @@
 """
 AI Service Module
-OpenAI API integration for AI-powered features
+AI-powered features on top of a pluggable completion backend (see ai_providers)
 """
 
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from .ai_cache import ai_cache, cache_key
+from .ai_providers import create_provider
+from .ai_usage import ai_usage, AIBudgetExceeded
+from .ai_resilience import ai_resilience, AICircuitOpen
+from .ai_retrieval import ai_retrieval
+from .environment import load_environment
+
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant for website administration. You help with content management, SEO optimization, marketing insights, and general website-related questions."
 
-# Load environment variables
-load_dotenv()
 
 class AIService:
     """AI Service for OpenAI integration"""
 
     def __init__(self):
-        self.model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
-        self.max_tokens = int(os.getenv('OPENAI_MAX_TOKENS', 1000))
-        self._client = None
+        # Settings are read on first use so importing this module stays cheap
+        self._max_tokens = None
+        self._provider_name = None
+        self._provider = None
 
     @property
-    def client(self):
-        """Lazy initialization of OpenAI client"""
-        if self._client is None:
-            api_key = os.getenv('OPENAI_API_KEY', '')
-            if not api_key or api_key == 'your-openai-api-key-here':
-                return None
-            try:
-                self._client = OpenAI(api_key=api_key)
-            except Exception as e:
-                print(f"Warning: Failed to initialize OpenAI client: {e}")
-                return None
-        return self._client
+    def provider_name(self):
+        """Completion backend (AI_PROVIDER: openai or stub)"""
+        if self._provider_name is None:
+            load_environment()
+            self._provider_name = os.getenv('AI_PROVIDER', 'openai').strip().lower()
+        return self._provider_name
+
+    @property
+    def provider(self):
+        """
+        Lazy initialization of the completion backend (None if not configured),
+        wrapped with retries and the circuit breaker
+        """
+        if self._provider is None:
+            self._provider = ai_resilience.wrap(create_provider(self.provider_name))
+        return self._provider
+
+    def use_provider(self, provider):
+        """Swap the backend at runtime (tests and benchmarks)"""
+        self._provider = ai_resilience.wrap(provider)
+        self._provider_name = provider.name if provider is not None else None
+        ai_resilience.reset()
+
+    @property
+    def model(self):
+        """Model name of the backend (OPENAI_MODEL for OpenAI)"""
+        provider = self.provider
+        return provider.model if provider is not None else os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
 
-    def chat(self, message, conversation_history=None, system_prompt=None):
+    @property
+    def max_tokens(self):
+        """Completion token limit (OPENAI_MAX_TOKENS)"""
+        if self._max_tokens is None:
+            load_environment()
+            self._max_tokens = int(os.getenv('OPENAI_MAX_TOKENS', 1000))
+        return self._max_tokens
+
+    def _not_configured(self):
+        if self.provider_name == 'openai':
+            return 'OpenAI API key not configured'
+        return f"AI provider '{self.provider_name}' is not configured"
+
+    @staticmethod
+    def _grounding(query, heading):
+        """Prompt section with the site snippets most relevant to `query` ('' when there are none)"""
+        context = ai_retrieval.context_for(query)
+        if not context:
+            return ''
+        return f"\n\n{heading}\n{context}"
+
+    @staticmethod
+    def _estimate_tokens(messages, parts):
+        """Token estimate for a stream that ended before the provider reported usage"""
+        from .ai_context import estimate_tokens
+        return sum(estimate_tokens(message['content']) for message in messages) + estimate_tokens(''.join(parts))
+
+    def _cached_response(self, key):
+        """Response from the AI cache, marked as cached and free (None on a miss)"""
+        try:
+            cached = ai_cache.get(key)
+        except Exception as e:
+            print(f"⚠️  AI cache lookup failed: {e}")
+            return None
+        if cached is None:
+            return None
+        return {**cached, 'cached': True, 'tokens_used': 0, 'tokens_saved': cached.get('tokens_used', 0)}
+
+    def _store_response(self, key, response):
+        try:
+            ai_cache.set(key, response)
+        except Exception as e:
+            print(f"⚠️  AI cache store failed: {e}")
+
+    def chat(self, message, conversation_history=None, system_prompt=None, use_cache=True, max_tokens=None,
+             admin_id=None, feature='chat'):
         """
         Send a chat message to OpenAI and get response
 
@@ -40,30 +107,51 @@ class AIService:
             message (str): User message
             conversation_history (list): Previous conversation messages
             system_prompt (str): System prompt for context
+            use_cache (bool): Serve identical earlier requests from the AI
+                response cache (AI_CACHE_ENABLED=0 turns it off globally)
+            max_tokens (int): Completion token limit (default OPENAI_MAX_TOKENS)
+            admin_id (int): Admin charged for the request (usage and budgets)
+            feature (str): Usage accounting bucket
 
         Returns:
-            dict: Response with text, tokens_used, and model
+            dict: Response with text, tokens_used, and model ('cached': True
+            and tokens_used 0 when served from the cache; 'budget_exceeded':
+            True with the error when a token budget is used up; 'unavailable':
+            True and retry_after while the circuit breaker is open)
         """
+        system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+        max_tokens = max_tokens or self.max_tokens
+        key = None
+        if use_cache and ai_cache.enabled:
+            key = cache_key(message, system_prompt, conversation_history, self.model, max_tokens)
+            cached = self._cached_response(key)
+            if cached is not None:
+                ai_usage.record(admin_id, feature, cached=True, tokens_saved=cached['tokens_saved'])
+                return cached
+
         try:
-            # Check if OpenAI client is available
-            if self.client is None:
+            # Check if a backend is available
+            provider = self.provider
+            if provider is None:
                 return {
-                    'error': 'OpenAI API key not configured',
+                    'error': self._not_configured(),
                     'text': None,
                     'tokens_used': 0,
                     'model': self.model
                 }
 
-            messages = []
+            try:
+                ai_usage.check_budget(admin_id)
+            except AIBudgetExceeded as e:
+                return {
+                    'error': str(e),
+                    'budget_exceeded': True,
+                    'text': None,
+                    'tokens_used': 0,
+                    'model': self.model
+                }
 
-            # Add system prompt if provided
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            else:
-                messages.append({
-                    "role": "system",
-                    "content": "You are a helpful AI assistant for website administration. You help with content management, SEO optimization, marketing insights, and general website-related questions."
-                })
+            messages = [{"role": "system", "content": system_prompt}]
 
             # Add conversation history
             if conversation_history:
@@ -72,22 +160,23 @@ class AIService:
             # Add current message
             messages.append({"role": "user", "content": message})
 
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=self.max_tokens,
-                temperature=0.7
-            )
+            result = {**provider.complete(messages, max_tokens, temperature=0.7), 'model': provider.model}
+            ai_usage.record(admin_id, feature, tokens=result['tokens_used'])
+            if key is not None:
+                self._store_response(key, result)
+            return result
 
+        except AICircuitOpen as e:
             return {
-                'text': response.choices[0].message.content,
-                'tokens_used': response.usage.total_tokens,
-                'model': self.model,
-                'finish_reason': response.choices[0].finish_reason
+                'error': str(e),
+                'unavailable': True,
+                'retry_after': e.retry_after,
+                'text': None,
+                'tokens_used': 0,
+                'model': self.model
             }
-
         except Exception as e:
+            ai_usage.record(admin_id, feature, error=True)
             return {
                 'error': str(e),
                 'text': None,
@@ -95,26 +184,114 @@ class AIService:
                 'model': self.model
             }
 
-    def generate_seo_suggestions(self, page_content, current_seo=None):
+    def stream_chat(self, message, conversation_history=None, system_prompt=None, use_cache=True,
+                    admin_id=None, feature='chat'):
+        """
+        Like chat(), but yields the completion as it is generated
+
+        Yields:
+            dict: {'type': 'delta', 'text': ...} for each chunk of text, then
+            one {'type': 'done', 'text', 'tokens_used', 'model', ...} with the
+            full response, or {'type': 'error', 'error': ...}
+        """
+        system_prompt = system_prompt or DEFAULT_SYSTEM_PROMPT
+        key = None
+        if use_cache and ai_cache.enabled:
+            key = cache_key(message, system_prompt, conversation_history, self.model, self.max_tokens)
+            cached = self._cached_response(key)
+            if cached is not None:
+                ai_usage.record(admin_id, feature, cached=True, tokens_saved=cached['tokens_saved'])
+                yield {'type': 'delta', 'text': cached['text']}
+                yield {'type': 'done', **cached}
+                return
+
+        try:
+            provider = self.provider
+        except ValueError as e:
+            yield {'type': 'error', 'error': str(e), 'model': None}
+            return
+        if provider is None:
+            yield {'type': 'error', 'error': self._not_configured(), 'model': self.model}
+            return
+
+        try:
+            ai_usage.check_budget(admin_id)
+        except AIBudgetExceeded as e:
+            yield {'type': 'error', 'error': str(e), 'budget_exceeded': True, 'model': self.model}
+            return
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if conversation_history:
+            messages.extend(conversation_history)
+        messages.append({"role": "user", "content": message})
+
+        parts = []
+        recorded = False
+        try:
+            events = provider.stream(messages, self.max_tokens, temperature=0.7)
+            finish = {}
+            try:
+                for event in events:
+                    if event['type'] == 'delta':
+                        parts.append(event['text'])
+                        yield event
+                    else:
+                        finish = event
+            finally:
+                # Stop the upstream stream if the consumer goes away early
+                events.close()
+
+            result = {
+                'text': ''.join(parts),
+                'tokens_used': finish.get('tokens_used', 0),
+                'model': provider.model,
+                'finish_reason': finish.get('finish_reason')
+            }
+            ai_usage.record(admin_id, feature, tokens=result['tokens_used'])
+            recorded = True
+            if key is not None and result['finish_reason'] is not None:
+                self._store_response(key, result)
+            yield {'type': 'done', **result}
+
+        except AICircuitOpen as e:
+            recorded = True
+            yield {'type': 'error', 'error': str(e), 'unavailable': True, 'retry_after': e.retry_after,
+                   'model': self.model}
+        except Exception as e:
+            if not recorded:
+                ai_usage.record(admin_id, feature, error=True, tokens=self._estimate_tokens(messages, parts))
+                recorded = True
+            yield {'type': 'error', 'error': str(e), 'model': self.model}
+        finally:
+            if not recorded:
+                # Abandoned mid-stream: the provider still billed what it generated
+                ai_usage.record(admin_id, feature, tokens=self._estimate_tokens(messages, parts))
+
+    def generate_seo_suggestions(self, page_content, current_seo=None, use_cache=True, stream=False, admin_id=None):
         """
         Generate SEO suggestions for a page
 
         Args:
             page_content (str): Page content
             current_seo (dict): Current SEO settings
+            use_cache (bool): Reuse the cached response for identical input
+            stream (bool): Return stream_chat() events instead of a response
+            admin_id (int): Admin charged for the request
 
         Returns:
             dict: SEO suggestions
         """
+        related = self._grounding(
+            page_content, 'Related pages on the site (keep terms consistent, but do not reuse their titles):')
         prompt = f"""Analyze the following page content and provide SEO optimization suggestions:
 
 Page Content:
-{page_content[:1000]}  # Limit to first 1000 chars
+{ai_retrieval.excerpt(page_content)}
 
 Current SEO:
 Title: {current_seo.get('title', 'Not set') if current_seo else 'Not set'}
 Description: {current_seo.get('description', 'Not set') if current_seo else 'Not set'}
-Keywords: {current_seo.get('keywords', 'Not set') if current_seo else 'Not set'}
+Keywords: {current_seo.get('keywords', 'Not set') if current_seo else 'Not set'}{related}
 
 Please provide:
 1. Suggested meta title (max 60 characters)
@@ -124,23 +301,29 @@ Please provide:
 
 Format your response as JSON."""
 
-        response = self.chat(prompt)
+        if stream:
+            return self.stream_chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='seo-suggestions')
+        response = self.chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='seo-suggestions')
         return response
 
-    def generate_marketing_insights(self, analytics_data):
+    def generate_marketing_insights(self, analytics_data, use_cache=True, stream=False, admin_id=None):
         """
         Generate marketing insights from analytics data
 
         Args:
             analytics_data (dict): Analytics data
+            use_cache (bool): Reuse the cached response for identical input
+            stream (bool): Return stream_chat() events instead of a response
+            admin_id (int): Admin charged for the request
 
         Returns:
             dict: Marketing insights
         """
+        related = self._grounding(str(analytics_data), 'Site content related to this data:')
         prompt = f"""Analyze the following website analytics data and provide marketing insights:
 
 Analytics Data:
-{analytics_data}
+{analytics_data}{related}
 
 Please provide:
 1. Key trends and patterns
@@ -150,24 +333,30 @@ Please provide:
 
 Keep the response concise and actionable."""
 
-        response = self.chat(prompt)
+        if stream:
+            return self.stream_chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='marketing-insights')
+        response = self.chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='marketing-insights')
         return response
 
-    def suggest_content_improvements(self, content, content_type='general'):
+    def suggest_content_improvements(self, content, content_type='general', use_cache=True, stream=False, admin_id=None):
         """
         Suggest improvements for website content
 
         Args:
             content (str): Current content
             content_type (str): Type of content (hero, about, services, etc.)
+            use_cache (bool): Reuse the cached response for identical input
+            stream (bool): Return stream_chat() events instead of a response
+            admin_id (int): Admin charged for the request
 
         Returns:
             dict: Content improvement suggestions
         """
+        related = self._grounding(content, 'Related site content (keep facts and tone consistent with it):')
         prompt = f"""Review this website {content_type} content and suggest improvements:
 
 Current Content:
-{content}
+{content}{related}
 
 Provide suggestions for:
 1. Clarity and engagement
@@ -177,24 +366,31 @@ Provide suggestions for:
 
 Keep suggestions practical and actionable."""
 
-        response = self.chat(prompt)
+        if stream:
+            return self.stream_chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='content-improvement')
+        response = self.chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='content-improvement')
         return response
 
-    def generate_email_response(self, customer_message, context='general'):
+    def generate_email_response(self, customer_message, context='general', use_cache=True, stream=False, admin_id=None):
         """
         Generate a professional email response
 
         Args:
             customer_message (str): Customer's message
             context (str): Context (inquiry, complaint, etc.)
+            use_cache (bool): Reuse the cached response for identical input
+            stream (bool): Return stream_chat() events instead of a response
+            admin_id (int): Admin charged for the request
 
         Returns:
             dict: Generated email response
         """
+        related = self._grounding(
+            customer_message, 'Shop information relevant to the message (use it for details; do not invent others):')
         prompt = f"""Generate a professional email response to this customer message:
 
 Customer Message:
-{customer_message}
+{customer_message}{related}
 
 Context: {context}
 
@@ -206,7 +402,9 @@ The response should be:
 
 Generate only the email body, no subject line."""
 
-        response = self.chat(prompt)
+        if stream:
+            return self.stream_chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='email-response')
+        response = self.chat(prompt, use_cache=use_cache, admin_id=admin_id, feature='email-response')
         return response
 
 # Create singleton instance
@@ -0,0 +1,242 @@
+"""
+AI Streaming
+Runs streamed completions on a small dedicated thread pool and writes their
+events to Server-Sent Events responses
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .environment import load_environment
+
+DEFAULT_STREAM_WORKERS = 4
+
+# Seconds between SSE keep-alive comments while waiting for the next token
+HEARTBEAT_SECONDS = 15
+
+KEEPALIVE = ': keepalive\n\n'
+
+_END = object()
+
+
+class AIStreamBusy(Exception):
+    """All streaming slots are taken"""
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class _Writer:
+    """A detached client connection shared by its pool thread and the heartbeat thread"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+        self.written_at = time.monotonic()
+        self.alive = True
+
+    def write(self, data, blocking=True):
+        if not self.lock.acquire(blocking=blocking):
+            return False
+        try:
+            if not self.alive:
+                return False
+            try:
+                self.connection.send(data)
+            except OSError:
+                # Client went away (or stopped reading)
+                self.alive = False
+                return False
+            self.written_at = time.monotonic()
+            return True
+        finally:
+            self.lock.release()
+
+
+class AIStreamPool:
+    """
+    Dedicated pool for upstream completion streams
+
+    Each stream holds one pool thread while it talks to the AI provider. At
+    most `workers` streams run at once; further requests are refused with
+    AIStreamBusy instead of piling up on the web server's request threads.
+
+    Under backend.server the response is detached from its request thread
+    (see attach()): the pool thread writes events straight to the client
+    socket, so a stream costs one pool thread and no request thread.
+    Elsewhere (dev server, other WSGI servers) open() hands events to the
+    request thread through a queue, which then stays busy until the stream
+    ends, so each stream holds two threads.
+    """
+
+    def __init__(self, workers=None):
+        if workers is None:
+            load_environment()
+            workers = int(os.getenv('AI_STREAM_WORKERS', DEFAULT_STREAM_WORKERS))
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._writers = set()
+        self._heartbeat = None
+        self.active = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-stream')
+            return self._executor
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            raise AIStreamBusy()
+        with self._lock:
+            self.active += 1
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def _finish(self, event, on_done):
+        if on_done is not None and event is not None and event['type'] == 'done':
+            try:
+                event.update(on_done(event) or {})
+            except Exception as e:
+                print(f"⚠️  AI stream completion handler failed: {e}")
+        return event
+
+    def open(self, events, on_done=None):
+        """
+        Start consuming an event generator on the pool
+
+        Args:
+            events: Iterable of events, e.g. the dicts of AIService.stream_chat;
+                None is passed on as a heartbeat
+            on_done (callable): on_done(done_event) -> dict of extra fields,
+                run on the pool thread before the 'done' event is relayed;
+                when given, the events are consumed to the end even if the
+                client has disconnected
+
+        Returns:
+            generator: Event dicts, with None as a heartbeat while waiting
+
+        Raises:
+            AIStreamBusy: If all streaming slots are in use
+        """
+        self._acquire()
+        channel = queue.Queue()
+        gone = threading.Event()
+        try:
+            self._get_executor().submit(self._produce, events, on_done, channel, gone)
+        except Exception:
+            self._release()
+            raise
+        return self._relay(channel, gone)
+
+    def _produce(self, events, on_done, channel, gone):
+        try:
+            for event in events:
+                if gone.is_set() and on_done is None:
+                    break
+                channel.put(self._finish(event, on_done))
+        except Exception as e:
+            channel.put({'type': 'error', 'error': str(e)})
+        finally:
+            if hasattr(events, 'close'):
+                events.close()
+            channel.put(_END)
+            self._release()
+
+    def _relay(self, channel, gone):
+        try:
+            while True:
+                try:
+                    event = channel.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield None
+                    continue
+                if event is _END:
+                    return
+                yield event
+        finally:
+            gone.set()
+
+    def attach(self, events, render, on_done=None):
+        """
+        Reserve a slot for a stream written straight to a detached connection
+
+        Args:
+            events: As for open()
+            render (callable): render(event) -> SSE text, with None for a heartbeat
+            on_done (callable): As for open()
+
+        Returns:
+            callable: writer(connection) for environ['server.detach'];
+                it starts the stream on the pool and returns at once
+
+        Raises:
+            AIStreamBusy: If all streaming slots are in use
+        """
+        self._acquire()
+
+        def writer(connection):
+            try:
+                self._get_executor().submit(self._pump, events, render, on_done, _Writer(connection))
+            except Exception:
+                connection.close()
+                self._release()
+                raise
+        return writer
+
+    def _pump(self, events, render, on_done, writer):
+        self._watch(writer)
+        try:
+            for event in events:
+                if not writer.write(render(self._finish(event, on_done))) and on_done is None:
+                    break
+        except Exception as e:
+            writer.write(render({'type': 'error', 'error': str(e)}))
+        finally:
+            if hasattr(events, 'close'):
+                events.close()
+            with self._lock:
+                self._writers.discard(writer)
+            with writer.lock:
+                writer.alive = False
+                writer.connection.close()
+            self._release()
+
+    def _watch(self, writer):
+        """Add a writer to the heartbeat thread's list, starting the thread if needed"""
+        with self._lock:
+            self._writers.add(writer)
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(target=self._beat, name='ai-stream-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        """Keep proxies from closing detached streams that are waiting for the provider"""
+        while True:
+            time.sleep(1)
+            with self._lock:
+                writers = list(self._writers)
+            now = time.monotonic()
+            for writer in writers:
+                if now - writer.written_at >= HEARTBEAT_SECONDS:
+                    # Skipped while the pool thread is writing anyway
+                    writer.write(KEEPALIVE, blocking=False)
+
+    def stats(self):
+        return {'workers': self.workers, 'active': self.active}
+
+
+# Create singleton instance
+ai_streams = AIStreamPool()
@@ -0,0 +1,262 @@
+"""
+AI Usage Accounting
+Per-admin, per-feature request and token counters aggregated in memory,
+flushed periodically into daily rollups, and daily/monthly token budgets
+checked before each provider call
+"""
+
+import atexit
+import os
+import threading
+import time
+from .database import get_db, dict_from_row
+
+DEFAULT_FLUSH_SECONDS = 10
+
+# Usage recorded without an admin (CLI runs, background work) goes to this id
+SYSTEM_ADMIN_ID = 0
+
+COUNTER_FIELDS = ('requests', 'tokens', 'cached', 'tokens_saved', 'errors')
+
+
+class AIBudgetExceeded(Exception):
+    """A token budget is used up"""
+
+    def __init__(self, message, period):
+        super().__init__(message)
+        self.period = period
+
+
+def _today():
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+class AIUsage:
+    """Usage counters and budget checks shared by every AI feature"""
+
+    def __init__(self):
+        self._settings = None
+        self._lock = threading.Lock()
+        # (day, admin_id, feature) -> counters not yet written to ai_usage_rollups
+        self._pending = {}
+        self._last_flush = time.time()
+        # Pid of the process whose flush thread is running (threads don't survive fork)
+        self._flusher_pid = None
+        # admin_id -> (read_at, day, month, persisted usage) for budget checks
+        self._persisted = {}
+        self.rejections = 0
+        # Since process start, by feature (for /metrics)
+        self.totals = {}
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .environment import load_environment
+            load_environment()
+            self._settings = {
+                'flush_seconds': float(os.getenv('AI_USAGE_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)),
+                'daily_tokens': int(os.getenv('AI_BUDGET_DAILY_TOKENS', 0)),
+                'monthly_tokens': int(os.getenv('AI_BUDGET_MONTHLY_TOKENS', 0)),
+                'monthly_tokens_total': int(os.getenv('AI_BUDGET_MONTHLY_TOKENS_TOTAL', 0)),
+            }
+        return self._settings
+
+    def configure(self, **settings):
+        """Override settings (flush_seconds, daily_tokens, monthly_tokens, monthly_tokens_total; 0 = no limit)"""
+        self.settings.update(settings)
+        with self._lock:
+            self._persisted.clear()
+
+    def record(self, admin_id, feature, tokens=0, cached=False, tokens_saved=0, error=False):
+        """Count one AI request; written to the database by the flush thread"""
+        key = (_today(), admin_id or SYSTEM_ADMIN_ID, feature)
+        with self._lock:
+            counters = self._pending.setdefault(key, dict.fromkeys(COUNTER_FIELDS, 0))
+            counters['requests'] += 1
+            counters['tokens'] += tokens or 0
+            counters['cached'] += 1 if cached else 0
+            counters['tokens_saved'] += tokens_saved or 0
+            counters['errors'] += 1 if error else 0
+            totals = self.totals.setdefault(feature, {'requests': 0, 'tokens': 0})
+            totals['requests'] += 1
+            totals['tokens'] += tokens or 0
+        if self._flusher_pid != os.getpid():
+            self.start_flusher()
+
+    def start_flusher(self):
+        """
+        Start the thread that flushes every `flush_seconds` in this process
+
+        The production server calls this from a post_fork hook; record()
+        starts it otherwise (dev server, CLI).
+        """
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='ai-usage-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            # Short naps so a configure() change takes effect promptly
+            time.sleep(min(1.0, max(0.1, self._last_flush + self.settings['flush_seconds'] - time.time())))
+            if time.time() - self._last_flush >= self.settings['flush_seconds']:
+                self.flush()
+
+    def flush(self):
+        """Write pending counters to ai_usage_rollups"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        if not pending:
+            return 0
+        try:
+            with get_db() as conn:
+                conn.executemany('''
+                    INSERT INTO ai_usage_rollups (day, admin_id, feature, requests, tokens, cached, tokens_saved, errors)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(day, admin_id, feature) DO UPDATE SET
+                        requests = requests + excluded.requests,
+                        tokens = tokens + excluded.tokens,
+                        cached = cached + excluded.cached,
+                        tokens_saved = tokens_saved + excluded.tokens_saved,
+                        errors = errors + excluded.errors
+                ''', [key + tuple(counters[field] for field in COUNTER_FIELDS) for key, counters in pending.items()])
+        except Exception as e:
+            # Keep the counts for the next attempt
+            print(f"⚠️  AI usage flush failed: {e}")
+            with self._lock:
+                for key, counters in pending.items():
+                    merged = self._pending.setdefault(key, dict.fromkeys(COUNTER_FIELDS, 0))
+                    for field in COUNTER_FIELDS:
+                        merged[field] += counters[field]
+            return 0
+        with self._lock:
+            self._persisted.clear()
+        return len(pending)
+
+    # Budgets
+
+    def _persisted_usage(self, admin_id, day, month):
+        """Tokens already in the rollups: admin's day, admin's month, everyone's month"""
+        with self._lock:
+            cached = self._persisted.get(admin_id)
+        if cached and cached[1] == day and time.time() - cached[0] < self.settings['flush_seconds']:
+            return cached[3]
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(SUM(CASE WHEN admin_id = ? AND day = ? THEN tokens END), 0),
+                       COALESCE(SUM(CASE WHEN admin_id = ? THEN tokens END), 0),
+                       COALESCE(SUM(tokens), 0)
+                FROM ai_usage_rollups
+                WHERE day >= ?
+            ''', (admin_id, day, admin_id, f'{month}-01'))
+            usage = tuple(cursor.fetchone())
+        with self._lock:
+            self._persisted[admin_id] = (time.time(), day, month, usage)
+        return usage
+
+    def usage_for(self, admin_id):
+        """Tokens used today and this month by an admin, and this month by everyone"""
+        admin_id = admin_id or SYSTEM_ADMIN_ID
+        day = _today()
+        month = day[:7]
+        daily, monthly, monthly_total = self._persisted_usage(admin_id, day, month)
+        with self._lock:
+            for (pending_day, pending_admin, _feature), counters in self._pending.items():
+                if pending_day[:7] != month:
+                    continue
+                monthly_total += counters['tokens']
+                if pending_admin == admin_id:
+                    monthly += counters['tokens']
+                    if pending_day == day:
+                        daily += counters['tokens']
+        return {'daily': daily, 'monthly': monthly, 'monthly_total': monthly_total}
+
+    def budget_status(self, admin_id):
+        """Usage against each configured limit (limit 0 = unlimited)"""
+        settings = self.settings
+        used = self.usage_for(admin_id)
+        return {
+            'daily': {'used': used['daily'], 'limit': settings['daily_tokens']},
+            'monthly': {'used': used['monthly'], 'limit': settings['monthly_tokens']},
+            'monthly_total': {'used': used['monthly_total'], 'limit': settings['monthly_tokens_total']},
+        }
+
+    def check_budget(self, admin_id):
+        """
+        Raise if a budget is used up; call before sending a request to the provider
+
+        Counts from other worker processes are seen once they flush, so a
+        limit can be overshot by up to a flush interval's worth of tokens.
+
+        Raises:
+            AIBudgetExceeded: With period 'daily', 'monthly' or 'monthly_total'
+        """
+        settings = self.settings
+        if not (settings['daily_tokens'] or settings['monthly_tokens'] or settings['monthly_tokens_total']):
+            return
+        used = self.usage_for(admin_id)
+        for period, limit_key, message in (
+            ('daily', 'daily_tokens', 'Daily AI token budget of {limit:,} reached'),
+            ('monthly', 'monthly_tokens', 'Monthly AI token budget of {limit:,} reached'),
+            ('monthly_total', 'monthly_tokens_total', 'Site-wide monthly AI token budget of {limit:,} reached'),
+        ):
+            limit = settings[limit_key]
+            if limit and used[period] >= limit:
+                with self._lock:
+                    self.rejections += 1
+                raise AIBudgetExceeded(message.format(limit=limit), period)
+
+    # Reports
+
+    def report(self, start=None, end=None, group_by='admin'):
+        """
+        Usage from the rollups between two days (inclusive, YYYY-MM-DD)
+
+        Args:
+            group_by (str): 'admin', 'feature', 'day' or 'admin_feature'
+
+        Returns:
+            dict: {'rows': [...], 'totals': {...}}
+        """
+        columns = {
+            'admin': ['r.admin_id', 'u.username'],
+            'feature': ['r.feature'],
+            'day': ['r.day'],
+            'admin_feature': ['r.admin_id', 'u.username', 'r.feature'],
+        }
+        if group_by not in columns:
+            raise ValueError("group_by must be admin, feature, day or admin_feature")
+        self.flush()
+
+        day = _today()
+        start = start or f'{day[:7]}-01'
+        end = end or day
+        group = ', '.join(columns[group_by])
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {group},
+                       SUM(r.requests) AS requests, SUM(r.tokens) AS tokens, SUM(r.cached) AS cached,
+                       SUM(r.tokens_saved) AS tokens_saved, SUM(r.errors) AS errors
+                FROM ai_usage_rollups r
+                LEFT JOIN admin_users u ON u.id = r.admin_id
+                WHERE r.day BETWEEN ? AND ?
+                GROUP BY {group}
+                ORDER BY {'r.day' if group_by == 'day' else 'tokens DESC'}
+            ''', (start, end))
+            rows = [dict_from_row(row) for row in cursor.fetchall()]
+
+        totals = {field: sum(row[field] or 0 for row in rows) for field in COUNTER_FIELDS}
+        return {'from': start, 'to': end, 'group_by': group_by, 'rows': rows, 'totals': totals}
+
+
+# Create singleton instance
+ai_usage = AIUsage()
+
+# Don't lose the last interval's counts on shutdown
+atexit.register(ai_usage.flush)
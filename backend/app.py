@@ -3,92 +3,209 @@ Elnaz Ashrafi Official Website - Backend Server
 Flask application with SQLite database
 """
 
-from flask import Flask, jsonify, send_from_directory
-from flask_cors import CORS
+import time
+
+_import_started = time.perf_counter()
+
+import importlib
 import os
+from flask import Flask, jsonify
+from flask_cors import CORS
 from .database import init_db
-from .routes import contact_bp, shop_bp, newsletter_bp, admin_bp
-from .routes.ai import ai_bp
-from .routes.cms import cms_bp
-from .routes.seo import seo_bp
-from .routes.analytics import analytics_bp
-
-# Initialize Flask app
-app = Flask(__name__,
-            static_folder='../frontend',
-            static_url_path='')
-
-# Enable CORS for API endpoints
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "*",
-        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE"],
-        "allow_headers": ["Content-Type", "Authorization"]
+from .environment import load_environment
+from .serialization import FastJSONProvider
+from .compression import init_compression
+from .assets import init_assets
+from .static_server import init_static_server
+from .metrics import init_metrics
+from .query_log import init_query_log
+from .query_budget import init_query_budget
+from .profiler import init_profiler
+
+# Time spent importing Flask and the shared backend modules above
+_BASE_IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# Frontend directory (served by serve_static below rather than Flask's
+# built-in static route, so in-memory and precompressed variants can be used)
+FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
+
+# Blueprint name -> (module, attribute); only the configured ones are imported
+BLUEPRINTS = {
+    'contact': ('.routes.contact', 'contact_bp'),
+    'shop': ('.routes.shop', 'shop_bp'),
+    'newsletter': ('.routes.newsletter', 'newsletter_bp'),
+    'admin': ('.routes.admin', 'admin_bp'),
+    'ai': ('.routes.ai', 'ai_bp'),
+    'cms': ('.routes.cms', 'cms_bp'),
+    'seo': ('.routes.seo', 'seo_bp'),
+    'analytics': ('.routes.analytics', 'analytics_bp'),
+}
+
+def default_config():
+    """Base app.config, read from the environment (.env included) when the app is created"""
+    return {
+        # Create missing tables on startup (INIT_DB=0 skips it for workers/CLI tools)
+        'INIT_DB': os.getenv('INIT_DB', '1').lower() not in ('0', 'false', 'no'),
+        # Names from BLUEPRINTS to register (None = all)
+        'BLUEPRINTS': None,
+        # Print the startup time breakdown after create_app
+        'REPORT_STARTUP_TIMINGS': os.getenv('STARTUP_TIMINGS', '').lower() in ('1', 'true', 'yes'),
+        # Largest request body accepted (bytes); Flask answers 413 before reading a bigger one
+        'MAX_CONTENT_LENGTH': int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024)),
     }
-})
-
-# Configuration
-app.config['JSON_SORT_KEYS'] = False
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
-
-# Initialize database
-init_db()
-
-# Register blueprints
-app.register_blueprint(contact_bp)
-app.register_blueprint(shop_bp)
-app.register_blueprint(newsletter_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(ai_bp)
-app.register_blueprint(cms_bp)
-app.register_blueprint(seo_bp)
-app.register_blueprint(analytics_bp)
-
-# Serve frontend
-@app.route('/')
-def index():
-    """Serve the main page"""
-    return send_from_directory(app.static_folder, 'index.html')
-
-@app.route('/<path:path>')
-def serve_static(path):
-    """Serve static files"""
-    return send_from_directory(app.static_folder, path)
-
-# Health check endpoint
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'message': 'Server is running',
-        'version': '1.0.0'
-    }), 200
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    """Handle 404 errors"""
-    return jsonify({
-        'success': False,
-        'message': 'Resource not found'
-    }), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    """Handle 500 errors"""
-    return jsonify({
-        'success': False,
-        'message': 'Internal server error'
-    }), 500
-
-@app.errorhandler(405)
-def method_not_allowed(error):
-    """Handle 405 errors"""
-    return jsonify({
-        'success': False,
-        'message': 'Method not allowed'
-    }), 405
+
+
+def _timed(timings, label, fn, *args):
+    """Run fn and record how long it took under label"""
+    started = time.perf_counter()
+    result = fn(*args)
+    timings[label] = timings.get(label, 0) + time.perf_counter() - started
+    return result
+
+
+def report_startup_timings(timings):
+    """Print a startup time breakdown, slowest first"""
+    total = sum(timings.values())
+    print(f"⏱️  Startup: {total * 1000:.1f} ms")
+    for label, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"   {seconds * 1000:8.1f} ms  {label}")
+
+
+def create_app(config=None):
+    """
+    Application factory
+
+    Args:
+        config (dict): Overrides for app.config (e.g. INIT_DB, BLUEPRINTS,
+            ASSETS_BUILD_ON_STARTUP, COMPRESS_PRECOMPRESS_STATIC)
+
+    Returns:
+        Flask: Configured application; the startup breakdown is kept in
+        app.extensions['startup_timings']
+    """
+    timings = {'import backend.app': _BASE_IMPORT_SECONDS}
+    # Before any setting is read, including those of modules imported below
+    _timed(timings, 'load .env', load_environment)
+
+    app = Flask(__name__, static_folder=None)
+
+    # Enable CORS for API endpoints
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": "*",
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    # Configuration
+    # Compact JSON without \u escaping of Persian text; ?pretty=1 indents for debugging
+    app.json = FastJSONProvider(app)
+    app.config['FRONTEND_DIR'] = FRONTEND_DIR
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+
+    # Request timing, status/size/DB counters and /metrics (registered first so
+    # its after_request hook runs last and sees the compressed response)
+    init_metrics(app)
+
+    # Per-statement timings, slow query log with EXPLAIN QUERY PLAN
+    init_query_log(app)
+
+    # Per-request query counts; N+1 and budget warnings in debug, failures in tests
+    init_query_budget(app)
+
+    # Opt-in sampling profiler (PROFILER_ENABLED) for a fraction of requests or admin X-Profile requests
+    init_profiler(app)
+
+    # Content-hashed JS/CSS (built before precompression so dist/ gets .gz/.br too)
+    _timed(timings, 'assets', init_assets, app)
+
+    # Gzip/Brotli for dynamic responses; .gz/.br siblings for static files
+    _timed(timings, 'compression', init_compression, app)
+
+    # Small static files served from memory; large files and images via sendfile
+    _timed(timings, 'static files', init_static_server, app)
+
+    # Initialize database
+    if app.config['INIT_DB']:
+        _timed(timings, 'init_db', init_db)
+
+    # Register blueprints
+    for name in app.config['BLUEPRINTS'] or BLUEPRINTS:
+        module_name, attribute = BLUEPRINTS[name]
+        module = _timed(timings, f'blueprint {name}', importlib.import_module, module_name, __package__)
+        app.register_blueprint(getattr(module, attribute))
+
+    _register_core_routes(app)
+
+    app.extensions['startup_timings'] = timings
+    if app.config['REPORT_STARTUP_TIMINGS']:
+        report_startup_timings(timings)
+    return app
+
+
+def _register_core_routes(app):
+    """Frontend, health check and error handlers"""
+
+    # Serve frontend
+    @app.route('/')
+    def index():
+        """Serve the main page"""
+        return serve_static('index.html')
+
+    @app.route('/<path:path>')
+    def serve_static(path):
+        """Serve static files (hashed assets are cached as immutable)"""
+        file_path, cache_control = app.extensions['assets'].resolve(path)
+        return app.extensions['static_files'].serve(file_path, cache_control)
+
+    # Health check endpoint
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        """Health check endpoint"""
+        return jsonify({
+            'status': 'healthy',
+            'message': 'Server is running',
+            'version': '1.0.0'
+        }), 200
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
+        """Handle 404 errors"""
+        return jsonify({
+            'success': False,
+            'message': 'Resource not found'
+        }), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        """Handle 500 errors"""
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error'
+        }), 500
+
+    @app.errorhandler(405)
+    def method_not_allowed(error):
+        """Handle 405 errors"""
+        return jsonify({
+            'success': False,
+            'message': 'Method not allowed'
+        }), 405
+
+
+def __getattr__(name):
+    # `from backend.app import app` keeps working: the default app is
+    # created on first access instead of at import time
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Run the application (when running as module: python -m backend.app)
 if __name__ == '__main__':
@@ -102,7 +219,7 @@ if __name__ == '__main__':
     print("💡 Tip: You can also run 'python run_server.py' from the root directory")
     print("="*60 + "\n")
 
-    app.run(
+    create_app().run(
         host='0.0.0.0',
         port=5008,
         debug=True
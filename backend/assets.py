@@ -0,0 +1,179 @@
+"""
+Static Asset Pipeline
+Minifies and content-hashes frontend JS/CSS, rewrites HTML references,
+and keeps the resulting manifest in memory for immutable caching
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+
+# Source folders (relative to the frontend directory) that get fingerprinted
+ASSET_DIRS = ('js', 'css')
+
+# Build output folder (relative to the frontend directory)
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# src="js/app.js" / href="/css/style.css" in HTML pages
+_REFERENCE_PATTERN = re.compile(r'''(\b(?:src|href)\s*=\s*["'])/?((?:js|css)/[^"'?#]+)(["'])''')
+
+
+def minify_css(source):
+    """Remove comments and redundant whitespace from a stylesheet"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    # Spaces around ':' are left alone (they matter in selectors like "a :hover")
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """
+    Conservatively shrink a script
+
+    Drops indentation, blank lines and whole-line // comments. Lines inside
+    multi-line template literals are kept verbatim, and nothing else is
+    rewritten, so the result behaves exactly like the source.
+    """
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_template:
+            lines.append(line)
+        elif stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+        # An odd number of unescaped backticks toggles template-literal state
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write_if_changed(path, data):
+    """Write bytes to path unless it already holds exactly those bytes"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def build_assets(frontend_dir):
+    """
+    Fingerprint JS/CSS and rewrite the HTML pages that reference them
+
+    Writes dist/js/<name>.<hash>.js, dist/css/<name>.<hash>.css, rewritten
+    copies of the top-level HTML pages and dist/manifest.json. Unchanged
+    outputs are not rewritten, so repeated builds are cheap.
+
+    Returns:
+        dict: The manifest ({'assets': {source: hashed}, 'pages': [...]})
+    """
+    dist_dir = os.path.join(frontend_dir, DIST_DIR)
+    assets = {}
+
+    for asset_dir in ASSET_DIRS:
+        source_dir = os.path.join(frontend_dir, asset_dir)
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            base, ext = os.path.splitext(name)
+            if ext not in MINIFIERS:
+                continue
+            with open(os.path.join(source_dir, name), encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = f'{DIST_DIR}/{asset_dir}/{base}.{digest}{ext}'
+            _write_if_changed(os.path.join(frontend_dir, hashed), data)
+            assets[f'{asset_dir}/{name}'] = hashed
+
+    def rewrite(match):
+        hashed = assets.get(match.group(2))
+        if not hashed:
+            return match.group(0)
+        return f'{match.group(1)}{hashed}{match.group(3)}'
+
+    pages = []
+    for name in sorted(os.listdir(frontend_dir)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(frontend_dir, name), encoding='utf-8') as f:
+            html = _REFERENCE_PATTERN.sub(rewrite, f.read())
+        _write_if_changed(os.path.join(dist_dir, name), html.encode('utf-8'))
+        pages.append(name)
+
+    manifest = {'assets': assets, 'pages': pages}
+    _write_if_changed(os.path.join(dist_dir, MANIFEST_NAME),
+                      json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class AssetManifest:
+    """In-memory view of dist/manifest.json used when serving static files"""
+
+    def __init__(self, manifest=None):
+        manifest = manifest or {}
+        self.assets = dict(manifest.get('assets', {}))
+        self.hashed = set(self.assets.values())
+        self.pages = set(manifest.get('pages', []))
+
+    @classmethod
+    def load(cls, frontend_dir):
+        """Load the manifest from disk (empty if the build has not run)"""
+        try:
+            with open(os.path.join(frontend_dir, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+                return cls(json.load(f))
+        except (OSError, ValueError):
+            return cls()
+
+    def resolve(self, path):
+        """
+        Map a request path to the file to send and its Cache-Control value
+
+        Returns:
+            tuple: (path relative to the frontend directory, cache control or None)
+        """
+        if path in self.hashed:
+            return path, IMMUTABLE_CACHE_CONTROL
+        if path in self.pages:
+            # HTML must be revalidated so new asset hashes are picked up
+            return f'{DIST_DIR}/{path}', REVALIDATE_CACHE_CONTROL
+        return path, None
+
+
+def init_assets(app):
+    """Build (optionally) and load the asset manifest for the app"""
+    frontend_dir = app.config['FRONTEND_DIR']
+    if app.config.setdefault('ASSETS_BUILD_ON_STARTUP', True):
+        try:
+            build_assets(frontend_dir)
+        except OSError as e:
+            print(f"Warning: Failed to build static assets: {e}")
+    app.extensions['assets'] = AssetManifest.load(frontend_dir)
+    return app.extensions['assets']
+
+
+if __name__ == '__main__':
+    # Build step: python -m backend.assets [frontend_directory]
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(__file__), '..', 'frontend')
+    result = build_assets(target)
+    print(f"✅ Built {len(result['assets'])} asset(s) and {len(result['pages'])} page(s)")
+    for source, hashed in sorted(result['assets'].items()):
+        print(f"   {source} -> {hashed}")
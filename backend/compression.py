@@ -0,0 +1,176 @@
+"""
+Response Compression
+Accept-Encoding negotiation for dynamic responses and precompressed static files
+"""
+
+import gzip
+import mimetypes
+import os
+import sys
+from flask import request, send_from_directory
+
+# brotli is optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are not worth the CPU and header overhead
+DEFAULT_MIN_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml',
+}
+
+# Static file types that get .gz/.br siblings
+PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.txt')
+
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    """Content encodings this server can produce, best first"""
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate_encoding():
+    """Pick the best encoding the current request accepts (or None)"""
+    accepted = request.accept_encodings
+    for encoding in available_encodings():
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress_bytes(data, encoding):
+    """Compress data with the given content encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _add_vary(response):
+    """Make caches key on Accept-Encoding"""
+    response.vary.add('Accept-Encoding')
+
+
+def compress_response(response, min_size=DEFAULT_MIN_SIZE):
+    """Compress a buffered response in place when the client accepts it"""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    _add_vary(response)
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # Different bytes need a different validator
+        etag, weak = response.get_etag()
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
+
+
+def _is_fresh(source, sibling):
+    """Check that a precompressed sibling exists and is not older than its source"""
+    try:
+        return os.path.getmtime(sibling) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def precompress_static(directory, min_size=DEFAULT_MIN_SIZE):
+    """
+    Write .gz (and .br when brotli is installed) siblings for static files
+
+    Only files that are new or changed since their sibling was written are
+    compressed, so this is cheap to run on every startup.
+
+    Returns:
+        int: Number of sibling files written
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            if os.path.getsize(source) < min_size:
+                continue
+
+            data = None
+            for encoding in available_encodings():
+                sibling = source + ENCODING_SUFFIXES[encoding]
+                if _is_fresh(source, sibling):
+                    continue
+                if data is None:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                # Best compression: this runs once per file, not per request
+                if encoding == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9)
+                tmp_path = sibling + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, sibling)
+                written += 1
+    return written
+
+
+def send_static(directory, path):
+    """Serve a static file, using a precompressed sibling when one fits"""
+    if path.endswith(PRECOMPRESS_EXTENSIONS):
+        source = os.path.join(directory, path)
+        accepted = request.accept_encodings
+        for encoding in available_encodings():
+            sibling = source + ENCODING_SUFFIXES[encoding]
+            if accepted[encoding] > 0 and _is_fresh(source, sibling):
+                response = send_from_directory(
+                    directory, path + ENCODING_SUFFIXES[encoding],
+                    mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                )
+                response.headers['Content-Encoding'] = encoding
+                _add_vary(response)
+                return response
+
+    response = send_from_directory(directory, path)
+    if path.endswith(PRECOMPRESS_EXTENSIONS):
+        _add_vary(response)
+    return response
+
+
+def init_compression(app):
+    """Register dynamic compression and precompress the static folder"""
+    min_size = app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    app.config.setdefault('COMPRESS_PRECOMPRESS_STATIC', True)
+
+    if app.config['COMPRESS_PRECOMPRESS_STATIC'] and app.config.get('FRONTEND_DIR'):
+        try:
+            precompress_static(app.config['FRONTEND_DIR'], min_size)
+        except OSError as e:
+            print(f"Warning: Failed to precompress static files: {e}")
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, min_size)
+
+
+if __name__ == '__main__':
+    # Build step: python -m backend.compression [directory]
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(__file__), '..', 'frontend')
+    count = precompress_static(target)
+    print(f"✅ Wrote {count} precompressed file(s) in {os.path.abspath(target)}")
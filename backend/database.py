@@ -5,11 +5,72 @@ SQLite database configuration and initialization
 
 import sqlite3
 import os
+import time
 from contextlib import contextmanager
 
 # Database file path
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'elnaz_ashrafi.db')
 
+# Callables run on every new connection (e.g. per-worker PRAGMAs set by server hooks)
+_connection_hooks = []
+
+def add_connection_hook(hook):
+    """Register hook(conn) to run whenever get_db opens a connection"""
+    if hook not in _connection_hooks:
+        _connection_hooks.append(hook)
+    return hook
+
+# Callables notified of every statement run through get_db connections
+_query_listeners = []
+
+def add_query_listener(listener):
+    """Register listener(sql, params, seconds), called after each execute/executemany"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+    return listener
+
+def remove_query_listener(listener):
+    """Unregister a query listener"""
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement timings to the query listeners"""
+
+    def execute(self, sql, parameters=()):
+        if not _query_listeners:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            for listener in _query_listeners:
+                listener(sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _query_listeners:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            for listener in _query_listeners:
+                listener(sql, None, elapsed)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute) are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
 def init_db():
     """Initialize database with required tables"""
     conn = sqlite3.connect(DB_PATH)
@@ -119,6 +180,115 @@ def init_db():
         )
     ''')
 
+    # AI Chat Sessions Table (see backend/ai_context.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            title TEXT,
+            summary TEXT,
+            summary_upto INTEGER DEFAULT 0,
+            summary_tokens INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (admin_id) REFERENCES admin_users(id)
+        )
+    ''')
+
+    # Add session_id to existing ai_conversations table if it doesn't exist (migration)
+    try:
+        cursor.execute("SELECT session_id FROM ai_conversations LIMIT 1")
+    except:
+        cursor.execute("ALTER TABLE ai_conversations ADD COLUMN session_id INTEGER")
+
+    # AI Response Cache Table (see backend/ai_cache.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            tokens_used INTEGER DEFAULT 0,
+            size_bytes INTEGER NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+    # AI Usage Rollups Table (see backend/ai_usage.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_usage_rollups (
+            day TEXT NOT NULL,
+            admin_id INTEGER NOT NULL,
+            feature TEXT NOT NULL,
+            requests INTEGER DEFAULT 0,
+            tokens INTEGER DEFAULT 0,
+            cached INTEGER DEFAULT 0,
+            tokens_saved INTEGER DEFAULT 0,
+            errors INTEGER DEFAULT 0,
+            PRIMARY KEY (day, admin_id, feature)
+        )
+    ''')
+
+    # AI Retrieval Change Log (filled by triggers below, drained by backend/ai_retrieval.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_retrieval_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # AI Retrieval Passages, with a full-text index over their normalised terms
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ai_retrieval_passages'")
+    retrieval_is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_retrieval_passages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            title TEXT,
+            passage TEXT NOT NULL,
+            terms TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_retrieval_passages_row ON ai_retrieval_passages(source, row_id)')
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS ai_retrieval_fts USING fts5(
+                terms, content='ai_retrieval_passages', content_rowid='id',
+                tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+            )
+        ''')
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS ai_retrieval_vocab USING fts5vocab(ai_retrieval_fts, 'row')")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  SQLite has no FTS5, AI retrieval is unavailable: {e}")
+
+    # AI Jobs Table (see backend/ai_jobs.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_jobs (
+            id TEXT PRIMARY KEY,
+            admin_id INTEGER,
+            kind TEXT NOT NULL,
+            params TEXT,
+            use_cache INTEGER DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            partial_text TEXT,
+            tokens_used INTEGER DEFAULT 0,
+            cancel_requested INTEGER DEFAULT 0,
+            worker_pid INTEGER,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            deadline REAL NOT NULL,
+            FOREIGN KEY (admin_id) REFERENCES admin_users(id)
+        )
+    ''')
+
     # SEO Settings Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS seo_settings (
@@ -132,6 +302,65 @@ def init_db():
         )
     ''')
 
+    # SEO Batch Generation Tables (see backend/seo_batch.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS seo_batch_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL DEFAULT 'running',
+            sources TEXT NOT NULL,
+            concurrency INTEGER DEFAULT 4,
+            only_missing INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            processed INTEGER DEFAULT 0,
+            succeeded INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            cached INTEGER DEFAULT 0,
+            tokens_used INTEGER DEFAULT 0,
+            active_seconds REAL DEFAULT 0,
+            error TEXT,
+            worker_pid INTEGER,
+            created_by INTEGER,
+            created_at REAL NOT NULL,
+            resumed_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL,
+            FOREIGN KEY (created_by) REFERENCES admin_users(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS seo_batch_items (
+            run_id INTEGER NOT NULL,
+            page TEXT NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            tokens_used INTEGER DEFAULT 0,
+            finished_at REAL,
+            PRIMARY KEY (run_id, page),
+            FOREIGN KEY (run_id) REFERENCES seo_batch_runs(id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS seo_drafts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page TEXT UNIQUE NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            run_id INTEGER,
+            title TEXT,
+            description TEXT,
+            keywords TEXT,
+            raw_response TEXT,
+            tokens_used INTEGER DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'draft',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
     # Products Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS products (
@@ -353,6 +582,22 @@ def init_db():
         )
     ''')
 
+    # Product Image Variants Table (resized/WebP renditions for srcset)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_image_variants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_image_id INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            format TEXT NOT NULL,
+            url TEXT NOT NULL,
+            file_size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_image_id) REFERENCES product_images(id),
+            UNIQUE(product_image_id, width, format)
+        )
+    ''')
+
     # Wishlist Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS wishlists (
@@ -391,6 +636,12 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_active ON admin_sessions(is_active, expires_at)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_analytics_created ON analytics_events(created_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_conversations_admin ON ai_conversations(admin_id, created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_conversations_session ON ai_conversations(session_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_sessions_admin ON ai_sessions(admin_id, updated_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_response_cache_used ON ai_response_cache(last_used_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_jobs_admin ON ai_jobs(admin_id, status, created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_jobs_status ON ai_jobs(status, deadline)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_seo_drafts_status ON seo_drafts(status, updated_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_available ON products(is_available)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_cart_session ON cart_items(session_id)')
@@ -408,6 +659,7 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_reviews_approved ON product_reviews(is_approved)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_status_history_order ON order_status_history(order_id, created_at DESC)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_images_product ON product_images(product_id, display_order)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_image_variants_image ON product_image_variants(product_image_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_wishlists_user ON wishlists(user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_addresses_user ON customer_addresses(user_id)')
 
@@ -450,6 +702,26 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_number ON support_tickets(ticket_number)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_messages_ticket ON ticket_messages(ticket_id, created_at ASC)')
 
+    # Log writes to the content the AI retrieval index covers, so the index
+    # is updated incrementally whichever code path or process wrote
+    for table, source, columns in (
+        ('products', 'product', 'name_fa, name_en, description_fa, description_en, category, is_available'),
+        ('site_content', 'content', 'section, content_key, content_value, content_type'),
+        ('shop_pages', 'shop_page', 'page_key, title_fa, content_fa, is_active'),
+        ('seo_settings', 'seo', 'page, title, description, keywords'),
+    ):
+        for name, event, row in (('insert', 'INSERT', 'NEW'), ('update', f'UPDATE OF {columns}', 'NEW'),
+                                 ('delete', 'DELETE', 'OLD')):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_retrieval_{name} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO ai_retrieval_changes (source, row_id) VALUES ('{source}', {row}.id);
+                END
+            ''')
+        if retrieval_is_new:
+            # Queue existing rows so the first sync builds the index
+            cursor.execute(f"INSERT INTO ai_retrieval_changes (source, row_id) SELECT '{source}', id FROM {table}")
+
     conn.commit()
     conn.close()
     print("✅ Database initialized successfully!")
@@ -457,9 +729,11 @@ def init_db():
 @contextmanager
 def get_db():
     """Context manager for database connections"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row  # Return rows as dictionaries
     try:
+        for hook in _connection_hooks:
+            hook(conn)
         yield conn
         conn.commit()
     except Exception as e:
@@ -471,3 +745,69 @@ def get_db():
 def dict_from_row(row):
     """Convert sqlite3.Row to dictionary"""
     return {key: row[key] for key in row.keys()}
+
+class RecordSet:
+    """
+    Query result kept as plain tuples with a precomputed column map
+
+    Avoids building one dict per row; use to_dicts() only where a caller
+    really needs mutable mappings.
+    """
+
+    __slots__ = ('columns', 'rows', 'index')
+
+    def __init__(self, columns, rows):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self.index = {name: position for position, name in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def column(self, name):
+        """Get all values of one column"""
+        position = self.index[name]
+        return [row[position] for row in self.rows]
+
+    def with_column(self, name, values):
+        """Return a new RecordSet with one extra column appended"""
+        return RecordSet(self.columns + (name,),
+                         [row + (value,) for row, value in zip(self.rows, values)])
+
+    def to_dicts(self):
+        """Convert to a list of dictionaries (compatibility path)"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+def query_records(conn, query, params=()):
+    """Execute a query and return the result as a RecordSet of tuples"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    return RecordSet((column[0] for column in cursor.description), cursor.fetchall())
+
+def iter_query(query, params=(), chunk_size=1000):
+    """
+    Lazily iterate over a query result in chunks
+
+    Yields the tuple of column names first, then one plain tuple per row.
+    Rows are pulled from the cursor with fetchmany, so memory stays bounded
+    by chunk_size no matter how large the result is. The connection stays
+    open until the generator is exhausted or closed.
+    """
+    with get_db() as conn:
+        conn.row_factory = None
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        yield tuple(column[0] for column in cursor.description)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
@@ -0,0 +1,15 @@
+"""
+Environment
+Loads settings from the project's .env file once per process
+"""
+
+_loaded = False
+
+
+def load_environment():
+    """Load environment variables from .env (once; variables already set win)"""
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _loaded = True
@@ -0,0 +1,56 @@
+"""
+Export Utilities
+Streaming CSV generation for large admin exports
+"""
+
+import csv
+import io
+import zlib
+
+# Rows buffered before a chunk is handed to the WSGI server
+ROWS_PER_CHUNK = 500
+
+# Byte order mark so spreadsheet apps detect UTF-8 (Persian text)
+UTF8_BOM = '\ufeff'
+
+
+def iter_csv(rows, rows_per_chunk=ROWS_PER_CHUNK):
+    """
+    Encode an iterable of row tuples as CSV byte chunks
+
+    The first item of rows is written as the header and flushed on its own,
+    so the first byte goes out before the rest of the query is consumed.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write(UTF8_BOM)
+
+    pending = 0
+    header_sent = False
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if not header_sent or pending >= rows_per_chunk:
+            header_sent = True
+            pending = 0
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip-compress a stream of byte chunks without buffering the whole body"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Sync-flush the header chunk so the client sees bytes right away
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
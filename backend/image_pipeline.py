@@ -0,0 +1,217 @@
+"""
+Product Image Pipeline
+Generates resized JPEG and WebP variants in a process pool and stores them
+in a content-addressed cache for srcset-ready product images
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Pillow is optional; without it images are served as uploaded
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend'))
+
+# Variants live under frontend/assets/cache/<2 hex>/<digest>-<width>.<ext>
+CACHE_URL_PREFIX = 'assets/cache'
+UPLOAD_URL_PREFIX = 'assets/uploads'
+
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+VARIANT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+ALLOWED_UPLOAD_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif'}
+
+
+def local_path_for_url(image_url, frontend_dir=FRONTEND_DIR):
+    """
+    Map a stored image_url to a file inside the frontend directory
+
+    Returns None for remote URLs and for paths outside the frontend directory.
+    """
+    if not image_url or '://' in image_url or image_url.startswith('//'):
+        return None
+    relative = image_url.lstrip('/')
+    if relative.startswith('frontend/'):
+        relative = relative[len('frontend/'):]
+    path = os.path.abspath(os.path.join(frontend_dir, relative))
+    if not path.startswith(frontend_dir + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def render_variants(source_path, frontend_dir=FRONTEND_DIR, widths=VARIANT_WIDTHS):
+    """
+    Write every width/format variant of one image (runs in a worker process)
+
+    Output names are derived from the source bytes, so identical uploads
+    share files and existing variants are never re-encoded.
+
+    Returns:
+        list: One dict per variant (width, height, format, url, file_size)
+    """
+    with open(source_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:20]
+
+    cache_dir = os.path.join(frontend_dir, CACHE_URL_PREFIX, digest[:2])
+    os.makedirs(cache_dir, exist_ok=True)
+
+    variants = []
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        # Never upscale; always produce at least one variant at the original width
+        targets = [width for width in widths if width < original.width] or [original.width]
+        for width in targets:
+            height = max(1, round(original.height * width / original.width))
+            resized = None
+            for fmt, options in VARIANT_FORMATS.items():
+                name = f'{digest}-{width}.{VARIANT_EXTENSIONS[fmt]}'
+                path = os.path.join(cache_dir, name)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = original.resize((width, height), Image.LANCZOS)
+                    image = resized
+                    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                        image = image.convert('RGB')
+                    tmp_path = path + '.tmp'
+                    image.save(tmp_path, **options)
+                    os.replace(tmp_path, path)
+                variants.append({
+                    'width': width,
+                    'height': height,
+                    'format': fmt,
+                    'url': f'{CACHE_URL_PREFIX}/{digest[:2]}/{name}',
+                    'file_size': os.path.getsize(path)
+                })
+    return variants
+
+
+class ImagePipeline:
+    """Process pool front-end that records finished variants in the database"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.getenv('IMAGE_WORKERS', 2))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """Whether image processing is possible (Pillow installed)"""
+        return Image is not None
+
+    @property
+    def executor(self):
+        """Lazily start the process pool on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def submit(self, product_image_id, image_url):
+        """
+        Queue variant generation for a product image
+
+        Returns:
+            Future or None: None when Pillow is missing or the image is not local
+        """
+        source_path = local_path_for_url(image_url)
+        if not self.available or source_path is None:
+            return None
+
+        future = self.executor.submit(render_variants, source_path)
+        future.add_done_callback(lambda done: self._record(product_image_id, done))
+        return future
+
+    def _record(self, product_image_id, future):
+        """Store the variants of a finished job"""
+        from .models import ProductImage
+        try:
+            ProductImage.record_variants(product_image_id, future.result())
+        except Exception as e:
+            print(f"Warning: Image variants failed for image #{product_image_id}: {e}")
+
+    def process_pending(self):
+        """Queue every image that has no variants yet (import/backfill)"""
+        from .models import ProductImage
+        futures = []
+        for image in ProductImage.get_unprocessed():
+            future = self.submit(image['id'], image['image_url'])
+            if future is not None:
+                futures.append(future)
+        return futures
+
+    def shutdown(self, wait=True):
+        """Stop the process pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+def save_upload(file_storage, frontend_dir=FRONTEND_DIR):
+    """
+    Store an uploaded original under a content-addressed name
+
+    Returns:
+        str: image_url relative to the frontend directory
+    """
+    extension = os.path.splitext(file_storage.filename or '')[1].lower().lstrip('.')
+    if extension not in ALLOWED_UPLOAD_EXTENSIONS:
+        raise ValueError('فرمت تصویر پشتیبانی نمی‌شود')
+
+    data = file_storage.read()
+    if Image is not None:
+        # Reject files that are not decodable images
+        import io
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()
+                detected = (image.format or '').lower()
+        except Exception:
+            raise ValueError('فایل تصویر نامعتبر است')
+        # Trust the decoded format over the client-supplied file name
+        if detected in ALLOWED_UPLOAD_EXTENSIONS:
+            extension = 'jpg' if detected == 'jpeg' else detected
+
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    upload_dir = os.path.join(frontend_dir, UPLOAD_URL_PREFIX)
+    os.makedirs(upload_dir, exist_ok=True)
+    name = f'{digest}.{extension}'
+    path = os.path.join(upload_dir, name)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return f'{UPLOAD_URL_PREFIX}/{name}'
+
+
+# Create singleton instance
+image_pipeline = ImagePipeline()
+
+
+if __name__ == '__main__':
+    # Import/backfill: python -m backend.image_pipeline
+    from .models import Product, ProductImage
+
+    if not image_pipeline.available:
+        print("❌ Pillow is not installed (pip install Pillow)")
+        sys.exit(1)
+
+    # Make sure every product's main image_url has a product_images row
+    for product in Product.get_all(available_only=False):
+        if product['image_url'] and local_path_for_url(product['image_url']):
+            ProductImage.get_or_create_primary(product['id'], product['image_url'])
+
+    futures = image_pipeline.process_pending()
+    for future in futures:
+        future.exception()
+    image_pipeline.shutdown()
+    print(f"✅ Processed {len(futures)} image(s)")
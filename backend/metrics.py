@@ -0,0 +1,314 @@
+"""
+Request Metrics
+Per-endpoint latency histograms, status counts, payload sizes and DB usage,
+exposed on /metrics in the Prometheus text format
+"""
+
+import os
+import sys
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from .database import add_query_listener
+
+# Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for position, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+
+
+class EndpointStats:
+    """Everything recorded for one (blueprint, endpoint, method)"""
+
+    __slots__ = ('latency', 'statuses', 'request_bytes', 'response_bytes',
+                 'db_seconds', 'db_queries', 'max_db_queries')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.max_db_queries = 0
+
+
+def _escape(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe store of request metrics for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.reset()
+
+    def reset(self):
+        """Clear all recorded metrics"""
+        with self._lock:
+            self.endpoints = {}
+            self.in_progress = 0
+
+    def request_started(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def record(self, blueprint, endpoint, method, status, seconds,
+               request_bytes, response_bytes, db_queries, db_seconds):
+        """Record one finished request"""
+        key = (blueprint or '', endpoint or 'none', method)
+        with self._lock:
+            self.in_progress -= 1
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.latency.observe(seconds)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.db_seconds += db_seconds
+            stats.db_queries += db_queries
+            if db_queries > stats.max_db_queries:
+                stats.max_db_queries = db_queries
+
+    def render(self, extra_gauges=None, extra_counters=None):
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Every sample carries a pid label: under the prefork server each worker
+        keeps its own registry and a scrape reaches whichever worker accepts
+        it, so counters are only monotonic per pid (sum them without pid).
+        """
+        lines = []
+        pid = os.getpid()
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+            header('http_requests_total', 'counter', 'Finished HTTP requests.')
+            for (blueprint, endpoint, method), stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('http_requests_total' + _labels(
+                        pid=pid, blueprint=blueprint, endpoint=endpoint, method=method, status=status) + f' {count}')
+
+            header('http_request_duration_seconds', 'histogram', 'Request latency.')
+            for (blueprint, endpoint, method), stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.latency.counts):
+                    cumulative += count
+                    lines.append('http_request_duration_seconds_bucket' + _labels(
+                        pid=pid, blueprint=blueprint, endpoint=endpoint, method=method, le=bound) + f' {cumulative}')
+                labels = _labels(pid=pid, blueprint=blueprint, endpoint=endpoint, method=method)
+                lines.append('http_request_duration_seconds_bucket' + _labels(
+                    pid=pid, blueprint=blueprint, endpoint=endpoint, method=method, le='+Inf') + f' {stats.latency.count}')
+                lines.append(f'http_request_duration_seconds_sum{labels} {stats.latency.sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{labels} {stats.latency.count}')
+
+            for name, attribute, help_text in (
+                ('http_request_size_bytes_total', 'request_bytes', 'Request body bytes received.'),
+                ('http_response_size_bytes_total', 'response_bytes', 'Response body bytes sent (after compression).'),
+                ('db_queries_total', 'db_queries', 'SQL statements executed while handling requests.'),
+                ('db_query_duration_seconds_total', 'db_seconds', 'Time spent executing SQL statements.'),
+            ):
+                header(name, 'counter', help_text)
+                for (blueprint, endpoint, method), stats in endpoints:
+                    value = getattr(stats, attribute)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(name + _labels(
+                        pid=pid, blueprint=blueprint, endpoint=endpoint, method=method) + f' {value}')
+
+            header('db_queries_per_request_max', 'gauge', 'Most SQL statements executed by a single request.')
+            for (blueprint, endpoint, method), stats in endpoints:
+                lines.append('db_queries_per_request_max' + _labels(
+                    pid=pid, blueprint=blueprint, endpoint=endpoint, method=method) + f' {stats.max_db_queries}')
+
+            header('http_requests_in_progress', 'gauge', 'Requests currently being handled.')
+            lines.append(f'http_requests_in_progress{_labels(pid=pid)} {self.in_progress}')
+
+        header('process_start_time_seconds', 'gauge', 'Start time of this process (unix seconds).')
+        lines.append(f'process_start_time_seconds{_labels(pid=pid)} {self.started_at:.3f}')
+
+        for kind, extra in (('gauge', extra_gauges), ('counter', extra_counters)):
+            for name, help_text, samples in extra or ():
+                header(name, kind, help_text)
+                for labels, value in samples:
+                    lines.append(name + _labels(pid=pid, **(labels or {})) + f' {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Create singleton instance
+metrics = MetricsRegistry()
+
+
+def _record_query(sql, params, seconds):
+    """Query listener: attribute DB work to the current request"""
+    if has_request_context():
+        stats = g.get('_db_stats')
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += seconds
+
+
+def _extra_gauges(app):
+    """Process-level gauges from other components"""
+    gauges = []
+    static_files = app.extensions.get('static_files')
+    if static_files is not None:
+        gauges.append(('static_cache_files', 'Static files held in memory.', [(None, len(static_files.entries))]))
+        gauges.append(('static_cache_bytes', 'Bytes of static files held in memory.', [(None, static_files.total_size)]))
+    ai_cache_module = sys.modules.get(f'{__package__}.ai_cache')
+    if ai_cache_module is not None:
+        # Present once the AI blueprint (or service) has been imported
+        cache = ai_cache_module.ai_cache.stats()
+        gauges.append(('ai_cache_entries', 'AI responses stored in the cache.', [(None, cache['entries'])]))
+        gauges.append(('ai_cache_bytes', 'Bytes of AI responses stored in the cache.', [(None, cache['bytes'])]))
+    ai_jobs_module = sys.modules.get(f'{__package__}.ai_jobs')
+    if ai_jobs_module is not None:
+        jobs = ai_jobs_module.ai_jobs
+        gauges.append(('ai_jobs', 'AI jobs held by this process by state.',
+                       [({'state': 'queued'}, jobs.queued), ({'state': 'running'}, jobs.running)]))
+    ai_resilience_module = sys.modules.get(f'{__package__}.ai_resilience')
+    if ai_resilience_module is not None:
+        state = ai_resilience_module.ai_resilience.state
+        gauges.append(('ai_circuit_state', 'AI provider circuit breaker state in this process (1 = current).',
+                       [({'state': name}, 1 if name == state else 0)
+                        for name in ai_resilience_module.BREAKER_STATES]))
+    ai_retrieval_module = sys.modules.get(f'{__package__}.ai_retrieval')
+    if ai_retrieval_module is not None:
+        retrieval = ai_retrieval_module.ai_retrieval.stats()
+        gauges.append(('ai_retrieval_passages', 'Passages in the AI retrieval index.',
+                       [(None, retrieval['passages'])]))
+        gauges.append(('ai_retrieval_pending', 'Content changes queued for the AI retrieval index.',
+                       [(None, retrieval['pending'])]))
+    timings = app.extensions.get('startup_timings')
+    if timings:
+        gauges.append(('startup_phase_seconds', 'Time spent in each startup phase.',
+                       [({'phase': phase}, f'{seconds:.6f}') for phase, seconds in timings.items()]))
+    return gauges
+
+
+def _extra_counters(app):
+    """Process-level counters from other components (reset when the process restarts)"""
+    from .serialization import encode_stats
+
+    encoded = encode_stats.snapshot()
+    counters = [
+        ('json_encode_seconds_total', 'Time spent encoding JSON responses.',
+         [(None, f"{encoded['total_seconds']:.6f}")]),
+        ('json_encoded_bytes_total', 'Bytes of JSON produced.', [(None, encoded['total_bytes'])]),
+    ]
+    ai_cache_module = sys.modules.get(f'{__package__}.ai_cache')
+    if ai_cache_module is not None:
+        cache = dict(ai_cache_module.ai_cache.counters)
+        counters.append(('ai_cache_requests_total', 'AI response cache lookups by result.',
+                         [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]))
+        counters.append(('ai_cache_evictions_total', 'AI cache entries removed by size limits or TTL.',
+                         [({'reason': 'size'}, cache['evictions']), ({'reason': 'expired'}, cache['expired'])]))
+        counters.append(('ai_cache_tokens_saved_total', 'Completion tokens not spent thanks to cache hits.',
+                         [(None, cache['tokens_saved'])]))
+    ai_usage_module = sys.modules.get(f'{__package__}.ai_usage')
+    if ai_usage_module is not None:
+        usage = ai_usage_module.ai_usage
+        totals = dict(usage.totals)
+        counters.append(('ai_usage_requests_total', 'AI requests recorded by this process, by feature.',
+                         [({'feature': feature}, counts['requests']) for feature, counts in sorted(totals.items())]))
+        counters.append(('ai_usage_tokens_total', 'AI tokens recorded by this process, by feature.',
+                         [({'feature': feature}, counts['tokens']) for feature, counts in sorted(totals.items())]))
+        counters.append(('ai_budget_rejections_total', 'AI requests refused by a token budget in this process.',
+                         [(None, usage.rejections)]))
+    ai_resilience_module = sys.modules.get(f'{__package__}.ai_resilience')
+    if ai_resilience_module is not None:
+        resilience = dict(ai_resilience_module.ai_resilience.counters)
+        counters.append(('ai_circuit_opened_total', 'Times the AI provider circuit breaker has opened.',
+                         [(None, resilience['opened'])]))
+        counters.append(('ai_provider_errors_total', 'Retryable AI provider errors by kind.',
+                         [({'kind': 'timeout'}, resilience['timeouts']),
+                          ({'kind': 'other'}, resilience['failures'] - resilience['timeouts'])]))
+        counters.append(('ai_provider_retries_total', 'AI provider calls retried after a transient error.',
+                         [(None, resilience['retries'])]))
+        counters.append(('ai_circuit_rejections_total', 'AI requests failed fast by the open circuit breaker.',
+                         [(None, resilience['rejected'])]))
+    ai_retrieval_module = sys.modules.get(f'{__package__}.ai_retrieval')
+    if ai_retrieval_module is not None:
+        retrieval = dict(ai_retrieval_module.ai_retrieval.counters)
+        counters.append(('ai_retrieval_queries_total', 'AI retrieval index lookups in this process.',
+                         [(None, retrieval['queries'])]))
+        counters.append(('ai_retrieval_updates_total',
+                         'Queued content changes this process applied to the AI retrieval index.',
+                         [(None, retrieval['updates'])]))
+    return counters
+
+
+def init_metrics(app):
+    """Register request timing middleware and the /metrics endpoint"""
+    if not app.config.setdefault('METRICS_ENABLED', True):
+        return None
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    add_query_listener(_record_query)
+
+    @app.before_request
+    def _start_timer():
+        g._request_started = time.perf_counter()
+        g._db_stats = [0, 0.0]
+        metrics.request_started()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        queries, db_seconds = g.pop('_db_stats', (0, 0.0))
+
+        metrics.record(
+            request.blueprint, request.endpoint, request.method, response.status_code, elapsed,
+            request.content_length or 0,
+            # Streamed responses have no length up front
+            response.content_length or 0,
+            queries, db_seconds
+        )
+        response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries"')
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.2f}')
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus scrape endpoint (Bearer METRICS_TOKEN when configured)"""
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(_extra_gauges(app), _extra_counters(app)), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.extensions['metrics'] = metrics
+    return metrics
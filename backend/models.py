@@ -3,7 +3,7 @@ Database Models
 CRUD operations for Contact Forms, Shop Orders, Newsletter, Admin, Products, and Orders
 """
 
-from .database import get_db, dict_from_row
+from .database import get_db, dict_from_row, iter_query, query_records
 from datetime import datetime, timedelta
 import hashlib
 import secrets
@@ -37,6 +37,14 @@ class Contact:
                 cursor.execute(f'{query} ORDER BY created_at DESC LIMIT ?', (limit,))
             return [dict_from_row(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def iter_all(status=None, chunk_size=1000):
+        """Stream all contact submissions (column names first, then row tuples)"""
+        if status:
+            return iter_query('SELECT * FROM contacts WHERE status = ? ORDER BY created_at DESC',
+                              (status,), chunk_size)
+        return iter_query('SELECT * FROM contacts ORDER BY created_at DESC', (), chunk_size)
+
     @staticmethod
     def get_by_id(contact_id):
         """Get contact by ID"""
@@ -142,6 +150,14 @@ class Newsletter:
             cursor.execute(f'{query} ORDER BY subscribed_at DESC')
             return [dict_from_row(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def iter_all(active_only=True, chunk_size=1000):
+        """Stream all subscribers (column names first, then row tuples)"""
+        query = 'SELECT * FROM newsletter_subscribers'
+        if active_only:
+            query += ' WHERE is_active = 1'
+        return iter_query(f'{query} ORDER BY subscribed_at DESC', (), chunk_size)
+
 
 class Admin:
     """Admin User Model"""
@@ -286,8 +302,8 @@ class Product:
             return cursor.lastrowid
 
     @staticmethod
-    def get_all(category=None, available_only=True):
-        """Get all products with optional filtering"""
+    def get_all(category=None, available_only=True, as_records=False):
+        """Get all products with optional filtering (as_records returns a RecordSet)"""
         with get_db() as conn:
             cursor = conn.cursor()
             query = 'SELECT * FROM products'
@@ -305,6 +321,8 @@ class Product:
                 query += ' WHERE ' + ' AND '.join(conditions)
 
             query += ' ORDER BY created_at DESC'
+            if as_records:
+                return query_records(conn, query, params)
             cursor.execute(query, params)
             return [dict_from_row(row) for row in cursor.fetchall()]
 
@@ -447,20 +465,32 @@ class Order:
             }
 
     @staticmethod
-    def get_all(limit=50, status=None):
-        """Get all orders"""
+    def get_all(limit=50, status=None, as_records=False):
+        """Get all orders (as_records returns a RecordSet)"""
         with get_db() as conn:
             cursor = conn.cursor()
             query = 'SELECT * FROM orders'
 
             if status:
                 query += ' WHERE status = ?'
-                cursor.execute(f'{query} ORDER BY created_at DESC LIMIT ?', (status, limit))
+                params = (status, limit)
             else:
-                cursor.execute(f'{query} ORDER BY created_at DESC LIMIT ?', (limit,))
+                params = (limit,)
 
+            if as_records:
+                return query_records(conn, f'{query} ORDER BY created_at DESC LIMIT ?', params)
+
+            cursor.execute(f'{query} ORDER BY created_at DESC LIMIT ?', params)
             return [dict_from_row(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def iter_all(status=None, chunk_size=1000):
+        """Stream all orders (column names first, then row tuples)"""
+        if status:
+            return iter_query('SELECT * FROM orders WHERE status = ? ORDER BY created_at DESC',
+                              (status,), chunk_size)
+        return iter_query('SELECT * FROM orders ORDER BY created_at DESC', (), chunk_size)
+
     @staticmethod
     def get_by_id(order_id):
         """Get order by ID with items"""
@@ -574,6 +604,148 @@ class Order:
 
             return cursor.rowcount > 0
 
+    @staticmethod
+    def bulk_update_status(order_ids, status, admin_user='system', notes=None):
+        """Move many orders to a new status in one transaction
+
+        Inventory deltas of all orders are aggregated per product and written
+        with a single stock update, and status history rows are batch-inserted.
+        Orders that cannot transition (not found, already in the target status,
+        or not enough stock) are skipped and reported in the per-order results.
+        """
+        valid_statuses = ['pending', 'processing', 'completed', 'cancelled']
+        if status not in valid_statuses:
+            raise ValueError('وضعیت نامعتبر است')
+
+        # Keep request order but drop duplicate ids
+        order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+        if not order_ids:
+            return []
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(order_ids))
+
+            # Current status of every requested order
+            cursor.execute(f'SELECT id, status FROM orders WHERE id IN ({placeholders})', order_ids)
+            current_statuses = {row[0]: row[1] for row in cursor.fetchall()}
+
+            # Items of every requested order in one query
+            cursor.execute(f'''
+                SELECT order_id, product_id, quantity
+                FROM order_items
+                WHERE order_id IN ({placeholders})
+            ''', order_ids)
+            items_by_order = {}
+            for order_id, product_id, quantity in cursor.fetchall():
+                items_by_order.setdefault(order_id, []).append((product_id, quantity))
+
+            # Current stock of every product involved
+            product_ids = {product_id for items in items_by_order.values() for product_id, _ in items}
+            stock = {}
+            product_names = {}
+            if product_ids:
+                product_placeholders = ', '.join('?' * len(product_ids))
+                cursor.execute(f'''
+                    SELECT id, stock_quantity, name_fa FROM products
+                    WHERE id IN ({product_placeholders})
+                ''', list(product_ids))
+                for product_id, stock_quantity, name_fa in cursor.fetchall():
+                    stock[product_id] = stock_quantity or 0
+                    product_names[product_id] = name_fa
+            previous_stock = dict(stock)
+
+            # Same inventory rules as update_status, applied against a running
+            # stock snapshot so an order is rejected if earlier orders in the
+            # batch already consumed the remaining stock
+            results = []
+            transitions = []
+            deltas = {}
+            for order_id in order_ids:
+                current_status = current_statuses.get(order_id)
+                if current_status is None:
+                    results.append({'order_id': order_id, 'success': False,
+                                    'message': 'سفارش یافت نشد'})
+                    continue
+                if current_status == status:
+                    results.append({'order_id': order_id, 'success': False,
+                                    'old_status': current_status,
+                                    'message': 'سفارش در همین وضعیت است'})
+                    continue
+
+                items = items_by_order.get(order_id, [])
+                if current_status == 'pending' and status == 'processing':
+                    change_type, sign = 'sale', -1
+                elif status == 'cancelled' and current_status in ['processing', 'completed']:
+                    change_type, sign = 'return', 1
+                else:
+                    change_type, sign = None, 0
+
+                if change_type == 'sale':
+                    required = {}
+                    for product_id, quantity in items:
+                        required[product_id] = required.get(product_id, 0) + quantity
+                    shortages = [product_id for product_id, quantity in required.items()
+                                 if stock.get(product_id, 0) < quantity]
+                    if shortages:
+                        names = '، '.join(str(product_names.get(product_id, product_id))
+                                         for product_id in shortages)
+                        results.append({'order_id': order_id, 'success': False,
+                                        'old_status': current_status,
+                                        'message': f'موجودی کافی نیست: {names}'})
+                        continue
+
+                if change_type:
+                    for product_id, quantity in items:
+                        if product_id not in stock:
+                            continue
+                        stock[product_id] += sign * quantity
+                        key = (product_id, change_type)
+                        deltas[key] = deltas.get(key, 0) + sign * quantity
+
+                transitions.append((order_id, current_status))
+                results.append({'order_id': order_id, 'success': True,
+                                'old_status': current_status, 'new_status': status})
+
+            # One stock update per product with the aggregated delta
+            changed_products = [product_id for product_id in stock
+                                if stock[product_id] != previous_stock[product_id]]
+            cursor.executemany('UPDATE products SET stock_quantity = ? WHERE id = ?',
+                               [(stock[product_id], product_id) for product_id in changed_products])
+
+            # One history row per product and change type
+            history_rows = []
+            running = dict(previous_stock)
+            for (product_id, change_type), quantity_change in deltas.items():
+                if quantity_change == 0:
+                    continue
+                history_rows.append((
+                    product_id, quantity_change, running[product_id],
+                    running[product_id] + quantity_change, change_type, 'order_bulk',
+                    f'تغییر گروهی وضعیت سفارش‌ها به {status}', admin_user
+                ))
+                running[product_id] += quantity_change
+            cursor.executemany('''
+                INSERT INTO inventory_history
+                (product_id, quantity_change, previous_quantity, new_quantity,
+                 change_type, reference_type, notes, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', history_rows)
+
+            cursor.executemany('''
+                UPDATE orders
+                SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', [(status, order_id) for order_id, _ in transitions])
+
+            cursor.executemany('''
+                INSERT INTO order_status_history (order_id, old_status, new_status, notes, changed_by)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(order_id, old_status, status, notes, admin_user)
+                  for order_id, old_status in transitions])
+
+            return results
+
 
 class ShopUser:
     """Shop User Model for customer authentication"""
@@ -1195,6 +1367,163 @@ class ProductReview:
             return {'average_rating': 0, 'review_count': 0}
 
 
+class ProductImage:
+    """Product Image Model with responsive variants"""
+
+    @staticmethod
+    def create(product_id, image_url, is_primary=False, display_order=0):
+        """Add an image to a product (a new primary image replaces the previous one)"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO product_images (product_id, image_url, is_primary, display_order)
+                VALUES (?, ?, ?, ?)
+            ''', (product_id, image_url, 1 if is_primary else 0, display_order))
+            image_id = cursor.lastrowid
+            if is_primary:
+                ProductImage._demote_others(cursor, product_id, image_id)
+            return image_id
+
+    @staticmethod
+    def _demote_others(cursor, product_id, image_id):
+        """Leave image_id as the product's only primary image"""
+        cursor.execute('''
+            UPDATE product_images SET is_primary = 0
+            WHERE product_id = ? AND id != ? AND is_primary = 1
+        ''', (product_id, image_id))
+
+    @staticmethod
+    def get_or_create_primary(product_id, image_url):
+        """
+        Get the product_images row for a product's main image_url, creating it
+        if needed, and make it the product's only primary image
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, is_primary FROM product_images
+                WHERE product_id = ? AND image_url = ?
+            ''', (product_id, image_url))
+            row = cursor.fetchone()
+            if row:
+                image_id = row[0]
+                if not row[1]:
+                    cursor.execute('UPDATE product_images SET is_primary = 1 WHERE id = ?', (image_id,))
+            else:
+                cursor.execute('''
+                    INSERT INTO product_images (product_id, image_url, is_primary, display_order)
+                    VALUES (?, ?, 1, 0)
+                ''', (product_id, image_url))
+                image_id = cursor.lastrowid
+            ProductImage._demote_others(cursor, product_id, image_id)
+            return image_id
+
+    @staticmethod
+    def get_by_product(product_id):
+        """Get all images of a product with their variants"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM product_images
+                WHERE product_id = ?
+                ORDER BY is_primary DESC, display_order, id
+            ''', (product_id,))
+            images = [dict_from_row(row) for row in cursor.fetchall()]
+            if not images:
+                return []
+
+            by_id = {image['id']: image for image in images}
+            for image in images:
+                image['variants'] = []
+            placeholders = ', '.join('?' * len(by_id))
+            cursor.execute(f'''
+                SELECT product_image_id, width, height, format, url, file_size
+                FROM product_image_variants
+                WHERE product_image_id IN ({placeholders})
+                ORDER BY format, width
+            ''', list(by_id))
+            for row in cursor.fetchall():
+                variant = dict_from_row(row)
+                by_id[variant.pop('product_image_id')]['variants'].append(variant)
+
+            for image in images:
+                image['srcset'] = ProductImage.build_srcset(image['variants'])
+            return images
+
+    @staticmethod
+    def get_unprocessed():
+        """Get images that have no variants yet"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT pi.* FROM product_images pi
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM product_image_variants v WHERE v.product_image_id = pi.id
+                )
+                ORDER BY pi.id
+            ''')
+            return [dict_from_row(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def record_variants(product_image_id, variants):
+        """Store generated variants for an image (replacing same width/format)"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO product_image_variants
+                (product_image_id, width, height, format, url, file_size)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(product_image_id, width, format) DO UPDATE SET
+                    height = excluded.height,
+                    url = excluded.url,
+                    file_size = excluded.file_size
+            ''', [(product_image_id, v['width'], v['height'], v['format'], v['url'], v['file_size'])
+                  for v in variants])
+            return cursor.rowcount
+
+    @staticmethod
+    def build_srcset(variants):
+        """Group variants into srcset strings per format: {'webp': 'url 320w, ...'}"""
+        srcset = {}
+        for variant in sorted(variants, key=lambda v: v['width']):
+            srcset.setdefault(variant['format'], []).append(f"{variant['url']} {variant['width']}w")
+        return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+    @staticmethod
+    def get_primary_srcsets(category=None, available_only=True):
+        """
+        Get srcsets of the primary image of every product matching the
+        Product.get_all() filters, in one query
+        """
+        conditions = []
+        params = []
+        if available_only:
+            conditions.append('p.is_available = 1')
+        if category:
+            conditions.append('p.category = ?')
+            params.append(category)
+        where = ' AND '.join(conditions) or '1 = 1'
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # Primary image per product: lowest (is_primary DESC, display_order, id)
+            cursor.execute(f'''
+                SELECT pi.product_id, v.width, v.format, v.url
+                FROM products p
+                JOIN product_images pi ON pi.id = (
+                    SELECT id FROM product_images p2
+                    WHERE p2.product_id = p.id
+                    ORDER BY p2.is_primary DESC, p2.display_order, p2.id
+                    LIMIT 1
+                )
+                JOIN product_image_variants v ON v.product_image_id = pi.id
+                WHERE {where}
+            ''', params)
+            variants = {}
+            for product_id, width, fmt, url in cursor.fetchall():
+                variants.setdefault(product_id, []).append({'width': width, 'format': fmt, 'url': url})
+            return {product_id: ProductImage.build_srcset(items) for product_id, items in variants.items()}
+
+
 
 class SupportTicket:
     """Support Ticket Model"""
@@ -1262,6 +1591,22 @@ class SupportTicket:
             cursor.execute(query, params)
             return [dict_from_row(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def iter_all(status=None, user_id=None, chunk_size=1000):
+        """Stream all tickets (column names first, then row tuples)"""
+        query = 'SELECT * FROM support_tickets WHERE 1=1'
+        params = []
+
+        if status:
+            query += ' AND status = ?'
+            params.append(status)
+
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+
+        return iter_query(query + ' ORDER BY created_at DESC', params, chunk_size)
+
     @staticmethod
     def get_by_id(ticket_id):
         """Get ticket by ID"""
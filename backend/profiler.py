@@ -0,0 +1,274 @@
+"""
+Sampling Profiler
+Opt-in statistical profiling of a fraction of requests (or admin-flagged
+ones), aggregated per endpoint and exported as collapsed stacks or
+speedscope JSON
+"""
+
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from flask import g, request
+
+DEFAULT_INTERVAL_MS = 5
+
+# Recent profiled requests kept for individual inspection
+RECENT_PROFILES = 50
+
+# Distinct stacks kept per endpoint (further new stacks are dropped)
+MAX_STACKS_PER_ENDPOINT = 5000
+
+MAX_STACK_DEPTH = 128
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _frame_label(code):
+    """Readable frame name: function (path:first line)"""
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    else:
+        # Library frames: keep the part after site-packages/lib
+        for marker in ('site-packages' + os.sep, 'lib' + os.sep + 'python'):
+            position = filename.rfind(marker)
+            if position != -1:
+                filename = filename[position + len(marker):]
+                break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class RequestProfile:
+    """Samples collected for one request"""
+
+    __slots__ = ('id', 'endpoint', 'method', 'path', 'started_at', 'duration_ms', 'stacks')
+
+    def __init__(self, profile_id, endpoint, method, path):
+        self.id = profile_id
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.duration_ms = None
+        self.stacks = Counter()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'path': self.path,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'samples': sum(self.stacks.values())
+        }
+
+
+class SamplingProfiler:
+    """Background thread that samples the stacks of threads being profiled"""
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._active = {}
+        self._ids = itertools.count(1)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        """Drop all collected samples"""
+        with self._lock:
+            self.endpoints = {}
+            self.requests = Counter()
+            self.recent = deque(maxlen=RECENT_PROFILES)
+
+    def start(self, endpoint, method, path):
+        """Begin sampling the calling thread for one request"""
+        profile = RequestProfile(next(self._ids), endpoint or 'none', method, path)
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def stop(self, profile, duration_ms):
+        """Finish a request profile and merge it into its endpoint totals"""
+        with self._lock:
+            if self._active.get(threading.get_ident()) is profile:
+                del self._active[threading.get_ident()]
+            profile.duration_ms = round(duration_ms, 3)
+            totals = self.endpoints.setdefault(profile.endpoint, Counter())
+            for stack, count in profile.stacks.items():
+                if stack in totals or len(totals) < MAX_STACKS_PER_ENDPOINT:
+                    totals[stack] += count
+            self.requests[profile.endpoint] += 1
+            self.recent.append(profile)
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        labels = {}
+        while True:
+            if not self._active:
+                # Idle until the next profiled request
+                self._wakeup.clear()
+                self._wakeup.wait(1.0)
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            samples = []
+            for ident, profile in active:
+                frame = frames.get(ident)
+                if frame is None or ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.reverse()
+                samples.append((ident, profile, ';'.join(stack)))
+            del frames
+            with self._lock:
+                for ident, profile, stack in samples:
+                    # Skip requests that finished while their stack was being walked
+                    if self._active.get(ident) is profile:
+                        profile.stacks[stack] += 1
+            time.sleep(self.interval)
+
+    def _stacks(self, endpoint=None, profile_id=None):
+        """Select stack counts: one request, one endpoint or everything"""
+        with self._lock:
+            if profile_id is not None:
+                for profile in self.recent:
+                    if profile.id == profile_id:
+                        return {f'{profile.endpoint} #{profile.id}': Counter(profile.stacks)}
+                return {}
+            if endpoint:
+                return {endpoint: Counter(self.endpoints.get(endpoint, {}))}
+            return {name: Counter(stacks) for name, stacks in self.endpoints.items()}
+
+    def collapsed(self, endpoint=None, profile_id=None):
+        """
+        Brendan Gregg collapsed-stack format (input for flamegraph.pl / speedscope)
+
+        Each line is 'frame;frame;frame count'; stacks are prefixed with
+        the endpoint when several endpoints are exported together.
+        """
+        selected = self._stacks(endpoint, profile_id)
+        prefix = len(selected) > 1
+        lines = []
+        for name, stacks in sorted(selected.items()):
+            for stack, count in stacks.most_common():
+                lines.append(f'{name};{stack} {count}' if prefix else f'{stack} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, endpoint=None, profile_id=None):
+        """speedscope.app JSON document with one sampled profile per endpoint"""
+        frames = []
+        frame_index = {}
+        profiles = []
+        interval_ms = self.interval * 1000
+
+        for name, stacks in sorted(self._stacks(endpoint, profile_id).items()):
+            samples = []
+            weights = []
+            for stack, count in stacks.most_common():
+                indexes = []
+                for label in stack.split(';'):
+                    if label not in frame_index:
+                        frame_index[label] = len(frames)
+                        frames.append({'name': label})
+                    indexes.append(frame_index[label])
+                samples.append(indexes)
+                weights.append(count * interval_ms)
+            profiles.append({
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights
+            })
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': profiles,
+            'name': 'Elnaz Ashrafi backend',
+            'exporter': 'backend.profiler'
+        }
+
+    def summary(self):
+        """Profiled request and sample counts per endpoint"""
+        with self._lock:
+            return {
+                'interval_ms': self.interval * 1000,
+                'endpoints': [
+                    {'endpoint': name, 'requests': self.requests[name], 'samples': sum(stacks.values())}
+                    for name, stacks in sorted(self.endpoints.items())
+                ],
+                'recent': [profile.to_dict() for profile in reversed(self.recent)]
+            }
+
+
+# Create singleton instance
+profiler = SamplingProfiler()
+
+
+def _admin_requested(header):
+    """Honour the profiling header only for a valid admin session"""
+    if not request.headers.get(header):
+        return False
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return False
+    from .models import Admin
+    return Admin.verify_session(auth_header.split(' ')[1]) is not None
+
+
+def init_profiler(app):
+    """Profile PROFILER_SAMPLE_RATE of requests plus admin requests sending PROFILER_HEADER"""
+    enabled = app.config.setdefault(
+        'PROFILER_ENABLED', os.getenv('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes'))
+    sample_rate = app.config.setdefault('PROFILER_SAMPLE_RATE', float(os.getenv('PROFILER_SAMPLE_RATE', 0)))
+    header = app.config.setdefault('PROFILER_HEADER', 'X-Profile')
+    profiler.interval = app.config.setdefault('PROFILER_INTERVAL_MS', DEFAULT_INTERVAL_MS) / 1000
+    app.extensions['profiler'] = profiler
+    if not enabled:
+        return profiler
+
+    @app.before_request
+    def _maybe_profile():
+        if (sample_rate and random.random() < sample_rate) or _admin_requested(header):
+            g._profile = profiler.start(request.endpoint, request.method, request.path)
+            g._profile_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profiler.stop(profile, (time.perf_counter() - g.pop('_profile_started')) * 1000)
+            response.headers['X-Profile-Id'] = str(profile.id)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # Requests that failed before after_request still stop being sampled
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profiler.stop(profile, (time.perf_counter() - g.pop('_profile_started')) * 1000)
+
+    return profiler
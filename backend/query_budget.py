@@ -0,0 +1,166 @@
+"""
+Query Budgets
+Request-scoped query counting that flags N+1 patterns (the same statement
+shape repeated within one request) and endpoints exceeding their budget
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, request
+from .database import add_query_listener
+from .query_log import normalize_sql
+
+# Queries allowed per request unless the endpoint sets its own budget
+DEFAULT_QUERY_BUDGET = 25
+
+# Executions of one statement shape within a request that count as N+1
+DEFAULT_REPEAT_THRESHOLD = 5
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request goes over its query budget"""
+
+
+class QueryTrace:
+    """Statements executed within one request (or counting block)"""
+
+    def __init__(self):
+        self.statements = Counter()
+
+    @property
+    def count(self):
+        return sum(self.statements.values())
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """Statement shapes executed at least threshold times, most frequent first"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+def _active_traces():
+    traces = getattr(_local, 'traces', None)
+    if traces is None:
+        traces = _local.traces = []
+    return traces
+
+
+def _record_query(sql, params, seconds):
+    """Query listener: add the statement to every trace open in this thread"""
+    traces = getattr(_local, 'traces', None)
+    if traces:
+        normalized = normalize_sql(sql)
+        for trace in traces:
+            trace.statements[normalized] += 1
+
+
+@contextmanager
+def count_queries():
+    """
+    Count statements executed in this thread within the block
+
+    Usage:
+        with count_queries() as trace:
+            Order.get_by_id(order_id)
+        assert trace.count <= 2
+    """
+    # Also usable without an app set up by init_query_budget
+    add_query_listener(_record_query)
+    trace = QueryTrace()
+    traces = _active_traces()
+    traces.append(trace)
+    try:
+        yield trace
+    finally:
+        traces.remove(trace)
+
+
+def query_budget(max_queries):
+    """Decorator setting a view's per-request query budget (place below @route)"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def _budget_for(app, endpoint):
+    """Budget from QUERY_BUDGETS config, then the view decorator, then the default"""
+    budgets = app.config['QUERY_BUDGETS']
+    if endpoint in budgets:
+        return budgets[endpoint]
+    view = app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', app.config['QUERY_BUDGET_DEFAULT'])
+
+
+def _mode(app):
+    """'raise' when testing, 'warn' in debug, otherwise off (QUERY_BUDGET_MODE overrides)"""
+    mode = app.config['QUERY_BUDGET_MODE']
+    if mode:
+        return mode
+    if app.testing:
+        return 'raise'
+    return 'warn' if app.debug else 'off'
+
+
+def check_trace(app, endpoint, trace):
+    """
+    Compare a finished request's queries to its budget
+
+    Returns:
+        list: Problem descriptions (empty when within budget)
+    """
+    problems = []
+    budget = _budget_for(app, endpoint)
+    if budget is not None and trace.count > budget:
+        problems.append(f'{trace.count} queries (budget {budget})')
+    for sql, count in trace.repeated(app.config['QUERY_REPEAT_THRESHOLD']):
+        problems.append(f'possible N+1: {count}x {sql}')
+    return problems
+
+
+def init_query_budget(app):
+    """Trace queries per request and enforce budgets in debug/test mode"""
+    app.config.setdefault('QUERY_BUDGET_MODE', None)
+    app.config.setdefault('QUERY_BUDGET_DEFAULT', DEFAULT_QUERY_BUDGET)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+    app.config.setdefault('QUERY_BUDGETS', {})
+    add_query_listener(_record_query)
+
+    @app.before_request
+    def _start_query_trace():
+        if _mode(app) == 'off':
+            return
+        trace = QueryTrace()
+        _active_traces().append(trace)
+        g._query_trace = trace
+
+    @app.after_request
+    def _check_query_budget(response):
+        trace = g.pop('_query_trace', None)
+        if trace is None:
+            return response
+        traces = _active_traces()
+        if trace in traces:
+            traces.remove(trace)
+
+        response.headers['X-Query-Count'] = str(trace.count)
+        problems = check_trace(current_app, request.endpoint, trace)
+        if not problems:
+            return response
+
+        message = f'{request.method} {request.path} ({request.endpoint}): ' + '; '.join(problems)
+        if _mode(app) == 'raise':
+            raise QueryBudgetExceeded(message)
+        print(f"⚠️  Query budget: {message}")
+        response.headers['X-Query-Budget-Warning'] = '; '.join(problems)[:500]
+        return response
+
+    @app.teardown_request
+    def _drop_query_trace(exc):
+        # Requests that failed before after_request still release their trace
+        trace = g.pop('_query_trace', None)
+        if trace is not None and trace in _active_traces():
+            _active_traces().remove(trace)
+
+    return app
@@ -0,0 +1,204 @@
+"""
+Slow Query Log
+Aggregates every statement by normalised text, logs slow ones with their
+EXPLAIN QUERY PLAN and reports the most expensive statements
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from flask import has_request_context, request
+from . import database
+from .database import add_query_listener
+
+DEFAULT_SLOW_QUERY_MS = 100
+
+# Distinct normalised statements kept in memory
+DEFAULT_MAX_STATEMENTS = 500
+
+# Endpoints remembered per statement
+MAX_ENDPOINTS_PER_STATEMENT = 5
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+_normalized_cache = {}
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape
+
+    Literals become ?, IN lists of any length become IN (?...) and
+    whitespace is collapsed, so "WHERE id IN (?, ?)" and "WHERE id IN (?)"
+    group together.
+    """
+    normalized = _normalized_cache.get(sql)
+    if normalized is None:
+        normalized = _WHITESPACE.sub(' ', sql).strip()
+        normalized = _STRING_LITERAL.sub('?', normalized)
+        normalized = _NUMBER_LITERAL.sub('?', normalized)
+        normalized = _PLACEHOLDER_LIST.sub('IN (?...)', normalized)
+        if len(_normalized_cache) > 2000:
+            _normalized_cache.clear()
+        _normalized_cache[sql] = normalized
+    return normalized
+
+
+def explain_query_plan(sql, params=None):
+    """
+    Get SQLite's plan for a statement without running it
+
+    Returns:
+        list: Plan detail lines (e.g. 'SCAN orders'), empty if unavailable
+    """
+    if params is None:
+        # executemany / unknown parameters: bind NULLs, the plan shape is the same
+        params = [None] * sql.count('?')
+    try:
+        conn = sqlite3.connect(database.DB_PATH, timeout=1)
+        try:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+    return [row[-1] for row in rows]
+
+
+def has_full_scan(plan):
+    """Whether a plan scans a whole table or index"""
+    return any(detail.startswith('SCAN') for detail in plan)
+
+
+class StatementStats:
+    """Running totals for one normalised statement"""
+
+    __slots__ = ('sql', 'sample', 'count', 'total_seconds', 'max_seconds',
+                 'slow_count', 'endpoints', 'plan', 'last_seen')
+
+    def __init__(self, sql, sample):
+        self.sql = sql
+        self.sample = sample
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.slow_count = 0
+        self.endpoints = set()
+        self.plan = None
+        self.last_seen = None
+
+    def to_dict(self):
+        plan = self.plan or []
+        return {
+            'sql': self.sql,
+            'count': self.count,
+            'total_ms': round(self.total_seconds * 1000, 3),
+            'avg_ms': round(self.total_seconds / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.max_seconds * 1000, 3),
+            'slow_count': self.slow_count,
+            'endpoints': sorted(self.endpoints),
+            'plan': plan,
+            'full_scan': has_full_scan(plan),
+            'last_seen': self.last_seen
+        }
+
+
+class QueryLog:
+    """Thread-safe aggregation of statement timings"""
+
+    SORT_KEYS = {
+        'total': lambda stats: stats.total_seconds,
+        'avg': lambda stats: stats.total_seconds / stats.count,
+        'max': lambda stats: stats.max_seconds,
+        'count': lambda stats: stats.count,
+    }
+
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS, max_statements=DEFAULT_MAX_STATEMENTS):
+        self.slow_seconds = slow_query_ms / 1000
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self.statements = {}
+
+    def reset(self):
+        """Clear all collected statistics"""
+        with self._lock:
+            self.statements = {}
+
+    def record(self, sql, params, seconds):
+        """Query listener: aggregate one executed statement"""
+        normalized = normalize_sql(sql)
+        endpoint = request.endpoint if has_request_context() else None
+
+        with self._lock:
+            stats = self.statements.get(normalized)
+            if stats is None:
+                if len(self.statements) >= self.max_statements:
+                    # Make room by forgetting the cheapest statement
+                    cheapest = min(self.statements, key=lambda key: self.statements[key].total_seconds)
+                    del self.statements[cheapest]
+                stats = self.statements[normalized] = StatementStats(normalized, sql)
+            stats.count += 1
+            stats.total_seconds += seconds
+            if seconds > stats.max_seconds:
+                stats.max_seconds = seconds
+            if endpoint and len(stats.endpoints) < MAX_ENDPOINTS_PER_STATEMENT:
+                stats.endpoints.add(endpoint)
+            stats.last_seen = time.strftime('%Y-%m-%d %H:%M:%S')
+            slow = seconds >= self.slow_seconds
+            if slow:
+                stats.slow_count += 1
+            needs_plan = slow and stats.plan is None
+
+        if slow:
+            if needs_plan:
+                stats.plan = explain_query_plan(sql, params)
+            self._log_slow(normalized, seconds, endpoint, stats.plan)
+
+    def _log_slow(self, normalized, seconds, endpoint, plan):
+        print(f"⚠️  Slow query ({seconds * 1000:.1f} ms{', ' + endpoint if endpoint else ''}): {normalized}")
+        for detail in plan or ():
+            print(f"      {detail}")
+
+    def top(self, limit=20, sort='total'):
+        """
+        Most expensive statements, with query plans
+
+        Plans are captured on demand for statements that were never slow.
+        """
+        key = self.SORT_KEYS.get(sort, self.SORT_KEYS['total'])
+        with self._lock:
+            ranked = sorted(self.statements.values(), key=key, reverse=True)[:limit]
+        for stats in ranked:
+            if stats.plan is None:
+                stats.plan = explain_query_plan(stats.sample)
+        return [stats.to_dict() for stats in ranked]
+
+    def summary(self):
+        """Totals across all statements"""
+        with self._lock:
+            return {
+                'statements': len(self.statements),
+                'queries': sum(stats.count for stats in self.statements.values()),
+                'total_ms': round(sum(stats.total_seconds for stats in self.statements.values()) * 1000, 3),
+                'slow_queries': sum(stats.slow_count for stats in self.statements.values()),
+                'slow_query_ms': self.slow_seconds * 1000
+            }
+
+
+# Create singleton instance
+query_log = QueryLog()
+
+
+def init_query_log(app):
+    """Start aggregating statement timings for the app"""
+    if not app.config.setdefault('QUERY_LOG_ENABLED', True):
+        return None
+    query_log.slow_seconds = app.config.setdefault('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS) / 1000
+    query_log.max_statements = app.config.setdefault('QUERY_LOG_MAX_STATEMENTS', DEFAULT_MAX_STATEMENTS)
+    add_query_listener(query_log.record)
+    app.extensions['query_log'] = query_log
+    return query_log
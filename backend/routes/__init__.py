@@ -3,9 +3,22 @@ Routes Package
 API endpoints for the application
 """
 
-from .contact import contact_bp
-from .shop import shop_bp
-from .newsletter import newsletter_bp
-from .admin import admin_bp
+import importlib
+
+# Blueprint name -> module; modules are imported on first access so an app
+# (or a CLI tool) only pays for the blueprints it actually uses
+_BLUEPRINT_MODULES = {
+    'contact_bp': '.contact',
+    'shop_bp': '.shop',
+    'newsletter_bp': '.newsletter',
+    'admin_bp': '.admin',
+}
 
 __all__ = ['contact_bp', 'shop_bp', 'newsletter_bp', 'admin_bp']
+
+
+def __getattr__(name):
+    if name in _BLUEPRINT_MODULES:
+        module = importlib.import_module(_BLUEPRINT_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
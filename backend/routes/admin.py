@@ -3,9 +3,13 @@ Admin Routes
 Authentication and dashboard management endpoints
 """
 
-from flask import Blueprint, request, jsonify
-from ..models import Admin, Contact, ShopOrder, Newsletter, ShopPage, ShopUser
+from flask import Blueprint, request, jsonify, Response, current_app
+from ..models import Admin, Contact, ShopOrder, Newsletter, ShopPage, ShopUser, Order, SupportTicket
 from ..auth_utils import require_auth
+from ..export_utils import iter_csv, iter_gzip
+from ..query_log import query_log
+from ..profiler import profiler
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -386,3 +390,118 @@ def delete_shop_page(page_key):
             'success': False,
             'message': str(e)
         }), 500
+
+
+# Streaming Exports
+EXPORT_DATASETS = {
+    'orders': lambda args: Order.iter_all(status=args.get('status')),
+    'contacts': lambda args: Contact.iter_all(status=args.get('status')),
+    'subscribers': lambda args: Newsletter.iter_all(
+        active_only=args.get('active_only', 'true').lower() == 'true'),
+    'tickets': lambda args: SupportTicket.iter_all(
+        status=args.get('status'), user_id=args.get('user_id', type=int)),
+}
+
+
+@admin_bp.route('/export/<dataset>', methods=['GET'])
+@require_auth
+def export_dataset(dataset):
+    """Stream a full dataset as CSV (optionally gzip-compressed)"""
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({
+            'success': False,
+            'message': f'Unknown dataset. Available: {", ".join(EXPORT_DATASETS)}'
+        }), 404
+
+    use_gzip = request.args.get('gzip', 'false').lower() in ('1', 'true')
+    body = iter_csv(EXPORT_DATASETS[dataset](request.args))
+    filename = f'{dataset}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.csv'
+
+    headers = {'Cache-Control': 'no-store'}
+    if use_gzip:
+        body = iter_gzip(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+# ==================== QUERY DIAGNOSTICS ====================
+
+@admin_bp.route('/queries/top', methods=['GET'])
+@require_auth
+def get_top_queries():
+    """Most expensive SQL statements (by total, avg, max or count) with query plans"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 200)
+        sort = request.args.get('sort', 'total')
+
+        return jsonify({
+            'success': True,
+            'summary': query_log.summary(),
+            'queries': query_log.top(limit=limit, sort=sort)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Failed to load query statistics'
+        }), 500
+
+
+@admin_bp.route('/queries/reset', methods=['POST'])
+@require_auth
+def reset_query_stats():
+    """Clear collected SQL statement statistics"""
+    query_log.reset()
+    return jsonify({
+        'success': True,
+        'message': 'Query statistics cleared'
+    }), 200
+
+
+# ==================== PROFILER ====================
+
+@admin_bp.route('/profiler', methods=['GET'])
+@require_auth
+def get_profiler_summary():
+    """Profiled requests and sample counts per endpoint"""
+    return jsonify({
+        'success': True,
+        'enabled': current_app.config.get('PROFILER_ENABLED', False),
+        'data': profiler.summary()
+    }), 200
+
+
+@admin_bp.route('/profiler/export', methods=['GET'])
+@require_auth
+def export_profile():
+    """Export samples as collapsed stacks (?format=collapsed) or speedscope JSON (?format=speedscope)"""
+    endpoint = request.args.get('endpoint')
+    profile_id = request.args.get('request_id', type=int)
+    output = request.args.get('format', 'collapsed')
+
+    if output == 'speedscope':
+        response = jsonify(profiler.speedscope(endpoint, profile_id))
+        response.headers['Content-Disposition'] = 'attachment; filename="profile.speedscope.json"'
+        return response
+    if output == 'collapsed':
+        return Response(profiler.collapsed(endpoint, profile_id), mimetype='text/plain')
+    return jsonify({
+        'success': False,
+        'message': 'Unknown format. Available: collapsed, speedscope'
+    }), 400
+
+
+@admin_bp.route('/profiler/reset', methods=['POST'])
+@require_auth
+def reset_profiler():
+    """Drop collected profiler samples"""
+    profiler.reset()
+    return jsonify({
+        'success': True,
+        'message': 'Profiler samples cleared'
+    }), 200
@@ -3,14 +3,108 @@ AI Routes
 API endpoints for AI-powered features
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from ..ai_service import ai_service
-from ..database import get_db
+from ..ai_cache import ai_cache
+from ..ai_stream import ai_streams, sse_event, AIStreamBusy, HEARTBEAT_SECONDS, KEEPALIVE
+from ..ai_jobs import ai_jobs, AIJobRejected
+from ..ai_context import ai_context, trim_history
+from ..ai_usage import ai_usage, AIBudgetExceeded
+from ..ai_resilience import ai_resilience
+from ..ai_retrieval import ai_retrieval
+from ..database import get_db, dict_from_row
 from ..auth_utils import require_auth
 from datetime import datetime
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
+def save_conversation(admin_id, message, response, session_id=None):
+    """Store one chat exchange in ai_conversations and return its id"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO ai_conversations (admin_id, message, response, model, tokens_used, session_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (admin_id, message, response['text'], response['model'], response.get('tokens_used', 0), session_id))
+        if session_id is not None:
+            cursor.execute('UPDATE ai_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', (session_id,))
+        return cursor.lastrowid
+
+def ai_error(response):
+    """
+    Error response for a failed AI call (429 when a token budget is used up,
+    503 while the provider's circuit breaker is open)
+    """
+    if response.get('budget_exceeded'):
+        return jsonify({'error': response['error'], 'budget_exceeded': True}), 429
+    if response.get('unavailable'):
+        retry_after = max(1, round(response.get('retry_after') or 0))
+        return jsonify({'error': response['error'], 'unavailable': True}), 503, {'Retry-After': str(retry_after)}
+    return jsonify({'error': response['error']}), 500
+
+def ai_precheck(admin_id):
+    """
+    Refuse up front what chat() would refuse, for endpoints that answer
+    asynchronously (streams, jobs). Returns an error response or None.
+    """
+    try:
+        ai_usage.check_budget(admin_id)
+    except AIBudgetExceeded as e:
+        return ai_error({'error': str(e), 'budget_exceeded': True})
+    retry_after = ai_resilience.retry_after()
+    if retry_after:
+        return ai_error({'error': f'AI provider is unavailable, retry in {max(1, retry_after):.0f}s',
+                         'unavailable': True, 'retry_after': retry_after})
+    return None
+
+def sse_response(events, render, on_done=None):
+    """
+    Server-Sent Events response fed from the AI stream pool
+
+    Under backend.server the response is detached: the pool thread writes
+    the events to the client itself and the request thread is released once
+    the headers are sent. Elsewhere the request thread relays them.
+
+    Raises:
+        AIStreamBusy: If all streaming slots are in use
+    """
+    headers = {
+        'Cache-Control': 'no-cache',
+        # Disable nginx response buffering
+        'X-Accel-Buffering': 'no'
+    }
+    detach = request.environ.get('server.detach')
+    if detach is not None:
+        detach(ai_streams.attach(events, render, on_done=on_done))
+        # Streamed (no Content-Length); the body is written by the pool
+        return Response(iter(()), mimetype='text/event-stream', headers=headers)
+    relayed = ai_streams.open(events, on_done=on_done)
+    return Response((render(event) for event in relayed), mimetype='text/event-stream', headers=headers)
+
+def chat_context(data, admin_id):
+    """
+    History for a chat request: rebuilt from the session when session_id is
+    given, otherwise the client's history trimmed to the token budget
+
+    Returns:
+        tuple: (history, context info dict), or (None, None) if the session
+        does not exist
+    """
+    session_id = data.get('session_id')
+    if session_id is None:
+        history = trim_history(data.get('history', []))
+        return history, {'session_id': None, 'turns': len(history) // 2, 'summarized': False}
+
+    context = ai_context.build(session_id, admin_id)
+    if context is None:
+        return None, None
+    return context['history'], {
+        'session_id': session_id,
+        'tokens': context['tokens'],
+        'turns': context['turns'],
+        'summarized': context['summarized']
+    }
+
 @ai_bp.route('/chat', methods=['POST'])
 @require_auth
 def chat():
@@ -18,35 +112,90 @@ def chat():
     try:
         data = request.get_json()
         message = data.get('message')
-        conversation_history = data.get('history', [])
         admin_id = request.admin['id']
 
         if not message:
             return jsonify({'error': 'Message is required'}), 400
 
+        conversation_history, context = chat_context(data, admin_id)
+        if context is None:
+            return jsonify({'error': 'Session not found'}), 404
+
         # Get AI response
-        response = ai_service.chat(message, conversation_history)
+        response = ai_service.chat(message, conversation_history, use_cache=data.get('use_cache', True),
+                                   admin_id=admin_id)
 
         if 'error' in response and response['error']:
-            return jsonify({'error': response['error']}), 500
+            return ai_error(response)
 
         # Save conversation to database
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO ai_conversations (admin_id, message, response, model, tokens_used)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (admin_id, message, response['text'], response['model'], response.get('tokens_used', 0)))
+        save_conversation(admin_id, message, response, context['session_id'])
 
         return jsonify({
             'response': response['text'],
             'tokens_used': response.get('tokens_used', 0),
-            'model': response['model']
+            'model': response['model'],
+            'cached': response.get('cached', False),
+            'context': context
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ai_bp.route('/chat/stream', methods=['POST'])
+@require_auth
+def chat_stream():
+    """
+    Chat with AI assistant, streaming the answer as Server-Sent Events
+
+    Events: 'delta' {text} per chunk, then 'done' {tokens_used, model,
+    cached, conversation_id, context} or 'error' {error}. The conversation is saved
+    when the completion finishes, even if the client has disconnected.
+    """
+    data = request.get_json() or {}
+    message = data.get('message')
+    admin_id = request.admin['id']
+
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    refused = ai_precheck(admin_id)
+    if refused is not None:
+        return refused
+
+    conversation_history, context = chat_context(data, admin_id)
+    if context is None:
+        return jsonify({'error': 'Session not found'}), 404
+
+    def persist(done):
+        return {'conversation_id': save_conversation(admin_id, message, done, context['session_id'])}
+
+    def render(event):
+        if event is None:
+            # Keep proxies from closing an idle connection
+            return KEEPALIVE
+        if event['type'] == 'delta':
+            return sse_event('delta', {'text': event['text']})
+        if event['type'] == 'done':
+            return sse_event('done', {
+                'tokens_used': event.get('tokens_used', 0),
+                'model': event.get('model'),
+                'finish_reason': event.get('finish_reason'),
+                'cached': event.get('cached', False),
+                'conversation_id': event.get('conversation_id'),
+                'context': context
+            })
+        return sse_event('error', {'error': event.get('error')})
+
+    try:
+        return sse_response(
+            ai_service.stream_chat(message, conversation_history, use_cache=data.get('use_cache', True),
+                                   admin_id=admin_id),
+            render, on_done=persist
+        )
+    except AIStreamBusy:
+        return jsonify({'error': 'Too many AI chats in progress, please retry shortly'}), 503, {'Retry-After': '5'}
+
 @ai_bp.route('/seo-suggestions', methods=['POST'])
 @require_auth
 def seo_suggestions():
@@ -56,14 +205,16 @@ def seo_suggestions():
         page_content = data.get('content', '')
         current_seo = data.get('current_seo', {})
 
-        response = ai_service.generate_seo_suggestions(page_content, current_seo)
+        response = ai_service.generate_seo_suggestions(page_content, current_seo, use_cache=data.get('use_cache', True),
+                                                       admin_id=request.admin['id'])
 
         if 'error' in response and response['error']:
-            return jsonify({'error': response['error']}), 500
+            return ai_error(response)
 
         return jsonify({
             'suggestions': response['text'],
-            'tokens_used': response.get('tokens_used', 0)
+            'tokens_used': response.get('tokens_used', 0),
+            'cached': response.get('cached', False)
         })
 
     except Exception as e:
@@ -77,14 +228,16 @@ def marketing_insights():
         data = request.get_json()
         analytics_data = data.get('analytics', {})
 
-        response = ai_service.generate_marketing_insights(analytics_data)
+        response = ai_service.generate_marketing_insights(analytics_data, use_cache=data.get('use_cache', True),
+                                                          admin_id=request.admin['id'])
 
         if 'error' in response and response['error']:
-            return jsonify({'error': response['error']}), 500
+            return ai_error(response)
 
         return jsonify({
             'insights': response['text'],
-            'tokens_used': response.get('tokens_used', 0)
+            'tokens_used': response.get('tokens_used', 0),
+            'cached': response.get('cached', False)
         })
 
     except Exception as e:
@@ -99,14 +252,16 @@ def content_improvement():
         content = data.get('content', '')
         content_type = data.get('type', 'general')
 
-        response = ai_service.suggest_content_improvements(content, content_type)
+        response = ai_service.suggest_content_improvements(content, content_type, use_cache=data.get('use_cache', True),
+                                                          admin_id=request.admin['id'])
 
         if 'error' in response and response['error']:
-            return jsonify({'error': response['error']}), 500
+            return ai_error(response)
 
         return jsonify({
             'suggestions': response['text'],
-            'tokens_used': response.get('tokens_used', 0)
+            'tokens_used': response.get('tokens_used', 0),
+            'cached': response.get('cached', False)
         })
 
     except Exception as e:
@@ -121,19 +276,216 @@ def email_response():
         customer_message = data.get('message', '')
         context = data.get('context', 'general')
 
-        response = ai_service.generate_email_response(customer_message, context)
+        response = ai_service.generate_email_response(customer_message, context, use_cache=data.get('use_cache', True),
+                                                      admin_id=request.admin['id'])
 
         if 'error' in response and response['error']:
-            return jsonify({'error': response['error']}), 500
+            return ai_error(response)
 
         return jsonify({
             'response': response['text'],
-            'tokens_used': response.get('tokens_used', 0)
+            'tokens_used': response.get('tokens_used', 0),
+            'cached': response.get('cached', False)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _job_response(job):
+    """Public view of an AI job"""
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'partial_text': job['partial_text'],
+        'tokens_used': job['tokens_used'],
+        'cancel_requested': job['cancel_requested'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'deadline': job['deadline']
+    }
+
+@ai_bp.route('/jobs', methods=['POST'])
+@require_auth
+def submit_job():
+    """
+    Queue an AI request to run in the background
+
+    Body: {kind, ...same fields as the matching endpoint, use_cache}, where
+    kind is chat, seo-suggestions, marketing-insights, content-improvement
+    or email-response. Returns 202 with the job; poll /jobs/<id> or follow
+    /jobs/<id>/stream for the result.
+    """
+    data = request.get_json() or {}
+    admin_id = request.admin['id']
+    kind = data.pop('kind', None)
+    use_cache = data.pop('use_cache', True)
+    timeout = data.pop('timeout', None)
+
+    refused = ai_precheck(admin_id)
+    if refused is not None:
+        return refused
+
+    on_done = None
+    if kind == 'chat':
+        session_id = data.get('session_id')
+        if session_id is not None and ai_context.get_session(session_id, admin_id) is None:
+            return jsonify({'error': 'Session not found'}), 404
+
+        def on_done(job_id, result):
+            return {'conversation_id': save_conversation(admin_id, data.get('message'), result, session_id)}
+
+    try:
+        job = ai_jobs.submit(admin_id, kind, data, use_cache=use_cache, timeout=timeout, on_done=on_done)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except AIJobRejected as e:
+        return jsonify({'error': str(e)}), e.status_code, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'job': _job_response(job)}), 202
+
+@ai_bp.route('/jobs', methods=['GET'])
+@require_auth
+def list_jobs():
+    """Recent AI jobs of the current admin"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        jobs = ai_jobs.list(request.admin['id'], limit=limit, status=request.args.get('status'))
+        return jsonify({'jobs': [_job_response(job) for job in jobs], 'pool': ai_jobs.stats()})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job(job_id):
+    """Poll an AI job"""
+    try:
+        job = ai_jobs.get(job_id, request.admin['id'])
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job': _job_response(job)})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/jobs/<job_id>/stream', methods=['GET'])
+@require_auth
+def stream_job(job_id):
+    """
+    Follow an AI job as Server-Sent Events
+
+    Events: 'status' {status} on each change, 'delta' {text} as output
+    arrives, then 'done' with the final job. Disconnecting does not cancel
+    the job. Watchers share the streaming slots of /chat/stream; when they
+    are all taken this answers 503 and the job can be polled at /jobs/<id>.
+    """
+    admin_id = request.admin['id']
+    if ai_jobs.get(job_id, admin_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def render(update):
+        if update is None:
+            return KEEPALIVE
+        if isinstance(update, dict):
+            # Error raised while watching
+            return sse_event('error', {'error': update.get('error')})
+        event, payload = update
+        if event == 'delta':
+            return sse_event('delta', {'text': payload})
+        if event == 'status':
+            return sse_event('status', {'status': payload['status']})
+        return sse_event('done', _job_response(payload))
+
+    try:
+        return sse_response(ai_jobs.watch(job_id, admin_id, heartbeat=HEARTBEAT_SECONDS), render)
+    except AIStreamBusy:
+        return jsonify({'error': f'Too many AI streams in progress, poll /api/ai/jobs/{job_id} instead'}), \
+            503, {'Retry-After': '5'}
+
+@ai_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@require_auth
+def cancel_job(job_id):
+    """Cancel a queued or running AI job"""
+    try:
+        job = ai_jobs.cancel(job_id, request.admin['id'])
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job': _job_response(job)})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/sessions', methods=['POST'])
+@require_auth
+def create_session():
+    """Start a chat session; pass its id as session_id to the chat endpoints"""
+    try:
+        data = request.get_json(silent=True) or {}
+        session = ai_context.create_session(request.admin['id'], data.get('title'))
+        return jsonify({'session': session}), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/sessions', methods=['GET'])
+@require_auth
+def list_sessions():
+    """Recent chat sessions of the current admin"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        return jsonify({'sessions': ai_context.list_sessions(request.admin['id'], limit)})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/sessions/<int:session_id>', methods=['GET'])
+@require_auth
+def get_session(session_id):
+    """A chat session with its summary and the size of its current context"""
+    try:
+        admin_id = request.admin['id']
+        session = ai_context.get_session(session_id, admin_id)
+        if session is None:
+            return jsonify({'error': 'Session not found'}), 404
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, message, response, tokens_used, created_at
+                FROM ai_conversations
+                WHERE session_id = ?
+                ORDER BY id
+            ''', (session_id,))
+            messages = [dict_from_row(row) for row in cursor.fetchall()]
+
+        context = ai_context.build(session_id, admin_id, compact=False)
+        return jsonify({
+            'session': session,
+            'messages': messages,
+            'context': {key: context[key] for key in ('tokens', 'turns', 'summarized')}
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ai_bp.route('/sessions/<int:session_id>', methods=['DELETE'])
+@require_auth
+def delete_session(session_id):
+    """Delete a chat session (its messages stay in the conversation history)"""
+    try:
+        if not ai_context.delete_session(session_id, request.admin['id']):
+            return jsonify({'error': 'Session not found'}), 404
+        return jsonify({'message': 'Session deleted'})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @ai_bp.route('/conversation-history', methods=['GET'])
 @require_auth
 def conversation_history():
@@ -167,3 +519,92 @@ def conversation_history():
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/cache', methods=['GET'])
+@require_auth
+def cache_stats():
+    """AI response cache hit/miss counters and size"""
+    try:
+        return jsonify({'cache': ai_cache.stats()})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/cache', methods=['DELETE'])
+@require_auth
+def clear_cache():
+    """Drop all cached AI responses"""
+    try:
+        removed = ai_cache.clear()
+        return jsonify({'message': 'AI response cache cleared', 'removed': removed})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/provider', methods=['GET'])
+@require_auth
+def provider_status():
+    """Completion backend, model and this worker's retry/circuit breaker state"""
+    try:
+        return jsonify({
+            'provider': ai_service.provider_name,
+            'model': ai_service.model,
+            'configured': ai_service.provider is not None,
+            'resilience': ai_resilience.stats()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/retrieval', methods=['GET'])
+@require_auth
+def retrieval_search():
+    """
+    Site snippets the AI prompts would be grounded with for a text
+
+    Query: q, k (default AI_RETRIEVAL_TOP_K), source (product, content,
+    shop_page or seo; repeatable). Without q, only the index stats.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        sources = request.args.getlist('source') or None
+        k = min(request.args.get('k', 0, type=int), 50) or None
+        results = ai_retrieval.search(query, k, sources) if query else []
+        return jsonify({'results': results, 'index': ai_retrieval.stats()})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/usage', methods=['GET'])
+@require_auth
+def usage_report():
+    """
+    AI token usage from the daily rollups
+
+    Query: from, to (YYYY-MM-DD, default this month), group_by (admin,
+    feature, day or admin_feature). Also returns the current admin's
+    usage against the configured budgets.
+    """
+    try:
+        start = request.args.get('from')
+        end = request.args.get('to')
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        report = ai_usage.report(start, end, request.args.get('group_by', 'admin'))
+        return jsonify({**report, 'budget': ai_usage.budget_status(request.admin['id'])})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/usage/budget', methods=['GET'])
+@require_auth
+def usage_budget():
+    """The current admin's token usage against the daily and monthly budgets"""
+    try:
+        return jsonify({'budget': ai_usage.budget_status(request.admin['id'])})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -4,8 +4,9 @@ Analytics tracking and insights API endpoints
 """
 
 from flask import Blueprint, request, jsonify
-from ..database import get_db
+from ..database import get_db, query_records
 from ..auth_utils import require_auth
+from ..serialization import json_response
 from datetime import datetime, timedelta
 import json
 
@@ -109,7 +110,7 @@ def get_stats():
             total_events = cursor.fetchone()['total']
 
             # Events by type
-            cursor.execute('''
+            events_by_type = query_records(conn, '''
                 SELECT event_type, COUNT(*) as count
                 FROM analytics_events
                 WHERE created_at >= ?
@@ -117,15 +118,8 @@ def get_stats():
                 ORDER BY count DESC
             ''', (date_threshold,))
 
-            events_by_type = []
-            for row in cursor.fetchall():
-                events_by_type.append({
-                    'event_type': row['event_type'],
-                    'count': row['count']
-                })
-
             # Events by day (last 7 days)
-            cursor.execute('''
+            events_by_day = query_records(conn, '''
                 SELECT DATE(created_at) as date, COUNT(*) as count
                 FROM analytics_events
                 WHERE created_at >= ?
@@ -134,13 +128,6 @@ def get_stats():
                 LIMIT 7
             ''', (datetime.now() - timedelta(days=7),))
 
-            events_by_day = []
-            for row in cursor.fetchall():
-                events_by_day.append({
-                    'date': row['date'],
-                    'count': row['count']
-                })
-
             # Unique visitors (by IP)
             cursor.execute('''
                 SELECT COUNT(DISTINCT ip_address) as unique_visitors
@@ -149,7 +136,7 @@ def get_stats():
             ''', (date_threshold,))
             unique_visitors = cursor.fetchone()['unique_visitors']
 
-        return jsonify({
+        return json_response({
             'total_events': total_events,
             'unique_visitors': unique_visitors,
             'events_by_type': events_by_type,
@@ -4,8 +4,9 @@ Content Management System API endpoints
 """
 
 from flask import Blueprint, request, jsonify
-from ..database import get_db
+from ..database import get_db, query_records
 from ..auth_utils import require_auth
+from ..serialization import json_response
 from datetime import datetime
 
 cms_bp = Blueprint('cms', __name__, url_prefix='/api/cms')
@@ -16,34 +17,21 @@ def get_content():
     try:
         section = request.args.get('section')
 
+        # Column aliases match the API field names so rows serialize directly
+        columns = '''
+            SELECT id, section, content_key AS "key", content_value AS "value",
+                   content_type AS "type", updated_at
+            FROM site_content
+        '''
+
         with get_db() as conn:
-            cursor = conn.cursor()
             if section:
-                cursor.execute('''
-                    SELECT id, section, content_key, content_value, content_type, updated_at
-                    FROM site_content
-                    WHERE section = ?
-                    ORDER BY content_key
-                ''', (section,))
+                content_items = query_records(
+                    conn, columns + ' WHERE section = ? ORDER BY content_key', (section,))
             else:
-                cursor.execute('''
-                    SELECT id, section, content_key, content_value, content_type, updated_at
-                    FROM site_content
-                    ORDER BY section, content_key
-                ''')
-
-            content_items = []
-            for row in cursor.fetchall():
-                content_items.append({
-                    'id': row['id'],
-                    'section': row['section'],
-                    'key': row['content_key'],
-                    'value': row['content_value'],
-                    'type': row['content_type'],
-                    'updated_at': row['updated_at']
-                })
-
-        return jsonify({'content': content_items})
+                content_items = query_records(conn, columns + ' ORDER BY section, content_key')
+
+        return json_response({'content': content_items})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -169,22 +157,14 @@ def get_sections():
     """Get all content sections"""
     try:
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT DISTINCT section, COUNT(*) as item_count
+            sections = query_records(conn, '''
+                SELECT section, COUNT(*) as item_count
                 FROM site_content
                 GROUP BY section
                 ORDER BY section
             ''')
 
-            sections = []
-            for row in cursor.fetchall():
-                sections.append({
-                    'section': row['section'],
-                    'item_count': row['item_count']
-                })
-
-        return jsonify({'sections': sections})
+        return json_response({'sections': sections})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
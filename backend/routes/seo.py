@@ -4,8 +4,10 @@ SEO management API endpoints
 """
 
 from flask import Blueprint, request, jsonify
-from ..database import get_db
+from ..database import get_db, query_records
 from ..auth_utils import require_auth
+from ..serialization import json_response
+from ..seo_batch import seo_batch, SEOBatchConflict, SOURCES, list_drafts, apply_draft, discard_draft
 
 seo_bp = Blueprint('seo', __name__, url_prefix='/api/seo')
 
@@ -14,31 +16,18 @@ def get_all_seo_settings():
     """Get SEO settings for all pages"""
     try:
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            settings = query_records(conn, '''
                 SELECT id, page, title, description, keywords, og_image, updated_at
                 FROM seo_settings
                 ORDER BY page
             ''')
 
-            settings = []
-            for row in cursor.fetchall():
-                settings.append({
-                    'id': row['id'],
-                    'page': row['page'],
-                    'title': row['title'],
-                    'description': row['description'],
-                    'keywords': row['keywords'],
-                    'og_image': row['og_image'],
-                    'updated_at': row['updated_at']
-                })
-
-        return jsonify({'settings': settings})
+        return json_response({'settings': settings})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@seo_bp.route('/settings/<page>', methods=['GET'])
+@seo_bp.route('/settings/<path:page>', methods=['GET'])
 def get_seo_settings(page):
     """Get SEO settings for a specific page"""
     try:
@@ -148,3 +137,116 @@ def delete_seo_settings(setting_id):
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/batch', methods=['POST'])
+@require_auth
+def start_seo_batch():
+    """
+    Generate SEO drafts for every SEO page, shop page and product
+
+    Body: {sources: [...], concurrency, only_missing}. Runs in the
+    background; poll /batch/<id> for progress.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        run = seo_batch.start(
+            data.get('sources') or SOURCES,
+            data.get('concurrency', 4),
+            bool(data.get('only_missing')),
+            request.admin['id']
+        )
+        return jsonify({'run': run}), 202
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SEOBatchConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/batch', methods=['GET'])
+@require_auth
+def list_seo_batches():
+    """Recent SEO batch runs"""
+    try:
+        return jsonify({'runs': seo_batch.list(request.args.get('limit', 20, type=int))})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/batch/<int:run_id>', methods=['GET'])
+@require_auth
+def get_seo_batch(run_id):
+    """Progress, throughput and token usage of a batch run"""
+    try:
+        run = seo_batch.get(run_id)
+        if run is None:
+            return jsonify({'error': 'Batch run not found'}), 404
+        return jsonify({'run': run, 'failures': seo_batch.failures(run_id)})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/batch/<int:run_id>/<action>', methods=['POST'])
+@require_auth
+def control_seo_batch(run_id, action):
+    """Pause, resume, cancel or retry the failed items of a batch run"""
+    actions = {
+        'pause': seo_batch.pause,
+        'resume': seo_batch.resume,
+        'cancel': seo_batch.cancel,
+        'retry-failed': seo_batch.retry_failed
+    }
+    if action not in actions:
+        return jsonify({'error': 'Unknown action'}), 404
+    try:
+        run = actions[action](run_id)
+        if run is None:
+            return jsonify({'error': 'Batch run not found'}), 404
+        return jsonify({'run': run})
+
+    except SEOBatchConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/drafts', methods=['GET'])
+@require_auth
+def get_seo_drafts():
+    """Generated SEO drafts awaiting review"""
+    try:
+        drafts = list_drafts(
+            request.args.get('status', 'draft'),
+            request.args.get('type'),
+            min(request.args.get('limit', 50, type=int), 500),
+            request.args.get('offset', 0, type=int)
+        )
+        return json_response({'drafts': drafts})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/drafts/<int:draft_id>/apply', methods=['POST'])
+@require_auth
+def apply_seo_draft(draft_id):
+    """Publish a draft to seo_settings (fields in the body override the draft)"""
+    try:
+        page = apply_draft(draft_id, request.get_json(silent=True))
+        if page is None:
+            return jsonify({'error': 'Draft not found'}), 404
+        return jsonify({'message': 'SEO draft applied', 'page': page})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@seo_bp.route('/drafts/<int:draft_id>', methods=['DELETE'])
+@require_auth
+def discard_seo_draft(draft_id):
+    """Discard a draft"""
+    try:
+        if not discard_draft(draft_id):
+            return jsonify({'error': 'Draft not found'}), 404
+        return jsonify({'message': 'SEO draft discarded'})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -5,11 +5,21 @@ Persian language support with complete e-commerce functionality
 """
 
 from flask import Blueprint, request, jsonify
-from ..models import Product, Order, ShopOrder, ShopUser, ShopPage, Coupon, Inventory, ProductAttribute, ProductReview
+from ..models import Product, Order, ShopOrder, ShopUser, ShopPage, Coupon, Inventory, ProductAttribute, ProductReview, ProductImage
+from ..auth_utils import require_auth
+from ..serialization import json_response
+from ..query_budget import query_budget
+from ..image_pipeline import image_pipeline, save_upload
 import re
 
 shop_bp = Blueprint('shop', __name__, url_prefix='/api/shop')
 
+# Upper bound for bulk order operations (keeps IN (...) lists well below SQLite's variable limit)
+MAX_BULK_ORDERS = 500
+
+# Upper bound for uploaded product images (bytes)
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -25,9 +35,14 @@ def get_products():
         category = request.args.get('category')
         available_only = request.args.get('available', 'true').lower() == 'true'
 
-        products = Product.get_all(category=category, available_only=available_only)
+        products = Product.get_all(category=category, available_only=available_only, as_records=True)
 
-        return jsonify({
+        # Responsive variants of each product's primary image
+        product_ids = products.column('id')
+        srcsets = ProductImage.get_primary_srcsets(category=category, available_only=available_only)
+        products = products.with_column('image_srcset', [srcsets.get(product_id) for product_id in product_ids])
+
+        return json_response({
             'success': True,
             'count': len(products),
             'products': products
@@ -52,6 +67,8 @@ def get_product(product_id):
                 'message': 'محصول یافت نشد'
             }), 404
 
+        product['images'] = ProductImage.get_by_product(product_id)
+
         return jsonify({
             'success': True,
             'product': product
@@ -91,6 +108,8 @@ def create_product():
             stock_quantity=data.get('stock_quantity', 0)
         )
 
+        _queue_primary_image(product_id, data.get('image_url'))
+
         return jsonify({
             'success': True,
             'message': 'محصول با موفقیت ایجاد شد',
@@ -119,6 +138,8 @@ def update_product(product_id):
                 'message': 'محصول یافت نشد'
             }), 404
 
+        _queue_primary_image(product_id, data.get('image_url'))
+
         return jsonify({
             'success': True,
             'message': 'محصول با موفقیت به‌روزرسانی شد'
@@ -155,6 +176,90 @@ def delete_product(product_id):
         }), 500
 
 
+def _queue_primary_image(product_id, image_url):
+    """Generate responsive variants for a product's main image in the background"""
+    if not image_url:
+        return
+    try:
+        image_id = ProductImage.get_or_create_primary(product_id, image_url)
+        image_pipeline.submit(image_id, image_url)
+    except Exception as e:
+        print(f"Warning: Failed to queue image processing for product #{product_id}: {e}")
+
+
+@shop_bp.route('/products/<int:product_id>/images', methods=['GET'])
+def get_product_images(product_id):
+    """Get product images with srcset-ready variants"""
+    try:
+        return jsonify({
+            'success': True,
+            'images': ProductImage.get_by_product(product_id)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'خطا در دریافت تصاویر محصول'
+        }), 500
+
+
+@shop_bp.route('/products/<int:product_id>/images', methods=['POST'])
+@require_auth
+def upload_product_image(product_id):
+    """Upload a product image (admin endpoint); variants are generated in the background"""
+    try:
+        if not Product.get_by_id(product_id):
+            return jsonify({
+                'success': False,
+                'message': 'محصول یافت نشد'
+            }), 404
+
+        # Checked before request.files, which would read and buffer the whole body
+        if request.content_length and request.content_length > MAX_IMAGE_UPLOAD_SIZE:
+            return jsonify({
+                'success': False,
+                'message': 'حجم تصویر بیش از حد مجاز است'
+            }), 413
+
+        upload = request.files.get('image')
+        if upload is None:
+            return jsonify({
+                'success': False,
+                'message': 'فایل تصویر الزامی است'
+            }), 400
+
+        try:
+            image_url = save_upload(upload)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+
+        is_primary = request.form.get('is_primary', 'false').lower() == 'true'
+        image_id = ProductImage.create(
+            product_id,
+            image_url,
+            is_primary=is_primary,
+            display_order=int(request.form.get('display_order', 0))
+        )
+        image_pipeline.submit(image_id, image_url)
+
+        return jsonify({
+            'success': True,
+            'message': 'تصویر با موفقیت بارگذاری شد',
+            'image_id': image_id,
+            'image_url': image_url,
+            'processing': image_pipeline.available
+        }), 201
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'خطا در بارگذاری تصویر'
+        }), 500
+
+
 @shop_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Get all product categories"""
@@ -176,6 +281,7 @@ def get_categories():
 # ==================== PRODUCT REVIEWS ====================
 
 @shop_bp.route('/products/<int:product_id>/reviews', methods=['GET'])
+@query_budget(3)
 def get_product_reviews(product_id):
     """Get all reviews for a product"""
     try:
@@ -379,9 +485,9 @@ def get_orders():
         limit = request.args.get('limit', 50, type=int)
         status = request.args.get('status')
 
-        orders = Order.get_all(limit=limit, status=status)
+        orders = Order.get_all(limit=limit, status=status, as_records=True)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'count': len(orders),
             'orders': orders
@@ -395,6 +501,7 @@ def get_orders():
 
 
 @shop_bp.route('/orders/<int:order_id>', methods=['GET'])
+@query_budget(2)
 def get_order(order_id):
     """Get order by ID"""
     try:
@@ -486,6 +593,58 @@ def update_order_status(order_id):
         }), 500
 
 
+@shop_bp.route('/orders/bulk-status', methods=['PATCH'])
+@require_auth
+def bulk_update_order_status():
+    """Update the status of many orders in one transaction (admin endpoint)"""
+    try:
+        data = request.get_json()
+        status = data.get('status')
+        order_ids = data.get('order_ids')
+
+        if not status:
+            return jsonify({
+                'success': False,
+                'message': 'وضعیت الزامی است'
+            }), 400
+
+        if not isinstance(order_ids, list) or len(order_ids) == 0:
+            return jsonify({
+                'success': False,
+                'message': 'فهرست سفارش‌ها الزامی است'
+            }), 400
+
+        if len(order_ids) > MAX_BULK_ORDERS:
+            return jsonify({
+                'success': False,
+                'message': f'حداکثر {MAX_BULK_ORDERS} سفارش در هر درخواست مجاز است'
+            }), 400
+
+        results = Order.bulk_update_status(order_ids, status, request.admin['username'], notes=data.get('notes'))
+        updated = sum(1 for result in results if result['success'])
+
+        return jsonify({
+            'success': True,
+            'message': f'{updated} سفارش از {len(results)} به‌روزرسانی شد',
+            'updated': updated,
+            'failed': len(results) - updated,
+            'results': results
+        }), 200
+
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        print(f"Error in bulk order status update: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'خطا در به‌روزرسانی گروهی وضعیت'
+        }), 500
+
+
 # ==================== LEGACY INQUIRY ENDPOINT ====================
 
 @shop_bp.route('/inquiry', methods=['POST'])
@@ -0,0 +1,541 @@
+"""
+SEO Batch Generation
+Generates SEO suggestions for every SEO page, shop page and product with
+bounded parallelism, writing them as drafts for review. Runs checkpoint each
+finished item in the database, so they can be paused and resumed, and
+survive a restart.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .database import get_db, dict_from_row
+
+SOURCES = ('seo_settings', 'shop_pages', 'products')
+
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+# A running run whose heartbeat is older than this is considered dead and may be resumed
+STALE_SECONDS = 60
+
+# The executing process refreshes the heartbeat this often, even while items are slow
+HEARTBEAT_SECONDS = 15
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+class SEOBatchConflict(Exception):
+    """Another batch run is already in progress"""
+
+
+def seo_page_key(target_type, target_id):
+    """seo_settings.page for a batch target"""
+    if target_type == 'shop_page':
+        return f'shop/{target_id}'
+    if target_type == 'product':
+        return f'product/{target_id}'
+    return target_id
+
+
+def _first(data, *names):
+    """First present key of `names` in a parsed response, case-insensitive"""
+    lowered = {str(key).lower().replace(' ', '_'): value for key, value in data.items()}
+    for name in names:
+        if lowered.get(name):
+            return lowered[name]
+    return None
+
+
+def parse_suggestions(text):
+    """
+    Title, description and keywords from a generate_seo_suggestions() answer
+
+    Returns:
+        dict: {'title', 'description', 'keywords'}, or None when the answer
+        holds no usable JSON
+    """
+    match = _JSON_OBJECT.search(text or '')
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    title = _first(data, 'suggested_meta_title', 'meta_title', 'title')
+    description = _first(data, 'suggested_meta_description', 'meta_description', 'description')
+    keywords = _first(data, 'relevant_keywords', 'keywords', 'suggested_keywords')
+    if isinstance(keywords, list):
+        keywords = ', '.join(str(keyword) for keyword in keywords)
+    if not title and not description:
+        return None
+    return {
+        'title': str(title)[:70] if title else None,
+        'description': str(description)[:200] if description else None,
+        'keywords': str(keywords) if keywords else None,
+    }
+
+
+def _load_target(conn, target_type, target_id):
+    """Page content and current SEO settings for one item"""
+    cursor = conn.cursor()
+    page = seo_page_key(target_type, target_id)
+    cursor.execute('SELECT title, description, keywords FROM seo_settings WHERE page = ?', (page,))
+    row = cursor.fetchone()
+    current_seo = dict_from_row(row) if row else {}
+
+    if target_type == 'product':
+        cursor.execute('''
+            SELECT name_fa, name_en, category, price, description_fa, description_en
+            FROM products WHERE id = ?
+        ''', (int(target_id),))
+        product = cursor.fetchone()
+        if product is None:
+            return None, current_seo
+        content = '\n'.join(part for part in (
+            f"Product: {product['name_fa']}" + (f" ({product['name_en']})" if product['name_en'] else ''),
+            f"Category: {product['category']}" if product['category'] else '',
+            f"Price: {product['price']:,.0f} Toman",
+            product['description_fa'] or '',
+            product['description_en'] or '',
+        ) if part)
+    elif target_type == 'shop_page':
+        cursor.execute('SELECT title_fa, content_fa FROM shop_pages WHERE page_key = ?', (target_id,))
+        shop_page = cursor.fetchone()
+        if shop_page is None:
+            return None, current_seo
+        content = f"{shop_page['title_fa']}\n{shop_page['content_fa']}"
+    else:
+        content = f"Website page: {target_id}"
+
+    return content, current_seo
+
+
+def _run_to_dict(row):
+    run = dict_from_row(row)
+    run['sources'] = json.loads(run['sources'])
+    elapsed = run['active_seconds'] or 0
+    if run['status'] == 'running' and run['resumed_at']:
+        elapsed += time.time() - run['resumed_at']
+    run['elapsed_seconds'] = round(elapsed, 1)
+    run['items_per_minute'] = round(run['processed'] * 60 / elapsed, 1) if elapsed else 0.0
+    remaining = run['total'] - run['processed']
+    run['eta_seconds'] = round(remaining * elapsed / run['processed']) if run['processed'] and remaining else None
+    return run
+
+
+class SEOBatch:
+    """Starts, resumes and reports on batch SEO runs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def start(self, sources=SOURCES, concurrency=DEFAULT_CONCURRENCY, only_missing=False, admin_id=None,
+              background=True):
+        """
+        Create a run over the chosen sources and start it
+
+        Args:
+            sources (iterable): Any of 'seo_settings', 'shop_pages', 'products'
+            concurrency (int): AI requests in flight at once
+            only_missing (bool): Skip items that already have a title and
+                description in seo_settings or an open draft
+            admin_id (int): Admin who started the run
+            background (bool): Run on a thread and return at once
+
+        Returns:
+            dict: The run
+
+        Raises:
+            ValueError: Unknown source
+            SEOBatchConflict: Another run is still going
+        """
+        requested = set(sources or ())
+        sources = [source for source in SOURCES if source in requested]
+        if not sources or requested - set(SOURCES):
+            raise ValueError(f"Sources must be some of: {', '.join(SOURCES)}")
+        concurrency = max(1, min(int(concurrency), MAX_CONCURRENCY))
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            self._check_idle(cursor)
+            cursor.execute('''
+                INSERT INTO seo_batch_runs (status, sources, concurrency, only_missing, created_by, created_at)
+                VALUES ('running', ?, ?, ?, ?, ?)
+            ''', (json.dumps(sources), concurrency, 1 if only_missing else 0, admin_id, time.time()))
+            run_id = cursor.lastrowid
+
+            # Snapshot the work list; the run checkpoints against it
+            if 'seo_settings' in sources:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO seo_batch_items (run_id, page, target_type, target_id)
+                    SELECT ?, page, 'seo_page', page FROM seo_settings
+                    WHERE page NOT LIKE 'shop/%' AND page NOT LIKE 'product/%'
+                ''', (run_id,))
+            if 'shop_pages' in sources:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO seo_batch_items (run_id, page, target_type, target_id)
+                    SELECT ?, 'shop/' || page_key, 'shop_page', page_key FROM shop_pages WHERE is_active = 1
+                ''', (run_id,))
+            if 'products' in sources:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO seo_batch_items (run_id, page, target_type, target_id)
+                    SELECT ?, 'product/' || id, 'product', id FROM products
+                ''', (run_id,))
+            if only_missing:
+                cursor.execute('''
+                    DELETE FROM seo_batch_items
+                    WHERE run_id = ? AND (
+                        page IN (SELECT page FROM seo_settings
+                                 WHERE COALESCE(title, '') != '' AND COALESCE(description, '') != '')
+                        OR page IN (SELECT page FROM seo_drafts WHERE status = 'draft'))
+                ''', (run_id,))
+            cursor.execute('''
+                UPDATE seo_batch_runs SET total = (SELECT COUNT(*) FROM seo_batch_items WHERE run_id = ?)
+                WHERE id = ?
+            ''', (run_id, run_id))
+
+        self._launch(run_id, background)
+        return self.get(run_id)
+
+    def _check_idle(self, cursor, allow_run_id=None):
+        cursor.execute('''
+            SELECT id FROM seo_batch_runs
+            WHERE status = 'running' AND COALESCE(heartbeat_at, created_at) > ? AND id != ?
+        ''', (time.time() - STALE_SECONDS, allow_run_id or 0))
+        row = cursor.fetchone()
+        if row:
+            raise SEOBatchConflict(f"SEO batch run #{row['id']} is still running")
+
+    def resume(self, run_id, background=True):
+        """
+        Continue a paused, failed or interrupted run from its checkpoint
+
+        Returns:
+            dict: The run, or None if it does not exist
+        """
+        run = self.get(run_id)
+        if run is None:
+            return None
+        if run['status'] in ('completed', 'cancelled'):
+            return run
+        with self._lock:
+            if run_id in self._threads:
+                return run
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            self._check_idle(cursor, allow_run_id=run_id)
+            if run['status'] == 'running' and time.time() - (run['heartbeat_at'] or run['created_at']) < STALE_SECONDS:
+                raise SEOBatchConflict(f'SEO batch run #{run_id} is still running')
+            cursor.execute('''
+                UPDATE seo_batch_runs SET status = 'running', error = NULL WHERE id = ?
+            ''', (run_id,))
+
+        self._launch(run_id, background)
+        return self.get(run_id)
+
+    def _launch(self, run_id, background):
+        if not background:
+            self._run(run_id)
+            return
+        thread = threading.Thread(target=self._run, args=(run_id,), name=f'seo-batch-{run_id}', daemon=True)
+        with self._lock:
+            self._threads[run_id] = thread
+        thread.start()
+
+    def pause(self, run_id):
+        """Stop after the requests in flight; resume() picks up from there"""
+        return self._request_stop(run_id, 'paused')
+
+    def cancel(self, run_id):
+        """Stop for good; drafts written so far are kept"""
+        return self._request_stop(run_id, 'cancelled')
+
+    def _request_stop(self, run_id, status):
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE seo_batch_runs SET status = ?, finished_at = ?
+                WHERE id = ? AND status IN ('running', 'paused', 'failed')
+            ''', (status, time.time() if status == 'cancelled' else None, run_id))
+        return self.get(run_id)
+
+    def _status(self, run_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status FROM seo_batch_runs WHERE id = ?', (run_id,))
+            row = cursor.fetchone()
+            return row['status'] if row else None
+
+    def _pending(self, run_id, after, limit):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT page, target_type, target_id FROM seo_batch_items
+                WHERE run_id = ? AND status = 'pending' AND page > ?
+                ORDER BY page
+                LIMIT ?
+            ''', (run_id, after, limit))
+            return [dict_from_row(row) for row in cursor.fetchall()]
+
+    def _run(self, run_id):
+        started = time.time()
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE seo_batch_runs SET resumed_at = ?, heartbeat_at = ?, worker_pid = ? WHERE id = ?
+            ''', (started, started, os.getpid(), run_id))
+            cursor = conn.cursor()
+            cursor.execute('SELECT concurrency, created_by FROM seo_batch_runs WHERE id = ?', (run_id,))
+            row = cursor.fetchone()
+            concurrency, admin_id = row['concurrency'], row['created_by']
+
+        final_status = 'completed'
+        error = None
+        beat_at = started
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'seo-batch-{run_id}') as executor:
+                in_flight = set()
+                after = ''
+                exhausted = False
+                while True:
+                    # Keep the pool busy without loading the whole work list
+                    if not exhausted and len(in_flight) < concurrency * 2:
+                        batch = self._pending(run_id, after, concurrency * 4)
+                        if not batch:
+                            exhausted = True
+                        for item in batch:
+                            in_flight.add(executor.submit(self._process, run_id, item, admin_id))
+                            after = item['page']
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, timeout=HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if not future.cancelled():
+                            future.result()
+
+                    if time.time() - beat_at >= HEARTBEAT_SECONDS:
+                        beat_at = time.time()
+                        with get_db() as conn:
+                            conn.execute('UPDATE seo_batch_runs SET heartbeat_at = ? WHERE id = ?',
+                                         (beat_at, run_id))
+
+                    status = self._status(run_id)
+                    if status != 'running' and not exhausted:
+                        # Paused or cancelled: let requests already sent finish, drop the rest
+                        final_status = status
+                        exhausted = True
+                        for future in in_flight:
+                            future.cancel()
+        except Exception as e:
+            final_status, error = 'failed', str(e)
+            print(f"⚠️  SEO batch run #{run_id} failed: {e}")
+        finally:
+            now = time.time()
+            with get_db() as conn:
+                conn.execute('''
+                    UPDATE seo_batch_runs
+                    SET status = CASE WHEN status = 'running' THEN ? ELSE status END,
+                        error = COALESCE(?, error),
+                        active_seconds = active_seconds + ?,
+                        resumed_at = NULL,
+                        finished_at = CASE WHEN ? IN ('completed', 'cancelled') THEN ? ELSE finished_at END
+                    WHERE id = ?
+                ''', (final_status, error, now - started, final_status, now, run_id))
+            with self._lock:
+                self._threads.pop(run_id, None)
+
+    def _process(self, run_id, item, admin_id=None):
+        """Generate, store the draft and checkpoint one item"""
+        from .ai_service import ai_service
+
+        page = item['page']
+        with get_db() as conn:
+            content, current_seo = _load_target(conn, item['target_type'], item['target_id'])
+
+        suggestions = None
+        tokens_used = 0
+        cached = False
+        if content is None:
+            error = 'Source no longer exists'
+        else:
+            response = ai_service.generate_seo_suggestions(content, current_seo, admin_id=admin_id)
+            if response.get('budget_exceeded') or response.get('unavailable'):
+                # Leave the item pending and pause; resume once the budget or provider allows
+                with get_db() as conn:
+                    conn.execute('''
+                        UPDATE seo_batch_runs SET status = 'paused', error = ? WHERE id = ? AND status = 'running'
+                    ''', (response['error'], run_id))
+                return
+            tokens_used = response.get('tokens_used', 0)
+            cached = bool(response.get('cached'))
+            error = response.get('error')
+            if not error:
+                suggestions = parse_suggestions(response.get('text'))
+                if suggestions is None:
+                    error = 'Response did not contain SEO fields'
+
+        now = time.time()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if suggestions is not None:
+                cursor.execute('''
+                    INSERT INTO seo_drafts (page, target_type, target_id, run_id, title, description, keywords,
+                                            raw_response, tokens_used, status, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'draft', ?, ?)
+                    ON CONFLICT(page) DO UPDATE SET
+                        run_id = excluded.run_id,
+                        title = excluded.title,
+                        description = excluded.description,
+                        keywords = excluded.keywords,
+                        raw_response = excluded.raw_response,
+                        tokens_used = excluded.tokens_used,
+                        status = 'draft',
+                        updated_at = excluded.updated_at
+                ''', (page, item['target_type'], str(item['target_id']), run_id, suggestions['title'],
+                      suggestions['description'], suggestions['keywords'], response.get('text'), tokens_used,
+                      now, now))
+            cursor.execute('''
+                UPDATE seo_batch_items SET status = ?, error = ?, tokens_used = ?, finished_at = ?
+                WHERE run_id = ? AND page = ? AND status = 'pending'
+            ''', ('done' if suggestions is not None else 'failed', error, tokens_used, now, run_id, page))
+            if cursor.rowcount:
+                cursor.execute('''
+                    UPDATE seo_batch_runs
+                    SET processed = processed + 1,
+                        succeeded = succeeded + ?,
+                        failed = failed + ?,
+                        cached = cached + ?,
+                        tokens_used = tokens_used + ?,
+                        heartbeat_at = ?
+                    WHERE id = ?
+                ''', (1 if suggestions is not None else 0, 0 if suggestions is not None else 1,
+                      1 if cached else 0, tokens_used, now, run_id))
+
+    def retry_failed(self, run_id, background=True):
+        """Put a run's failed items back in the queue and resume it"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE seo_batch_items SET status = 'pending', error = NULL
+                WHERE run_id = ? AND status = 'failed'
+            ''', (run_id,))
+            requeued = cursor.rowcount
+            cursor.execute('''
+                UPDATE seo_batch_runs
+                SET processed = processed - ?, failed = failed - ?,
+                    status = CASE WHEN status = 'completed' THEN 'paused' ELSE status END,
+                    finished_at = NULL
+                WHERE id = ? AND status != 'cancelled'
+            ''', (requeued, requeued, run_id))
+        return self.resume(run_id, background)
+
+    def get(self, run_id):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM seo_batch_runs WHERE id = ?', (run_id,))
+            row = cursor.fetchone()
+            return _run_to_dict(row) if row else None
+
+    def list(self, limit=20):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM seo_batch_runs ORDER BY id DESC LIMIT ?', (limit,))
+            return [_run_to_dict(row) for row in cursor.fetchall()]
+
+    def failures(self, run_id, limit=50):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT page, error FROM seo_batch_items
+                WHERE run_id = ? AND status = 'failed'
+                ORDER BY page
+                LIMIT ?
+            ''', (run_id, limit))
+            return [dict_from_row(row) for row in cursor.fetchall()]
+
+
+def list_drafts(status='draft', target_type=None, limit=50, offset=0):
+    """Generated SEO drafts, newest first"""
+    query = 'SELECT id, page, target_type, target_id, run_id, title, description, keywords, tokens_used, status, updated_at FROM seo_drafts WHERE status = ?'
+    params = [status]
+    if target_type:
+        query += ' AND target_type = ?'
+        params.append(target_type)
+    query += ' ORDER BY updated_at DESC LIMIT ? OFFSET ?'
+    params.extend([limit, offset])
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [dict_from_row(row) for row in cursor.fetchall()]
+
+
+def apply_draft(draft_id, overrides=None):
+    """
+    Copy a draft into seo_settings (creating the page entry if needed)
+
+    Returns:
+        str: The seo_settings page, or None if there is no open draft
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM seo_drafts WHERE id = ? AND status = 'draft'", (draft_id,))
+        draft = cursor.fetchone()
+        if draft is None:
+            return None
+        values = {key: draft[key] for key in ('title', 'description', 'keywords')}
+        values.update({key: value for key, value in (overrides or {}).items() if key in values and value})
+        cursor.execute('''
+            INSERT INTO seo_settings (page, title, description, keywords)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(page) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                keywords = excluded.keywords,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (draft['page'], values['title'], values['description'], values['keywords']))
+        cursor.execute("UPDATE seo_drafts SET status = 'applied', updated_at = ? WHERE id = ?", (time.time(), draft_id))
+        return draft['page']
+
+
+def discard_draft(draft_id):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE seo_drafts SET status = 'discarded', updated_at = ?
+            WHERE id = ? AND status = 'draft'
+        ''', (time.time(), draft_id))
+        return cursor.rowcount > 0
+
+
+# Create singleton instance
+seo_batch = SEOBatch()
+
+
+if __name__ == '__main__':
+    # Unattended run: python -m backend.seo_batch [--resume RUN_ID] [--concurrency N] [--only-missing]
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate SEO drafts for the whole site')
+    parser.add_argument('--sources', default=','.join(SOURCES), help='Comma-separated: ' + ', '.join(SOURCES))
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--only-missing', action='store_true', help='Skip pages that already have SEO or a draft')
+    parser.add_argument('--resume', type=int, metavar='RUN_ID', help='Continue an earlier run')
+    args = parser.parse_args()
+
+    from .database import init_db
+    init_db()
+    if args.resume:
+        run = seo_batch.resume(args.resume, background=False)
+        if run is None:
+            raise SystemExit(f'No SEO batch run #{args.resume}')
+    else:
+        run = seo_batch.start(args.sources.split(','), args.concurrency, args.only_missing, background=False)
+    print(f"✅ Run #{run['id']} {run['status']}: {run['succeeded']}/{run['total']} drafts, "
+          f"{run['failed']} failed, {run['tokens_used']} tokens, {run['items_per_minute']} items/min")
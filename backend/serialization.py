@@ -0,0 +1,183 @@
+"""
+Serialization Helpers
+Fast compact JSON provider and direct encoding of query results
+"""
+
+import json
+import math
+import threading
+import time
+from json.encoder import encode_basestring
+from flask import Response, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from .database import RecordSet
+
+# orjson is optional; the stdlib encoder is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _encode_float(value):
+    """Encode a float the way the stdlib encoder does (non-finite -> null)"""
+    if math.isfinite(value):
+        return float.__repr__(value)
+    return 'null'
+
+
+def _encode_other(value):
+    """Fallback for values that are not plain SQLite scalars"""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+# Exact-type dispatch: SQLite only ever returns these types
+_ENCODERS = {
+    str: encode_basestring,
+    int: int.__repr__,
+    float: _encode_float,
+    type(None): lambda value: 'null',
+    bool: lambda value: 'true' if value else 'false',
+    bytes: lambda value: encode_basestring(value.decode('utf-8', 'replace')),
+}
+
+
+def records_to_json(records):
+    """
+    Encode a RecordSet as a JSON array of objects (str)
+
+    A %-template holding every object key is built once per result set and
+    each row is formatted straight from its tuple, so no per-row dict is
+    allocated.
+    """
+    template = '{' + ','.join(
+        encode_basestring(name).replace('%', '%%') + ':%s' for name in records.columns
+    ) + '}'
+    encoders = _ENCODERS
+    fallback = _encode_other
+    return '[' + ','.join([
+        template % tuple([encoders.get(type(value), fallback)(value) for value in row])
+        for row in records.rows
+    ]) + ']'
+
+
+class EncodeStats:
+    """Thread-safe running totals of JSON encode time and output size"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters"""
+        with self._lock:
+            self.count = 0
+            self.total_seconds = 0.0
+            self.max_seconds = 0.0
+            self.total_bytes = 0
+
+    def record(self, seconds, size):
+        """Record one encoded response"""
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.total_bytes += size
+            if seconds > self.max_seconds:
+                self.max_seconds = seconds
+
+    def snapshot(self):
+        """Get a copy of the counters"""
+        with self._lock:
+            return {
+                'encoder': 'orjson' if orjson else 'json',
+                'count': self.count,
+                'total_seconds': self.total_seconds,
+                'max_seconds': self.max_seconds,
+                'total_bytes': self.total_bytes,
+                'avg_ms': (self.total_seconds / self.count * 1000) if self.count else 0.0
+            }
+
+
+encode_stats = EncodeStats()
+
+
+def wants_pretty():
+    """Check whether the current request asked for indented output (?pretty=1)"""
+    return has_request_context() and request.args.get('pretty', '').lower() in ('1', 'true')
+
+
+def _timed_response(encode, status=200):
+    """Run an encode callable, record its timing and wrap the bytes in a Response"""
+    start = time.perf_counter()
+    body = encode()
+    elapsed = time.perf_counter() - start
+    encode_stats.record(elapsed, len(body))
+
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Server-Timing'] = f'json;dur={elapsed * 1000:.2f}'
+    return response
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider with compact, non-ASCII-escaped output
+
+    Uses orjson when it is installed and falls back to the stdlib encoder
+    otherwise. Responses are compact unless the request has ?pretty=1.
+    Encode time is recorded in encode_stats and sent as a Server-Timing
+    header.
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        """Serialize data as JSON (orjson for the compact case)"""
+        if orjson is not None and not kwargs.get('indent'):
+            try:
+                return orjson.dumps(
+                    obj, default=self.default,
+                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                ).decode('utf-8')
+            except TypeError:
+                # e.g. integers beyond 64 bits; let the stdlib encoder decide
+                pass
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        if not kwargs.get('indent'):
+            kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """Serialize the arguments to a JSON response"""
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {'indent': 2} if wants_pretty() else {}
+        return _timed_response(lambda: (self.dumps(obj, **dump_args) + '\n').encode('utf-8'))
+
+
+def dumps(payload):
+    """
+    Encode a top-level dict whose values may include RecordSets
+
+    RecordSets are written with records_to_json; everything else goes
+    through the stdlib encoder in compact form.
+    """
+    items = []
+    for key, value in payload.items():
+        if isinstance(value, RecordSet):
+            encoded = records_to_json(value)
+        else:
+            encoded = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        items.append(encode_basestring(key) + ':' + encoded)
+    return '{' + ','.join(items) + '}'
+
+
+def json_response(payload, status=200):
+    """Build a JSON response for a payload that may contain RecordSets"""
+    if wants_pretty():
+        payload = {key: value.to_dicts() if isinstance(value, RecordSet) else value
+                   for key, value in payload.items()}
+        return _timed_response(
+            lambda: json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8'), status)
+    return _timed_response(lambda: dumps(payload).encode('utf-8'), status)
@@ -0,0 +1,497 @@
+"""
+Production Server
+Pre-forking WSGI runner: preloads the app, supervises (optionally threaded)
+worker processes, recycles them after a number of requests and restarts
+them gracefully on SIGHUP
+"""
+
+import argparse
+import importlib
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+HOOK_NAMES = ('on_starting', 'post_fork', 'worker_exit')
+_hooks = {name: [] for name in HOOK_NAMES}
+
+# Workers that die this soon after starting are respawned with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+# A detached response gives up on a client that accepts no data for this long
+DETACHED_SEND_TIMEOUT = 30
+
+
+def hook(name):
+    """
+    Decorator registering a server hook
+
+    on_starting(arbiter) runs once in the master before workers are forked,
+    post_fork(worker) runs in every worker before it accepts requests (the
+    place for per-worker DB connection setup), and worker_exit(worker) runs
+    when a worker shuts down.
+    """
+    if name not in _hooks:
+        raise ValueError(f'Unknown server hook: {name}')
+
+    def register(fn):
+        _hooks[name].append(fn)
+        return fn
+    return register
+
+
+def run_hooks(name, *args):
+    """Run every hook registered under name"""
+    for fn in _hooks[name]:
+        fn(*args)
+
+
+@hook('on_starting')
+def _sync_ai_retrieval(arbiter):
+    # Index queued content once before forking, not on the workers' request path
+    retrieval_module = sys.modules.get(f'{__package__}.ai_retrieval')
+    if retrieval_module is not None:
+        applied = retrieval_module.ai_retrieval.sync(force=True)
+        if applied:
+            print(f"🔎 Indexed {applied} queued change(s) for AI retrieval")
+
+
+@hook('post_fork')
+def _reseed_random(worker):
+    # Forked workers inherit the master's PRNG state, which would make
+    # order and ticket numbers collide across workers
+    random.seed()
+
+
+@hook('post_fork')
+def _start_ai_usage_flusher(worker):
+    # Idle workers still write their counts every AI_USAGE_FLUSH_SECONDS
+    usage_module = sys.modules.get(f'{__package__}.ai_usage')
+    if usage_module is not None:
+        usage_module.ai_usage.start_flusher()
+
+
+@hook('worker_exit')
+def _flush_ai_usage(worker):
+    # Workers leave through os._exit, which skips atexit handlers
+    usage_module = sys.modules.get(f'{__package__}.ai_usage')
+    if usage_module is not None:
+        usage_module.ai_usage.flush()
+
+
+def load_app(target):
+    """
+    Import a WSGI app from 'module:attribute' or 'module:factory()'
+
+    The attribute defaults to 'app'.
+    """
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name)
+    attribute = attribute or 'app'
+    if attribute.endswith('()'):
+        return getattr(module, attribute[:-2])()
+    return getattr(module, attribute)
+
+
+class DetachedConnection:
+    """
+    Client socket taken over from the request thread (see WorkerRequestHandler)
+
+    The owner writes the rest of the response with send() and must call
+    close() once done; a detached response ends when the socket closes.
+    """
+
+    def __init__(self, sock, worker):
+        self.sock = sock
+        self.sock.settimeout(DETACHED_SEND_TIMEOUT)
+        self.worker = worker
+        self.closed = False
+
+    def send(self, data):
+        self.sock.sendall(data.encode() if isinstance(data, str) else data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.worker.detached_finished()
+
+
+class WorkerRequestHandler(WSGIRequestHandler):
+    """
+    Request handler that lets the app take the connection off the request thread
+
+    An app calls environ['server.detach'](writer) and returns its headers with
+    an empty, streamed body. Once they are sent, writer(connection) is called
+    with a DetachedConnection instead of closing the socket, and the thread
+    goes back to serving requests. The writer must hand the connection to
+    its own thread and return quickly.
+    """
+
+    detached = None
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ['server.detach'] = self._detach
+        return environ
+
+    def _detach(self, writer):
+        self.detached = writer
+        # The body bypasses werkzeug: no chunked encoding, the close ends the response
+        self.protocol_version = 'HTTP/1.0'
+        self.close_connection = True
+
+
+class WorkerServer(BaseWSGIServer):
+    """
+    WSGI server running on a shared listening socket
+
+    With threads > 1 connections are handled in a bounded thread pool;
+    otherwise each connection is handled inline (sync worker).
+    """
+
+    multiprocess = True
+
+    def __init__(self, worker, handler):
+        self.worker = worker
+        self.multithread = worker.threads > 1
+        self.pool = ThreadPoolExecutor(worker.threads, thread_name_prefix='worker') if self.multithread else None
+        # ids of sockets handed to a DetachedConnection
+        self._detached = set()
+        super().__init__(worker.config.host, worker.config.port, worker.wsgi,
+                         handler=handler, fd=worker.sock.fileno())
+        # handle_request() gives up after this long so the worker can check its state
+        self.timeout = 1.0
+
+    def process_request(self, request, client_address):
+        self.worker.connection_started()
+        if self.pool is None:
+            super().process_request(request, client_address)
+        else:
+            self.pool.submit(self._process_in_thread, request, client_address)
+
+    def finish_request(self, request, client_address):
+        handler = self.RequestHandlerClass(request, client_address, self)
+        if handler.detached is not None:
+            self._detached.add(id(request))
+            self.worker.detached_started()
+            connection = DetachedConnection(request, self.worker)
+            try:
+                handler.detached(connection)
+            except Exception:
+                connection.close()
+                raise
+
+    def _process_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def shutdown_request(self, request):
+        if id(request) in self._detached:
+            # Closed by its DetachedConnection
+            self._detached.discard(id(request))
+        else:
+            super().shutdown_request(request)
+        self.worker.connection_finished()
+
+
+class Worker:
+    """One worker process (or the whole server when forking is unavailable)"""
+
+    def __init__(self, config, sock, app=None, generation=0):
+        self.config = config
+        self.sock = sock
+        self.app = app
+        self.generation = generation
+        self.threads = max(1, config.threads)
+        self.pid = None
+        self.started_at = time.monotonic()
+        self.alive = True
+        self.handled = 0
+        self.active = 0
+        # Responses still being written by a DetachedConnection owner
+        self.detached = 0
+        self._cond = threading.Condition()
+
+        # Jitter keeps workers from all recycling at the same moment
+        self.max_requests = 0
+        if config.max_requests > 0:
+            self.max_requests = config.max_requests + random.randint(0, max(0, config.max_requests_jitter))
+
+    def wsgi(self, environ, start_response):
+        """The app, counting finished requests for recycling"""
+        return ClosingIterator(self.app(environ, start_response), self._request_finished)
+
+    def _request_finished(self):
+        with self._cond:
+            self.handled += 1
+
+    def connection_started(self):
+        with self._cond:
+            self.active += 1
+
+    def connection_finished(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def detached_started(self):
+        with self._cond:
+            self.detached += 1
+
+    def detached_finished(self):
+        with self._cond:
+            self.detached -= 1
+            self._cond.notify_all()
+
+    def _handle_term(self, signum, frame):
+        self.alive = False
+
+    def _should_run(self):
+        return self.alive and not (self.max_requests and self.handled >= self.max_requests)
+
+    def run(self):
+        """Serve until stopped or recycled, then drain in-flight connections"""
+        signal.signal(signal.SIGTERM, self._handle_term)
+        # Forked workers leave Ctrl-C to the master
+        signal.signal(signal.SIGINT, signal.SIG_IGN if self.pid else self._handle_term)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        # Re-seed per process in case a post_fork hook needs randomness
+        random.seed()
+        if self.app is None:
+            self.app = load_app(self.config.app)
+        run_hooks('post_fork', self)
+
+        handler = type('WorkerRequestHandler', (WorkerRequestHandler,), {
+            # Sync workers close after each response so one client can't hold the worker
+            'protocol_version': 'HTTP/1.1' if self.threads > 1 else 'HTTP/1.0',
+            # Idle keep-alive connections give their thread back after this long
+            'timeout': self.config.keepalive,
+        })
+        server = WorkerServer(self, handler)
+        # All workers wait on the same socket; non-blocking accept lets the
+        # ones that lose the race go back to waiting instead of hanging
+        server.socket.setblocking(False)
+
+        while self._should_run():
+            with self._cond:
+                while self.alive and self.active >= self.threads:
+                    self._cond.wait(0.5)
+            if not self._should_run():
+                break
+            server.handle_request()
+
+        deadline = time.monotonic() + self.config.graceful_timeout
+        with self._cond:
+            while (self.active or self.detached) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+        if server.pool is not None:
+            server.pool.shutdown(wait=False)
+        run_hooks('worker_exit', self)
+
+
+class Arbiter:
+    """Master process: owns the listening socket and supervises workers"""
+
+    def __init__(self, config):
+        self.config = config
+        self.sock = None
+        self.app = None
+        self.workers = {}
+        self.generation = 0
+        self.running = True
+        self._signals = []
+
+    def _signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _listen(self):
+        sock = socket.create_server((self.config.host, self.config.port),
+                                    backlog=self.config.backlog, reuse_port=False)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn_worker(self):
+        """Fork one worker of the current generation"""
+        worker = Worker(self.config, self.sock, self.app, self.generation)
+        pid = os.fork()
+        if pid:
+            worker.pid = pid
+            self.workers[pid] = worker
+            return worker
+
+        # Child
+        exit_code = 0
+        try:
+            worker.pid = os.getpid()
+            worker.run()
+        except Exception as e:
+            print(f"❌ Worker {os.getpid()} failed: {e}", file=sys.stderr)
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def stop_workers(self, workers, graceful=True):
+        """Ask workers to finish; kill those still running after the timeout"""
+        for worker in workers:
+            self._kill(worker.pid, signal.SIGTERM if graceful else signal.SIGKILL)
+        deadline = time.monotonic() + self.config.graceful_timeout + 1
+        pids = {worker.pid for worker in workers}
+        while pids and time.monotonic() < deadline:
+            pids -= self.reap()
+            time.sleep(0.1)
+        for pid in pids:
+            self._kill(pid, signal.SIGKILL)
+        while pids:
+            pids -= self.reap(block=True)
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self, block=False):
+        """Collect exited workers and return their pids"""
+        exited = set()
+        while True:
+            try:
+                pid, status = os.waitpid(-1, 0 if block and not exited else os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            worker = self.workers.pop(pid, None)
+            exited.add(pid)
+            if worker and self.running and worker.generation == self.generation:
+                code = os.waitstatus_to_exitcode(status)
+                if code and time.monotonic() - worker.started_at < MIN_WORKER_LIFETIME:
+                    print(f"⚠️  Worker {pid} exited with {code} right after starting", file=sys.stderr)
+                    time.sleep(MIN_WORKER_LIFETIME)
+        return exited
+
+    def reload(self):
+        """Graceful restart: start a new generation, then drain the old one"""
+        old_workers = list(self.workers.values())
+        self.generation += 1
+        for _ in range(self.config.workers):
+            self.spawn_worker()
+        self.stop_workers(old_workers)
+        print(f"🔄 Restarted {len(old_workers)} worker(s)")
+
+    def run(self):
+        self.sock = self._listen()
+        if self.config.preload:
+            # Imported once here; workers share the pages copy-on-write
+            self.app = load_app(self.config.app)
+        run_hooks('on_starting', self)
+
+        signal.signal(signal.SIGTERM, self._signal)
+        signal.signal(signal.SIGINT, self._signal)
+        signal.signal(signal.SIGHUP, self._signal)
+
+        print(f"🚀 Serving {self.config.app} on http://{self.config.host}:{self.config.port} "
+              f"({self.config.workers} worker(s) x {self.config.threads} thread(s), pid {os.getpid()})")
+        try:
+            while self.running:
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                    else:
+                        self.running = False
+                if not self.running:
+                    break
+
+                self.reap()
+                # Replace recycled or crashed workers
+                while len(self.workers) < self.config.workers:
+                    self.spawn_worker()
+                time.sleep(0.5)
+        finally:
+            self.running = False
+            print("👋 Shutting down workers...")
+            self.stop_workers(list(self.workers.values()))
+            self.sock.close()
+
+
+def run_single(config):
+    """Serve from the current process (platforms without fork)"""
+    sock = socket.create_server((config.host, config.port), backlog=config.backlog)
+    config.max_requests = 0
+    worker = Worker(config, sock, load_app(config.app))
+    run_hooks('on_starting', None)
+    print(f"🚀 Serving {config.app} on http://{config.host}:{config.port} "
+          f"(single process x {config.threads} thread(s))")
+    try:
+        worker.run()
+    finally:
+        sock.close()
+
+
+def _env_flag(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+def parse_args(argv=None):
+    """Command line options (defaults come from environment variables)"""
+    parser = argparse.ArgumentParser(description='Elnaz Ashrafi production server')
+    parser.add_argument('--app', default=os.getenv('WSGI_APP', 'backend.app:app'),
+                        help="WSGI app as 'module:attribute' or 'module:factory()'")
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 1)),
+                        help='Threads per worker (1 = sync worker)')
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('MAX_REQUESTS', 0)),
+                        help='Recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=int(os.getenv('MAX_REQUESTS_JITTER', 0)))
+    parser.add_argument('--graceful-timeout', type=float, default=float(os.getenv('GRACEFUL_TIMEOUT', 30)),
+                        help='Seconds to let in-flight requests finish on restart/shutdown')
+    parser.add_argument('--keepalive', type=float, default=float(os.getenv('KEEPALIVE', 5)),
+                        help='Idle keep-alive timeout for threaded workers')
+    parser.add_argument('--backlog', type=int, default=int(os.getenv('BACKLOG', 2048)))
+    parser.add_argument('--preload', dest='preload', action='store_true', default=_env_flag('PRELOAD_APP', True),
+                        help='Import the app in the master before forking (default)')
+    parser.add_argument('--no-preload', dest='preload', action='store_false')
+    parser.add_argument('--hooks', default=os.getenv('SERVER_HOOKS'),
+                        help='Module to import that registers hooks with @hook(...)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    # Option defaults (WEB_THREADS, ...) may come from .env
+    from .environment import load_environment
+    load_environment()
+    config = parse_args(argv)
+    if config.hooks:
+        importlib.import_module(config.hooks)
+    if hasattr(os, 'fork'):
+        Arbiter(config).run()
+    else:
+        run_single(config)
+
+
+if __name__ == '__main__':
+    # python -m backend.server --workers 4 --threads 4 --max-requests 5000
+    main()
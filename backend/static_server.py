@@ -0,0 +1,264 @@
+"""
+Static File Server
+Serves small frontend files from memory with precomputed ETags and encodings,
+streams large files and images through wsgi.file_wrapper (sendfile), supports
+Range requests and reloads changed files in development
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+from flask import Response, request
+from .compression import (
+    COMPRESSIBLE_MIMETYPES, DEFAULT_MIN_SIZE, ENCODING_SUFFIXES,
+    _add_vary, _is_fresh, available_encodings, compress_bytes, send_static
+)
+
+# Files larger than this are streamed from disk instead of held in memory
+DEFAULT_MAX_FILE_SIZE = 256 * 1024
+
+# Upper bound for all in-memory file data (including encoded copies)
+DEFAULT_MAX_TOTAL_SIZE = 32 * 1024 * 1024
+
+# Media is always served from disk (large, already compressed, often ranged)
+DISK_ONLY_MIMETYPE_PREFIXES = ('image/', 'video/', 'audio/')
+
+# Generated siblings and partial writes are never served as files of their own
+SKIP_SUFFIXES = ('.gz', '.br', '.tmp')
+
+DEFAULT_WATCH_INTERVAL = 1.0
+
+
+class StaticEntry:
+    """One file held in memory with its validators and encoded copies"""
+
+    __slots__ = ('data', 'etag', 'mimetype', 'mtime', 'size', 'encoded')
+
+    def __init__(self, data, mimetype, mtime, size):
+        self.data = data
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.size = size
+        # encoding -> (bytes, etag)
+        self.encoded = {}
+
+    @property
+    def memory_size(self):
+        """Bytes used by this entry"""
+        return len(self.data) + sum(len(data) for data, _ in self.encoded.values())
+
+
+class StaticFileCache:
+    """In-memory index of the frontend directory"""
+
+    def __init__(self, directory, max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 max_total_size=DEFAULT_MAX_TOTAL_SIZE, min_compress_size=DEFAULT_MIN_SIZE):
+        self.directory = os.path.abspath(directory)
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.min_compress_size = min_compress_size
+        self.entries = {}
+        self.total_size = 0
+        self._scan_lock = threading.Lock()
+
+    def get(self, path):
+        """Get the in-memory entry for a request path (or None)"""
+        return self.entries.get(path)
+
+    def _cacheable(self, relative, mimetype, size):
+        """Decide whether a file belongs in memory"""
+        return (size <= self.max_file_size
+                and not relative.endswith(SKIP_SUFFIXES)
+                and not mimetype.startswith(DISK_ONLY_MIMETYPE_PREFIXES))
+
+    def _load(self, source, mimetype, mtime, size):
+        """Read a file and its encoded variants"""
+        with open(source, 'rb') as f:
+            data = f.read()
+        entry = StaticEntry(data, mimetype, mtime, size)
+
+        if mimetype in COMPRESSIBLE_MIMETYPES and size >= self.min_compress_size:
+            for encoding in available_encodings():
+                sibling = source + ENCODING_SUFFIXES[encoding]
+                if _is_fresh(source, sibling):
+                    with open(sibling, 'rb') as f:
+                        encoded = f.read()
+                else:
+                    # No build-time sibling: compress once here, never per request
+                    encoded = compress_bytes(data, encoding)
+                if len(encoded) < size:
+                    entry.encoded[encoding] = (encoded, f'{entry.etag}-{encoding}')
+        return entry
+
+    def scan(self):
+        """
+        Load new and changed files, drop deleted ones
+
+        Unchanged files (same mtime and size) keep their existing entry, so
+        rescanning is cheap enough to run periodically in development.
+
+        Returns:
+            list: Relative paths that were added, changed or removed
+        """
+        with self._scan_lock:
+            old_entries = self.entries
+            entries = {}
+            changed = []
+            total = 0
+
+            for root, _, files in os.walk(self.directory):
+                for name in sorted(files):
+                    source = os.path.join(root, name)
+                    relative = os.path.relpath(source, self.directory).replace(os.sep, '/')
+                    try:
+                        stat = os.stat(source)
+                    except OSError:
+                        continue
+                    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    if not self._cacheable(relative, mimetype, stat.st_size):
+                        continue
+
+                    entry = old_entries.get(relative)
+                    if entry is None or entry.mtime != stat.st_mtime or entry.size != stat.st_size:
+                        try:
+                            entry = self._load(source, mimetype, stat.st_mtime, stat.st_size)
+                        except OSError:
+                            continue
+                        changed.append(relative)
+
+                    if total + entry.memory_size > self.max_total_size:
+                        continue
+                    entries[relative] = entry
+                    total += entry.memory_size
+
+            changed.extend(path for path in old_entries if path not in entries)
+            # Swap in one assignment so concurrent requests see a consistent dict
+            self.entries = entries
+            self.total_size = total
+            return changed
+
+    def serve(self, path, cache_control=None):
+        """
+        Build the response for a static path
+
+        Memory hits are answered without touching the filesystem; anything
+        else goes through send_static, which streams the file via
+        wsgi.file_wrapper (or X-Sendfile when USE_X_SENDFILE is on).
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            response = send_static(self.directory, path)
+        else:
+            response = self._memory_response(entry)
+        if cache_control:
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+    def _memory_response(self, entry):
+        """Respond from an in-memory entry, honouring conditional and Range headers"""
+        data, etag, encoding = entry.data, entry.etag, None
+        # Byte ranges refer to the identity representation
+        if entry.encoded and 'Range' not in request.headers:
+            accepted = request.accept_encodings
+            for candidate in available_encodings():
+                if candidate in entry.encoded and accepted[candidate] > 0:
+                    encoding = candidate
+                    data, etag = entry.encoded[candidate]
+                    break
+
+        response = Response(data, mimetype=entry.mimetype)
+        response.set_etag(etag)
+        response.last_modified = entry.mtime
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry.encoded:
+            _add_vary(response)
+        # Handles If-None-Match/If-Modified-Since (304) and Range (206/416)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    def stats(self):
+        """Summary of the cache for diagnostics"""
+        return {
+            'files': len(self.entries),
+            'bytes': self.total_size,
+            'max_file_size': self.max_file_size,
+            'max_total_size': self.max_total_size
+        }
+
+
+class StaticWatcher(threading.Thread):
+    """Development helper that polls the frontend directory for changes"""
+
+    def __init__(self, cache, on_change=None, interval=DEFAULT_WATCH_INTERVAL):
+        super().__init__(name='static-watcher', daemon=True)
+        self.cache = cache
+        self.on_change = on_change
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                changed = self.cache.scan()
+                if changed and self.on_change:
+                    self.on_change(changed)
+            except Exception as e:
+                print(f"Warning: Static file watcher failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def init_static_server(app):
+    """Preload the frontend directory and (in development) watch it for changes"""
+    from .assets import ASSET_DIRS, AssetManifest, build_assets
+    from .compression import precompress_static
+
+    cache = StaticFileCache(
+        app.config['FRONTEND_DIR'],
+        max_file_size=app.config.setdefault('STATIC_CACHE_MAX_FILE_SIZE', DEFAULT_MAX_FILE_SIZE),
+        max_total_size=app.config.setdefault('STATIC_CACHE_MAX_TOTAL_SIZE', DEFAULT_MAX_TOTAL_SIZE),
+        min_compress_size=app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    )
+    cache.scan()
+    app.extensions['static_files'] = cache
+
+    # None follows app.debug (which app.run(debug=True) only sets after import)
+    watch = app.config.setdefault('STATIC_WATCH', None)
+    if watch is False:
+        return cache
+
+    def rebuild(changed):
+        # Source JS/CSS or a top-level page changed: refresh hashed assets
+        sources = [path for path in changed
+                   if path.split('/', 1)[0] in ASSET_DIRS or ('/' not in path and path.endswith('.html'))]
+        if not sources:
+            return
+        build_assets(app.config['FRONTEND_DIR'])
+        if app.config.get('COMPRESS_PRECOMPRESS_STATIC'):
+            precompress_static(app.config['FRONTEND_DIR'], app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE))
+        app.extensions['assets'] = AssetManifest.load(app.config['FRONTEND_DIR'])
+        cache.scan()
+        print(f"🔄 Rebuilt static assets ({', '.join(sources)})")
+
+    lock = threading.Lock()
+
+    def start_watcher():
+        with lock:
+            if 'static_watcher' not in app.extensions:
+                watcher = StaticWatcher(cache, on_change=rebuild,
+                                        interval=app.config.get('STATIC_WATCH_INTERVAL', DEFAULT_WATCH_INTERVAL))
+                watcher.start()
+                app.extensions['static_watcher'] = watcher
+
+    if watch:
+        start_watcher()
+    else:
+        @app.before_request
+        def _start_static_watcher():
+            if app.debug and 'static_watcher' not in app.extensions:
+                start_watcher()
+
+    return cache
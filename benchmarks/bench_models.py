@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+"""
+Models Microbenchmark Suite
+Times every public method of backend/models.py against generated fixture
+databases of several sizes, saves the results as JSON baselines and flags
+regressions against a saved baseline
+
+Usage:
+    python benchmarks/bench_models.py --save                  # record benchmarks/baselines/models.json
+    python benchmarks/bench_models.py --compare               # exit 1 on regressions beyond --threshold
+    python benchmarks/bench_models.py --sizes small --only Order.,Coupon.validate
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import database
+from backend import models
+from backend.models import (
+    Contact, ShopOrder, Newsletter, Admin, Product, Order, ShopUser, ShopPage, Coupon,
+    Inventory, ProductAttribute, ProductReview, ProductImage, SupportTicket
+)
+from generate_dataset import BENCH_ADMIN, BENCH_CUSTOMER_PASSWORD, generate
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+# Fixture databases, as row counts passed to generate_dataset.generate
+SIZES = {
+    'small': {'products': 100, 'customers': 50, 'orders': 500, 'reviews': 300, 'events': 1_000, 'tickets': 100},
+    'medium': {'products': 2_000, 'customers': 500, 'orders': 20_000, 'reviews': 5_000,
+               'events': 10_000, 'tickets': 2_000},
+    'large': {'products': 20_000, 'customers': 5_000, 'orders': 200_000, 'reviews': 50_000,
+              'events': 100_000, 'tickets': 20_000},
+}
+
+# Default relative slowdown of the median that counts as a regression
+DEFAULT_THRESHOLD = 0.20
+
+# Each case runs at least MIN_ROUNDS times and for at least MIN_TIME seconds
+MIN_ROUNDS = 15
+MIN_TIME = 0.2
+MAX_ROUNDS = 2_000
+WARMUP_ROUNDS = 2
+
+# Fixed timestamp so fixtures are identical between runs
+FIXTURE_END = '2026-01-01'
+
+
+class Case:
+    """One benchmarked model method"""
+
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+CASES = []
+
+
+def case(name, setup=None):
+    """Register func(ctx, rng[, prepared]) as the benchmark for a model method"""
+    def decorator(func):
+        CASES.append(Case(name, func, setup))
+        return func
+    return decorator
+
+
+class Fixture:
+    """Ids and tokens of known rows in a fixture database"""
+
+    def __init__(self, db_path, counts):
+        self.db_path = db_path
+        self.counts = counts
+        self.sequence = 0
+
+    def unique(self, prefix):
+        """Fresh value for UNIQUE columns (emails, codes, keys)"""
+        self.sequence += 1
+        return f'{prefix}{self.sequence}'
+
+    def execute(self, sql, params=()):
+        """Uninstrumented statement for setup work"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def product_id(self, rng):
+        return rng.randint(1, self.counts['products'])
+
+    def order_id(self, rng):
+        return rng.randint(1, self.counts['orders'])
+
+    def ticket_id(self, rng):
+        return rng.randint(1, self.counts['tickets'])
+
+    def customer_id(self, rng):
+        return rng.randint(1, self.counts['customers'])
+
+
+def build_fixture(size, cache_dir, seed):
+    """
+    Generate (or reuse) the fixture database for a size and return a
+    Fixture pointing at a private working copy of it
+    """
+    counts = SIZES[size]
+    cached = os.path.join(cache_dir, f'models-{size}-{seed}.db')
+    if not os.path.exists(cached):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate(cached + '.tmp', dict(counts), seed=seed, end=datetime.strptime(FIXTURE_END, '%Y-%m-%d'))
+            database.DB_PATH = cached + '.tmp'
+            _add_extras(counts)
+        os.replace(cached + '.tmp', cached)
+
+    working = os.path.join(tempfile.mkdtemp(prefix='bench-models-'), 'models.db')
+    shutil.copyfile(cached, working)
+    database.DB_PATH = working
+    fixture = Fixture(working, counts)
+
+    fixture.admin_id = Admin.authenticate(*BENCH_ADMIN)['id']
+    fixture.admin_token = Admin.create_session(fixture.admin_id)
+    fixture.customer_token = ShopUser.create_session(1)
+    conn = sqlite3.connect(working)
+    try:
+        fixture.order_number = conn.execute('SELECT order_number FROM orders WHERE id = 1').fetchone()[0]
+        fixture.ticket_number = conn.execute('SELECT ticket_number FROM support_tickets WHERE id = 1').fetchone()[0]
+    finally:
+        conn.close()
+    return fixture
+
+
+def _add_extras(counts):
+    """Rows the dataset generator does not create (through the models themselves)"""
+    rng = random.Random(0)
+    ShopPage.initialize_default_pages()
+    Coupon.create('BENCH10', 'percentage', 10, description_fa='تخفیف بنچمارک', max_discount=5_000_000)
+    for i in range(1, 51):
+        Contact.create(f'کاربر {i}', f'contact{i}@example.com', 'سوال', 'متن پیام')
+        ShopOrder.create(f'اثر {i}', f'مشتری {i}', f'shoporder{i}@example.com')
+        Newsletter.subscribe(f'reader{i}@example.com')
+    for product_id in range(1, min(counts['products'], 500) + 1):
+        ProductAttribute.create(product_id, 'اندازه', rng.choice(['کوچک', 'متوسط', 'بزرگ']))
+        Inventory.record_change(product_id, 5, 'purchase', 0)
+        image_id = ProductImage.create(product_id, f'/assets/products/{product_id}.jpg', is_primary=True)
+        ProductImage.record_variants(image_id, [
+            {'width': width, 'height': width, 'format': 'webp',
+             'url': f'/assets/cache/{product_id}-{width}.webp', 'file_size': width * 40}
+            for width in (320, 640, 1024)
+        ])
+
+
+def measure(func, setup=None, ctx=None, rng=None):
+    """
+    Time individual calls of func
+
+    Returns:
+        dict: min/max/mean/median/stddev per call in seconds, plus rounds
+    """
+    timings = []
+    started = time.perf_counter()
+    for round_number in range(WARMUP_ROUNDS + MAX_ROUNDS):
+        prepared = (setup(ctx, rng),) if setup else ()
+        call_started = time.perf_counter()
+        func(ctx, rng, *prepared)
+        elapsed = time.perf_counter() - call_started
+        if round_number < WARMUP_ROUNDS:
+            continue
+        timings.append(elapsed)
+        if len(timings) >= MIN_ROUNDS and time.perf_counter() - started >= MIN_TIME:
+            break
+    return {
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.fmean(timings),
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'rounds': len(timings),
+    }
+
+
+def run_suite(sizes, only=None, seed=42, cache_dir=None):
+    """Run the selected cases at each size; failing cases are reported, not raised"""
+    cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'elnaz-bench-fixtures')
+    os.makedirs(cache_dir, exist_ok=True)
+    selected = [c for c in CASES if not only or any(c.name.startswith(prefix) for prefix in only)]
+    results = {}
+
+    for size in sizes:
+        print(f'\n📦 {size}: {", ".join(f"{count:,} {name}" for name, count in SIZES[size].items())}')
+        fixture = build_fixture(size, cache_dir, seed)
+        results[size] = {}
+        for bench in selected:
+            rng = random.Random(f'{seed}-{bench.name}')
+            try:
+                stats = measure(bench.func, setup=bench.setup, ctx=fixture, rng=rng)
+            except Exception as e:
+                results[size][bench.name] = {'error': f'{type(e).__name__}: {e}'}
+                print(f'   {bench.name:<40} ❌ {type(e).__name__}: {e}')
+                continue
+            results[size][bench.name] = stats
+            print(f'   {bench.name:<40} {stats["median"] * 1e6:>10.1f} µs  (±{stats["stddev"] * 1e6:.1f}, {stats["rounds"]} rounds)')
+        shutil.rmtree(os.path.dirname(fixture.db_path), ignore_errors=True)
+    return results
+
+
+def uncovered_methods():
+    """Public model methods without a benchmark case"""
+    covered = {c.name for c in CASES}
+    missing = []
+    for class_name in dir(models):
+        cls = getattr(models, class_name)
+        if not isinstance(cls, type) or cls.__module__ != models.__name__:
+            continue
+        for name, value in vars(cls).items():
+            if not name.startswith('_') and isinstance(value, staticmethod) and f'{class_name}.{name}' not in covered:
+                missing.append(f'{class_name}.{name}')
+    return missing
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare medians with a baseline
+
+    Returns:
+        tuple: (regressions, improvements) as lists of (size, case, baseline s, current s, ratio)
+    """
+    regressions, improvements = [], []
+    for size, cases in results.items():
+        for name, stats in cases.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if not before or 'median' not in before or 'median' not in stats:
+                continue
+            ratio = stats['median'] / before['median']
+            entry = (size, name, before['median'], stats['median'], ratio)
+            if ratio > 1 + threshold:
+                regressions.append(entry)
+            elif ratio < 1 - threshold:
+                improvements.append(entry)
+    return regressions, improvements
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium', help=f'Comma-separated from {", ".join(SIZES)}')
+    parser.add_argument('--only', help='Comma-separated case name prefixes (e.g. Order.,Coupon.validate)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default='models', help='Baseline name in benchmarks/baselines/')
+    parser.add_argument('--save', action='store_true', help='Write the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Compare with the baseline, exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative slowdown of the median counted as a regression (0.2 = 20%%)')
+    parser.add_argument('--fixtures-dir', help='Where generated fixture databases are cached')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f'unknown sizes: {", ".join(unknown)}')
+    only = args.only.split(',') if args.only else None
+
+    missing = uncovered_methods()
+    if missing:
+        print(f'⚠️  Model methods without a benchmark: {", ".join(missing)}')
+
+    results = run_suite(sizes, only, args.seed, args.fixtures_dir)
+    baseline_path = os.path.join(BASELINE_DIR, f'{args.baseline}.json')
+
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            print(f'\n⚠️  No baseline at {baseline_path}; run with --save first')
+        else:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('environment') != environment():
+                print('\n⚠️  Baseline was recorded in a different environment; timings may not be comparable')
+            regressions, improvements = compare(results, baseline, args.threshold)
+            for title, entries in (('Regressions', regressions), ('Improvements', improvements)):
+                if entries:
+                    print(f'\n{title} (threshold {args.threshold:.0%}):')
+                    for size, name, before, after, ratio in entries:
+                        print(f'   {size:<7} {name:<40} {before * 1e6:>9.1f} → {after * 1e6:>9.1f} µs  ({ratio:.2f}x)')
+            if regressions:
+                exit_code = 1
+            else:
+                print(f'\n✅ No regressions beyond {args.threshold:.0%}')
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'seed': args.seed,
+                'environment': environment(),
+                'results': results
+            }, f, indent=2, sort_keys=True)
+        print(f'\n📄 Baseline written to {baseline_path}')
+
+    sys.exit(exit_code)
+
+
+# ==================== CASES ====================
+# Every public model method gets one case. Methods that delete or consume
+# rows create their own target in an untimed setup step.
+
+@case('Contact.create')
+def _(ctx, rng):
+    Contact.create('کاربر بنچمارک', 'bench@example.com', 'سوال', 'متن پیام')
+
+@case('Contact.get_all')
+def _(ctx, rng):
+    Contact.get_all(limit=50)
+
+@case('Contact.iter_all')
+def _(ctx, rng):
+    for _ in Contact.iter_all():
+        pass
+
+@case('Contact.get_by_id')
+def _(ctx, rng):
+    Contact.get_by_id(rng.randint(1, 50))
+
+@case('Contact.update_status')
+def _(ctx, rng):
+    Contact.update_status(rng.randint(1, 50), rng.choice(['new', 'read', 'replied']))
+
+@case('ShopOrder.create')
+def _(ctx, rng):
+    ShopOrder.create('اثر', 'مشتری', 'shoporder@example.com')
+
+@case('ShopOrder.get_all')
+def _(ctx, rng):
+    ShopOrder.get_all(limit=50)
+
+@case('ShopOrder.get_by_id')
+def _(ctx, rng):
+    ShopOrder.get_by_id(rng.randint(1, 50))
+
+@case('ShopOrder.update_status')
+def _(ctx, rng):
+    ShopOrder.update_status(rng.randint(1, 50), 'processing')
+
+@case('Newsletter.subscribe')
+def _(ctx, rng):
+    Newsletter.subscribe(ctx.unique('reader') + '@example.com')
+
+def _subscriber(ctx, rng):
+    email = ctx.unique('leaver') + '@example.com'
+    Newsletter.subscribe(email)
+    return email
+
+@case('Newsletter.unsubscribe', setup=_subscriber)
+def _(ctx, rng, email):
+    Newsletter.unsubscribe(email)
+
+@case('Newsletter.get_all')
+def _(ctx, rng):
+    Newsletter.get_all()
+
+@case('Newsletter.iter_all')
+def _(ctx, rng):
+    for _ in Newsletter.iter_all():
+        pass
+
+@case('Admin.hash_password')
+def _(ctx, rng):
+    Admin.hash_password(BENCH_ADMIN[1])
+
+@case('Admin.create')
+def _(ctx, rng):
+    Admin.create(ctx.unique('admin'), 'password')
+
+@case('Admin.authenticate')
+def _(ctx, rng):
+    Admin.authenticate(*BENCH_ADMIN)
+
+@case('Admin.create_session')
+def _(ctx, rng):
+    Admin.create_session(ctx.admin_id)
+
+@case('Admin.verify_session')
+def _(ctx, rng):
+    Admin.verify_session(ctx.admin_token)
+
+@case('Admin.logout', setup=lambda ctx, rng: Admin.create_session(ctx.admin_id))
+def _(ctx, rng, token):
+    Admin.logout(token)
+
+@case('Admin.get_stats')
+def _(ctx, rng):
+    Admin.get_stats()
+
+@case('Product.create')
+def _(ctx, rng):
+    Product.create('تابلوی بنچمارک', 12_000_000, category='نقاشی', stock_quantity=3)
+
+@case('Product.get_all')
+def _(ctx, rng):
+    Product.get_all()
+
+@case('Product.get_all[category]')
+def _(ctx, rng):
+    Product.get_all(category='نقاشی')
+
+@case('Product.get_all[records]')
+def _(ctx, rng):
+    Product.get_all(as_records=True)
+
+@case('Product.get_by_id')
+def _(ctx, rng):
+    Product.get_by_id(ctx.product_id(rng))
+
+@case('Product.update')
+def _(ctx, rng):
+    Product.update(ctx.product_id(rng), price=rng.randint(5, 600) * 100_000)
+
+@case('Product.delete', setup=lambda ctx, rng: Product.create('حذفی', 1000))
+def _(ctx, rng, product_id):
+    Product.delete(product_id)
+
+@case('Product.get_categories')
+def _(ctx, rng):
+    Product.get_categories()
+
+@case('Order.generate_order_number')
+def _(ctx, rng):
+    Order.generate_order_number()
+
+def _stocked_product(ctx, rng):
+    product_id = ctx.product_id(rng)
+    ctx.execute('UPDATE products SET stock_quantity = 1000 WHERE id = ?', (product_id,))
+    return product_id
+
+@case('Order.create', setup=lambda ctx, rng: [_stocked_product(ctx, rng) for _ in range(3)])
+def _(ctx, rng, product_ids):
+    Order.create('مشتری بنچمارک', 'bench@example.com',
+                 [{'product_id': product_id, 'product_name': f'اثر شماره {product_id}', 'quantity': 1,
+                   'price': 1_000_000} for product_id in product_ids])
+
+@case('Order.get_all')
+def _(ctx, rng):
+    Order.get_all(limit=50)
+
+@case('Order.get_all[records]')
+def _(ctx, rng):
+    Order.get_all(limit=50, as_records=True)
+
+@case('Order.iter_all')
+def _(ctx, rng):
+    for _ in Order.iter_all(status='cancelled'):
+        pass
+
+@case('Order.get_by_id')
+def _(ctx, rng):
+    Order.get_by_id(ctx.order_id(rng))
+
+@case('Order.get_by_order_number')
+def _(ctx, rng):
+    Order.get_by_order_number(ctx.order_number)
+
+@case('Order.update_status')
+def _(ctx, rng):
+    Order.update_status(ctx.order_id(rng), 'completed')
+
+@case('Order.bulk_update_status')
+def _(ctx, rng):
+    Order.bulk_update_status([ctx.order_id(rng) for _ in range(20)], 'completed')
+
+@case('ShopUser.hash_password')
+def _(ctx, rng):
+    ShopUser.hash_password(BENCH_CUSTOMER_PASSWORD)
+
+@case('ShopUser.create')
+def _(ctx, rng):
+    ShopUser.create('مشتری جدید', ctx.unique('new') + '@example.com', 'password')
+
+@case('ShopUser.authenticate')
+def _(ctx, rng):
+    ShopUser.authenticate(f'customer{ctx.customer_id(rng)}@example.com', BENCH_CUSTOMER_PASSWORD)
+
+@case('ShopUser.get_by_id')
+def _(ctx, rng):
+    ShopUser.get_by_id(ctx.customer_id(rng))
+
+@case('ShopUser.get_by_email')
+def _(ctx, rng):
+    ShopUser.get_by_email(f'customer{ctx.customer_id(rng)}@example.com')
+
+@case('ShopUser.create_session')
+def _(ctx, rng):
+    ShopUser.create_session(ctx.customer_id(rng))
+
+@case('ShopUser.verify_session')
+def _(ctx, rng):
+    ShopUser.verify_session(ctx.customer_token)
+
+@case('ShopUser.logout', setup=lambda ctx, rng: ShopUser.create_session(ctx.customer_id(rng)))
+def _(ctx, rng, token):
+    ShopUser.logout(token)
+
+@case('ShopUser.update_profile')
+def _(ctx, rng):
+    ShopUser.update_profile(ctx.customer_id(rng), phone=f'0912{rng.randint(1000000, 9999999)}')
+
+@case('ShopPage.create_or_update')
+def _(ctx, rng):
+    ShopPage.create_or_update('about', 'درباره ما', 'متن صفحه درباره ما')
+
+@case('ShopPage.get_by_key')
+def _(ctx, rng):
+    ShopPage.get_by_key('about')
+
+@case('ShopPage.get_all')
+def _(ctx, rng):
+    ShopPage.get_all()
+
+def _page(ctx, rng):
+    page_key = ctx.unique('page')
+    ShopPage.create_or_update(page_key, 'صفحه', 'متن')
+    return page_key
+
+@case('ShopPage.delete', setup=_page)
+def _(ctx, rng, page_key):
+    ShopPage.delete(page_key)
+
+@case('ShopPage.initialize_default_pages')
+def _(ctx, rng):
+    ShopPage.initialize_default_pages()
+
+@case('Coupon.create')
+def _(ctx, rng):
+    Coupon.create(ctx.unique('C'), 'fixed', 100_000)
+
+@case('Coupon.get_by_code')
+def _(ctx, rng):
+    Coupon.get_by_code('BENCH10')
+
+@case('Coupon.validate')
+def _(ctx, rng):
+    Coupon.validate('BENCH10', rng.randint(1, 100) * 1_000_000)
+
+@case('Coupon.use_coupon')
+def _(ctx, rng):
+    Coupon.use_coupon('BENCH10')
+
+@case('Coupon.get_all')
+def _(ctx, rng):
+    Coupon.get_all()
+
+@case('Coupon.update')
+def _(ctx, rng):
+    Coupon.update(1, discount_value=rng.randint(5, 20))
+
+@case('Coupon.delete', setup=lambda ctx, rng: Coupon.create(ctx.unique('D'), 'fixed', 1000))
+def _(ctx, rng, coupon_id):
+    Coupon.delete(coupon_id)
+
+@case('Inventory.record_change')
+def _(ctx, rng):
+    Inventory.record_change(ctx.product_id(rng), 1, 'adjustment', 10)
+
+@case('Inventory.get_product_history')
+def _(ctx, rng):
+    Inventory.get_product_history(rng.randint(1, min(ctx.counts['products'], 500)))
+
+@case('Inventory.adjust_stock')
+def _(ctx, rng):
+    Inventory.adjust_stock(ctx.product_id(rng), rng.randint(0, 20))
+
+@case('Inventory.get_low_stock_products')
+def _(ctx, rng):
+    Inventory.get_low_stock_products()
+
+@case('Inventory.get_inventory_report')
+def _(ctx, rng):
+    Inventory.get_inventory_report()
+
+@case('ProductAttribute.create')
+def _(ctx, rng):
+    ProductAttribute.create(ctx.product_id(rng), 'رنگ', 'آبی')
+
+@case('ProductAttribute.get_by_product')
+def _(ctx, rng):
+    ProductAttribute.get_by_product(rng.randint(1, min(ctx.counts['products'], 500)))
+
+@case('ProductAttribute.update')
+def _(ctx, rng):
+    ProductAttribute.update(rng.randint(1, min(ctx.counts['products'], 500)), stock_quantity=rng.randint(0, 5))
+
+@case('ProductAttribute.delete', setup=lambda ctx, rng: ProductAttribute.create(1, 'حذفی', 'حذفی'))
+def _(ctx, rng, attribute_id):
+    ProductAttribute.delete(attribute_id)
+
+@case('ProductReview.create')
+def _(ctx, rng):
+    ProductReview.create(ctx.product_id(rng), 'مشتری', 5, 'عالی بود')
+
+@case('ProductReview.get_by_product')
+def _(ctx, rng):
+    ProductReview.get_by_product(ctx.product_id(rng))
+
+@case('ProductReview.get_all')
+def _(ctx, rng):
+    ProductReview.get_all()
+
+@case('ProductReview.get_by_id')
+def _(ctx, rng):
+    ProductReview.get_by_id(rng.randint(1, ctx.counts['reviews']))
+
+@case('ProductReview.approve')
+def _(ctx, rng):
+    ProductReview.approve(rng.randint(1, ctx.counts['reviews']))
+
+@case('ProductReview.delete', setup=lambda ctx, rng: ProductReview.create(1, 'حذفی', 3))
+def _(ctx, rng, review_id):
+    ProductReview.delete(review_id)
+
+@case('ProductReview.get_average_rating')
+def _(ctx, rng):
+    ProductReview.get_average_rating(ctx.product_id(rng))
+
+@case('ProductImage.create')
+def _(ctx, rng):
+    ProductImage.create(ctx.product_id(rng), '/assets/products/extra.jpg')
+
+@case('ProductImage.get_or_create_primary')
+def _(ctx, rng):
+    product_id = rng.randint(1, min(ctx.counts['products'], 500))
+    ProductImage.get_or_create_primary(product_id, f'/assets/products/{product_id}.jpg')
+
+@case('ProductImage.get_by_product')
+def _(ctx, rng):
+    ProductImage.get_by_product(rng.randint(1, min(ctx.counts['products'], 500)))
+
+@case('ProductImage.get_unprocessed')
+def _(ctx, rng):
+    ProductImage.get_unprocessed()
+
+@case('ProductImage.record_variants')
+def _(ctx, rng):
+    image_id = rng.randint(1, min(ctx.counts['products'], 500))
+    ProductImage.record_variants(image_id, [
+        {'width': width, 'height': width, 'format': 'jpeg', 'url': f'/assets/cache/{image_id}-{width}.jpg',
+         'file_size': width * 60}
+        for width in (320, 640, 1024)
+    ])
+
+@case('ProductImage.build_srcset')
+def _(ctx, rng):
+    ProductImage.build_srcset([
+        {'width': width, 'format': fmt, 'url': f'/assets/cache/1-{width}.{fmt}'}
+        for width in (1024, 320, 640) for fmt in ('webp', 'jpeg')
+    ])
+
+@case('ProductImage.get_primary_srcsets')
+def _(ctx, rng):
+    ProductImage.get_primary_srcsets(available_only=False)
+
+@case('SupportTicket.generate_ticket_number')
+def _(ctx, rng):
+    SupportTicket.generate_ticket_number()
+
+@case('SupportTicket.create')
+def _(ctx, rng):
+    SupportTicket.create('پیگیری سفارش', 'support', 'مشتری', 'bench@example.com', 'سلام')
+
+@case('SupportTicket.get_all')
+def _(ctx, rng):
+    SupportTicket.get_all()
+
+@case('SupportTicket.iter_all')
+def _(ctx, rng):
+    for _ in SupportTicket.iter_all(user_id=ctx.customer_id(rng)):
+        pass
+
+@case('SupportTicket.get_by_id')
+def _(ctx, rng):
+    SupportTicket.get_by_id(ctx.ticket_id(rng))
+
+@case('SupportTicket.get_by_number')
+def _(ctx, rng):
+    SupportTicket.get_by_number(ctx.ticket_number)
+
+@case('SupportTicket.update_status')
+def _(ctx, rng):
+    SupportTicket.update_status(ctx.ticket_id(rng), rng.choice(['open', 'answered', 'closed']))
+
+@case('SupportTicket.add_message')
+def _(ctx, rng):
+    SupportTicket.add_message(ctx.ticket_id(rng), 'پاسخ پشتیبانی', is_staff_reply=True)
+
+@case('SupportTicket.get_messages')
+def _(ctx, rng):
+    SupportTicket.get_messages(ctx.ticket_id(rng))
+
+@case('SupportTicket.get_stats')
+def _(ctx, rng):
+    SupportTicket.get_stats()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Row Mapping Microbenchmark
+Compares dict_from_row + json.dumps against RecordSet + records_to_json
+
+Usage: python benchmarks/bench_row_mapping.py [--rows 50000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.database import dict_from_row, query_records
+from backend.serialization import records_to_json
+
+
+def build_database(rows):
+    """Create an in-memory products table with the given number of rows"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name_fa TEXT NOT NULL,
+            name_en TEXT,
+            description_fa TEXT,
+            description_en TEXT,
+            price REAL NOT NULL,
+            category TEXT,
+            image_url TEXT,
+            stock_quantity INTEGER DEFAULT 0,
+            is_available INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO products (name_fa, name_en, description_fa, description_en, price,
+                              category, image_url, stock_quantity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        (f'تابلوی نقاشی شماره {i}', f'Painting {i}',
+         'نقاشی رنگ روغن اورجینال روی بوم، ۹۰×۱۲۰ سانتی‌متر', 'Original oil painting on canvas',
+         1000000 + i * 10.5, 'نقاشی', f'/assets/{i}.jpg', i % 20)
+        for i in range(rows)
+    ))
+    conn.commit()
+    return conn
+
+
+def dict_rows(conn):
+    """Current mapping: sqlite3.Row -> dict per row"""
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM products ORDER BY id')
+    return [dict_from_row(row) for row in cursor.fetchall()]
+
+
+def record_rows(conn):
+    """New mapping: plain tuples with one shared column map"""
+    return query_records(conn, 'SELECT * FROM products ORDER BY id')
+
+
+def dict_path(conn):
+    """Current path: sqlite3.Row -> dict per row -> json.dumps"""
+    return json.dumps({'products': dict_rows(conn)}, ensure_ascii=False).encode('utf-8')
+
+
+def records_path(conn):
+    """New path: tuples + precomputed column map -> JSON bytes"""
+    return ('{"products":' + records_to_json(record_rows(conn)) + '}').encode('utf-8')
+
+
+def measure(func, conn, repeat):
+    """Return (best seconds, peak allocated bytes, retained bytes of the result)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(conn)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = func(conn)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+
+    # Both paths must produce the same document
+    assert json.loads(dict_path(conn)) == json.loads(records_path(conn))
+
+    print(f'Rows: {args.rows}\n')
+    print(f'{"stage":<18} {"best ms":>10} {"peak MB":>10} {"retained/row":>13}')
+    results = {}
+    for name, func in (('map: dict', dict_rows), ('map: records', record_rows),
+                       ('json: dict', dict_path), ('json: records', records_path)):
+        seconds, peak, retained = measure(func, conn, args.repeat)
+        results[name] = (seconds, peak, retained)
+        print(f'{name:<18} {seconds * 1000:>10.1f} {peak / 1e6:>10.2f} {retained / args.rows:>13.0f}')
+
+    saved = (results['map: dict'][2] - results['map: records'][2]) / args.rows
+    speedup = results['json: dict'][0] / results['json: records'][0]
+    print(f'\nmapping: {saved:.0f} fewer bytes held per row')
+    print(f'end to end: {speedup:.2f}x faster to JSON bytes')
+
+if __name__ == '__main__':
+    main()
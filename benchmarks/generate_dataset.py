@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Scaled Dataset Generator
+Fills a database with seeded, realistic shop data for load tests
+
+At --scale 1 this is 100k products, 1M orders (about 2.5M order items),
+10M analytics events, 50k support tickets, 20k customers and 200k reviews.
+The same --seed always produces the same rows.
+
+Usage: python benchmarks/generate_dataset.py --db database/bench.db [--scale 0.01] [--seed 42]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend import database
+from backend.models import Admin, ShopUser
+
+# Row counts at --scale 1
+BASE_COUNTS = {
+    'products': 100_000,
+    'customers': 20_000,
+    'orders': 1_000_000,
+    'reviews': 200_000,
+    'events': 10_000_000,
+    'tickets': 50_000,
+}
+
+# Rows per executemany batch / transaction
+BATCH_SIZE = 20_000
+
+# Credentials of the admin created for load tests
+BENCH_ADMIN = ('bench', 'bench-password')
+BENCH_CUSTOMER_PASSWORD = 'bench-password'
+
+CATEGORIES = ['نقاشی', 'پرینت', 'مجسمه', 'عکاسی', 'خوشنویسی', 'سفال', 'طراحی', 'کتاب']
+ADJECTIVES = ['رویاهای', 'سایه‌های', 'زمزمه‌های', 'رنگ‌های', 'خاطرات', 'نورهای', 'آوای', 'سکوت']
+SUBJECTS = ['غروب', 'شهری', 'اقیانوس', 'کویر', 'بهار', 'پاییز', 'کوهستان', 'باران', 'شب']
+FIRST_NAMES = ['علی', 'مریم', 'رضا', 'زهرا', 'سارا', 'حسین', 'نگار', 'امیر', 'الناز', 'محمد']
+LAST_NAMES = ['محمدی', 'احمدی', 'رضایی', 'کریمی', 'حسینی', 'موسوی', 'اشرفی', 'جعفری']
+CITIES = ['تهران', 'اصفهان', 'شیراز', 'تبریز', 'مشهد', 'رشت', 'یزد']
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'delivered', 'delivered', 'cancelled']
+PAYMENT_METHODS = ['cash', 'online', 'card']
+EVENT_TYPES = ['page_view'] * 6 + ['product_view'] * 3 + ['add_to_cart', 'checkout', 'search', 'newsletter_signup']
+PAGES = ['/', '/shop.html', '/about.html', '/contact.html', '/gallery.html', '/cart.html']
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/120.0 Mobile Safari/537.36',
+]
+TICKET_SUBJECTS = ['پیگیری سفارش', 'مشکل در پرداخت', 'سوال درباره ارسال', 'درخواست مرجوعی', 'سفارش سفارشی']
+TICKET_STATUSES = ['open', 'answered', 'answered', 'closed', 'closed']
+REVIEW_TEXTS = ['عالی بود', 'کیفیت چاپ بسیار خوب', 'بسته‌بندی مناسب', 'رنگ‌ها زنده و زیبا', 'ارسال کمی طول کشید']
+
+
+def timestamp(rng, end, days):
+    """Random timestamp within `days` before `end`, skewed towards recent dates"""
+    offset = days * 86400 * (rng.random() ** 1.5)
+    return (end - timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def batched(rows, size=BATCH_SIZE):
+    """Split a row generator into lists of at most `size` rows"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(conn, label, sql, rows, total):
+    """Bulk insert with progress output"""
+    started = time.perf_counter()
+    done = 0
+    for batch in batched(rows):
+        conn.executemany(sql, batch)
+        conn.commit()
+        done += len(batch)
+        print(f'\r   {label:<14} {done:>11,} / {total:,}', end='', flush=True)
+    print(f'\r   {label:<14} {done:>11,} rows in {time.perf_counter() - started:6.1f} s')
+    return done
+
+
+def product_rows(rng, count, end):
+    for i in range(1, count + 1):
+        category = rng.choice(CATEGORIES)
+        name = f'{category} {rng.choice(ADJECTIVES)} {rng.choice(SUBJECTS)} {i}'
+        created = timestamp(rng, end, 730)
+        yield (
+            name, f'Artwork {i}',
+            f'{name}، اثری اورجینال با ابعاد {rng.randint(30, 150)}×{rng.randint(30, 150)} سانتی‌متر',
+            f'Original artwork {i}',
+            rng.randint(5, 600) * 100_000, category, f'/assets/products/{i % 500}.jpg',
+            rng.choice([0, 1, 1, 2, 5, 10, 25]), 0 if rng.random() < 0.05 else 1,
+            created, created
+        )
+
+
+def customer_rows(rng, count, end, password_hash):
+    for i in range(1, count + 1):
+        yield (
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', f'customer{i}@example.com',
+            f'0912{rng.randint(1000000, 9999999)}', password_hash,
+            f'{rng.choice(CITIES)}، خیابان {rng.randint(1, 200)}', timestamp(rng, end, 730)
+        )
+
+
+def order_rows(rng, count, customers, products, end):
+    """Orders and their items (items are yielded alongside each order)"""
+    for order_id in range(1, count + 1):
+        customer = rng.randint(1, customers)
+        items = []
+        for _ in range(rng.choice([1, 1, 2, 2, 3, 4, 5])):
+            product_id = rng.randint(1, products)
+            quantity = rng.choice([1, 1, 1, 2, 3])
+            price = rng.randint(5, 600) * 100_000
+            items.append((order_id, product_id, f'اثر شماره {product_id}', quantity, price))
+        total = sum(quantity * price for _, _, _, quantity, price in items)
+        discount = total // 10 if rng.random() < 0.1 else 0
+        status = rng.choice(ORDER_STATUSES)
+        created = timestamp(rng, end, 730)
+        order = (
+            f'ORD-{created[:10].replace("-", "")}-{order_id:07d}', f'مشتری {customer}',
+            f'customer{customer}@example.com', f'0912{customer:07d}', f'{rng.choice(CITIES)}',
+            total - discount, discount, 'NOROUZ' if discount else None, rng.choice(PAYMENT_METHODS),
+            'paid' if status in ('shipped', 'delivered') else 'pending', status, created, created
+        )
+        yield order, items
+
+
+def review_rows(rng, count, products, customers, end):
+    for _ in range(count):
+        customer = rng.randint(1, customers)
+        yield (
+            rng.randint(1, products), customer, f'مشتری {customer}', rng.choice([3, 4, 4, 5, 5, 5]),
+            rng.choice(REVIEW_TEXTS), 1 if rng.random() < 0.6 else 0, 1 if rng.random() < 0.8 else 0,
+            timestamp(rng, end, 365)
+        )
+
+
+def event_rows(rng, count, products, end):
+    for _ in range(count):
+        event_type = rng.choice(EVENT_TYPES)
+        if event_type in ('product_view', 'add_to_cart'):
+            data = {'product_id': rng.randint(1, products)}
+        else:
+            data = {'page': rng.choice(PAGES)}
+        yield (
+            event_type, json.dumps(data), f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+            rng.choice(USER_AGENTS), timestamp(rng, end, 365)
+        )
+
+
+def ticket_rows(rng, count, customers, end):
+    """Tickets and their message threads"""
+    for ticket_id in range(1, count + 1):
+        customer = rng.randint(1, customers)
+        status = rng.choice(TICKET_STATUSES)
+        created = timestamp(rng, end, 365)
+        ticket = (
+            customer, f'TKT-{created[:10].replace("-", "")}-{ticket_id:06d}', rng.choice(TICKET_SUBJECTS),
+            rng.choice(['support', 'order', 'payment']), status, rng.choice(['low', 'normal', 'normal', 'high']),
+            f'مشتری {customer}', f'customer{customer}@example.com', created, created,
+            created if status == 'closed' else None
+        )
+        messages = [(ticket_id, customer, 0, 'سلام، لطفا راهنمایی کنید', created)]
+        for reply in range(rng.randint(0, 4)):
+            messages.append((ticket_id, None if reply % 2 == 0 else customer, 1 if reply % 2 == 0 else 0,
+                             'پیام پیگیری شماره ' + str(reply + 1), created))
+        yield ticket, messages
+
+
+def insert_pairs(conn, label, parent_sql, child_sql, rows, total):
+    """Bulk insert parent rows with explicit ids plus their child rows"""
+    started = time.perf_counter()
+    done = children = 0
+    for batch in batched(rows):
+        conn.executemany(parent_sql, [parent for parent, _ in batch])
+        conn.executemany(child_sql, [child for _, items in batch for child in items])
+        conn.commit()
+        done += len(batch)
+        children += sum(len(items) for _, items in batch)
+        print(f'\r   {label:<14} {done:>11,} / {total:,}', end='', flush=True)
+    print(f'\r   {label:<14} {done:>11,} rows (+{children:,} children) in {time.perf_counter() - started:6.1f} s')
+
+
+def generate(db_path, counts, seed=42, end=None):
+    """
+    Create db_path with the schema and fill it with generated rows
+
+    Returns:
+        dict: Row counts per table group
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(f'{db_path} already exists (use --force to replace it)')
+
+    database.DB_PATH = db_path
+    database.init_db()
+    Admin.create(*BENCH_ADMIN)
+
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    password_hash = ShopUser.hash_password(BENCH_CUSTOMER_PASSWORD)
+
+    conn = sqlite3.connect(db_path)
+    # Bulk load: durability does not matter for a throwaway dataset
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -200000')
+
+    try:
+        insert(conn, 'products', '''
+            INSERT INTO products (name_fa, name_en, description_fa, description_en, price, category,
+                                  image_url, stock_quantity, is_available, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', product_rows(rng, counts['products'], end), counts['products'])
+
+        insert(conn, 'customers', '''
+            INSERT INTO shop_users (full_name, email, phone, password_hash, address, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', customer_rows(rng, counts['customers'], end, password_hash), counts['customers'])
+
+        insert_pairs(conn, 'orders', '''
+            INSERT INTO orders (order_number, customer_name, customer_email, customer_phone, customer_address,
+                                total_amount, discount_amount, coupon_code, payment_method, payment_status,
+                                status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', '''
+            INSERT INTO order_items (order_id, product_id, product_name, quantity, price)
+            VALUES (?, ?, ?, ?, ?)
+        ''', order_rows(rng, counts['orders'], counts['customers'], counts['products'], end), counts['orders'])
+
+        insert(conn, 'reviews', '''
+            INSERT INTO product_reviews (product_id, user_id, customer_name, rating, review_text,
+                                         is_verified, is_approved, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', review_rows(rng, counts['reviews'], counts['products'], counts['customers'], end), counts['reviews'])
+
+        insert_pairs(conn, 'tickets', '''
+            INSERT INTO support_tickets (user_id, ticket_number, subject, category, status, priority,
+                                         customer_name, customer_email, created_at, updated_at, closed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', '''
+            INSERT INTO ticket_messages (ticket_id, user_id, is_staff_reply, message, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ticket_rows(rng, counts['tickets'], counts['customers'], end), counts['tickets'])
+
+        insert(conn, 'events', '''
+            INSERT INTO analytics_events (event_type, event_data, ip_address, user_agent, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', event_rows(rng, counts['events'], counts['products'], end), counts['events'])
+
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join('database', 'bench.db'), help='Output database file')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for all row counts')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', help='Newest timestamp (YYYY-MM-DD, default now) for reproducible dates')
+    parser.add_argument('--force', action='store_true', help='Replace an existing database file')
+    for name in BASE_COUNTS:
+        parser.add_argument(f'--{name}', type=int, help=f'Override the number of {name}')
+    args = parser.parse_args()
+
+    counts = {name: getattr(args, name) if getattr(args, name) is not None else max(1, int(base * args.scale))
+              for name, base in BASE_COUNTS.items()}
+    end = datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date else None
+
+    if args.force and os.path.exists(args.db):
+        os.remove(args.db)
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+
+    print(f'📦 Generating {args.db} (seed {args.seed})')
+    started = time.perf_counter()
+    generate(args.db, counts, seed=args.seed, end=end)
+    size = os.path.getsize(args.db) / 1e6
+    print(f'✅ Done in {time.perf_counter() - started:.1f} s, {size:.1f} MB')
+    print(f'   Admin login: {BENCH_ADMIN[0]} / {BENCH_ADMIN[1]}')
+
+
+if __name__ == '__main__':
+    main()
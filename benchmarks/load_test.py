@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Drives a weighted mix of shop, admin and analytics requests against the
+app (in-process through the Flask test client, or over HTTP) and reports
+latency percentiles per endpoint
+
+Generate a dataset first with benchmarks/generate_dataset.py; request
+parameters (product, order and ticket ids) are drawn from it.
+
+Usage:
+    python benchmarks/load_test.py --db database/bench.db --requests 5000 --concurrency 8
+    python benchmarks/load_test.py --db database/bench.db --url http://127.0.0.1:5000 --duration 60
+    python benchmarks/load_test.py --db database/bench.db --ai-stub --only ai_chat,ai_chat_stream
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_dataset import BENCH_ADMIN
+
+
+class Scenario:
+    """One kind of request in the mix"""
+
+    def __init__(self, name, method, path, weight, admin=False, body=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.weight = weight
+        self.admin = admin
+        self.body = body
+
+
+# path/body callables receive (rng, dataset)
+SCENARIOS = [
+    Scenario('product', 'GET', lambda rng, ds: f'/api/shop/products/{rng.randint(1, ds["products"])}', 20),
+    Scenario('products_by_category', 'GET',
+             lambda rng, ds: f'/api/shop/products?category={quote(rng.choice(ds["categories"]))}', 6),
+    Scenario('product_reviews', 'GET',
+             lambda rng, ds: f'/api/shop/products/{rng.randint(1, ds["products"])}/reviews', 10),
+    Scenario('categories', 'GET', lambda rng, ds: '/api/shop/categories', 5),
+    Scenario('order', 'GET', lambda rng, ds: f'/api/shop/orders/{rng.randint(1, ds["orders"])}', 10),
+    Scenario('order_track', 'GET', lambda rng, ds: f'/api/shop/orders/track/{rng.choice(ds["order_numbers"])}', 5),
+    Scenario('orders_recent', 'GET', lambda rng, ds: '/api/shop/orders?limit=50', 3),
+    Scenario('ticket', 'GET', lambda rng, ds: f'/api/shop/tickets/{rng.randint(1, ds["tickets"])}', 5),
+    Scenario('ticket_stats', 'GET', lambda rng, ds: '/api/shop/tickets/stats', 1),
+    Scenario('track_event', 'POST', lambda rng, ds: '/api/analytics/track', 8,
+             body=lambda rng, ds: {'event_type': 'product_view',
+                                   'event_data': {'product_id': rng.randint(1, ds['products'])}}),
+    Scenario('analytics_events', 'GET', lambda rng, ds: '/api/analytics/events?limit=100', 2, admin=True),
+    Scenario('analytics_stats', 'GET', lambda rng, ds: '/api/analytics/stats?days=30', 1, admin=True),
+    Scenario('admin_stats', 'GET', lambda rng, ds: '/api/admin/stats', 1, admin=True),
+    Scenario('sales_report', 'GET', lambda rng, ds: '/api/shop/reports/sales', 1, admin=True),
+    Scenario('customer_report', 'GET', lambda rng, ds: '/api/shop/reports/customers', 1, admin=True),
+    # The full catalogue is huge at scale; only run it when asked for with --only
+    Scenario('products_all', 'GET', lambda rng, ds: '/api/shop/products', 0),
+    # AI endpoints also only run when named; add --ai-stub to run them offline against the stub provider
+    Scenario('ai_chat', 'POST', lambda rng, ds: '/api/ai/chat', 0, admin=True,
+             body=lambda rng, ds: {'message': f'How can I improve product page {rng.randint(1, 20)}?'}),
+    Scenario('ai_chat_uncached', 'POST', lambda rng, ds: '/api/ai/chat', 0, admin=True,
+             body=lambda rng, ds: {'message': f'Describe product {rng.randint(1, ds["products"])}', 'use_cache': False}),
+    Scenario('ai_chat_stream', 'POST', lambda rng, ds: '/api/ai/chat/stream', 0, admin=True,
+             body=lambda rng, ds: {'message': f'Write a tagline for product {rng.randint(1, 20)}'}),
+]
+
+
+def load_dataset(db_path):
+    """Id ranges and sample values used to build request parameters"""
+    conn = sqlite3.connect(db_path)
+    try:
+        def scalar(sql):
+            return conn.execute(sql).fetchone()[0] or 1
+
+        orders = scalar('SELECT MAX(id) FROM orders')
+        return {
+            'products': scalar('SELECT MAX(id) FROM products'),
+            'orders': orders,
+            'tickets': scalar('SELECT MAX(id) FROM support_tickets'),
+            'categories': [row[0] for row in conn.execute(
+                'SELECT DISTINCT category FROM products WHERE category IS NOT NULL ORDER BY category')] or ['نقاشی'],
+            # ~1000 order numbers spread evenly over the table (deterministic, unlike ORDER BY RANDOM())
+            'order_numbers': [row[0] for row in conn.execute(
+                'SELECT order_number FROM orders WHERE id % ? = 0 LIMIT 1000', (max(1, orders // 1000),))] or ['ORD-0'],
+        }
+    finally:
+        conn.close()
+
+
+class InProcessClient:
+    """Requests through the Flask test client (no network, no server)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPClient:
+    """Keep-alive HTTP/1.1 connection to a running server"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the keep-alive connection: reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Per-scenario latency statistics from (name, status, seconds) samples"""
+    by_name = {}
+    for name, status, seconds in samples:
+        by_name.setdefault(name, []).append((status, seconds))
+
+    report = {}
+    for name, entries in sorted(by_name.items()):
+        latencies = sorted(seconds for _, seconds in entries)
+        report[name] = {
+            'requests': len(entries),
+            'errors': sum(1 for status, _ in entries if status is None or status >= 400),
+            'rps': round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+        }
+    return report
+
+
+def run(make_client, scenarios, dataset, concurrency, total_requests=None, duration=None,
+        seed=42, admin_token=None, warmup=0):
+    """
+    Run the request mix on `concurrency` threads
+
+    Stops after total_requests requests or duration seconds (whichever is set).
+
+    Returns:
+        tuple: (samples as (name, status, seconds), elapsed seconds)
+    """
+    weights = [scenario.weight for scenario in scenarios]
+    admin_headers = {'Authorization': f'Bearer {admin_token}'} if admin_token else {}
+    counter = iter(range(total_requests)) if total_requests else None
+    counter_lock = threading.Lock()
+    samples = []
+    samples_lock = threading.Lock()
+    errors = []
+
+    def claim():
+        if counter is None:
+            return True
+        with counter_lock:
+            return next(counter, None) is not None
+
+    def worker(worker_id, deadline):
+        rng = random.Random(seed * 1000 + worker_id)
+        client = make_client()
+        local = []
+        for _ in range(warmup):
+            scenario = rng.choices(scenarios, weights)[0]
+            client.request(scenario.method, scenario.path(rng, dataset),
+                           scenario.body(rng, dataset) if scenario.body else None,
+                           admin_headers if scenario.admin else None)
+        while claim() and (deadline is None or time.perf_counter() < deadline):
+            scenario = rng.choices(scenarios, weights)[0]
+            path = scenario.path(rng, dataset)
+            body = scenario.body(rng, dataset) if scenario.body else None
+            started = time.perf_counter()
+            try:
+                status, _ = client.request(scenario.method, path, body, admin_headers if scenario.admin else None)
+            except Exception as e:
+                status = None
+                if len(errors) < 10:
+                    errors.append(f'{scenario.name} {path}: {e}')
+            local.append((scenario.name, status, time.perf_counter() - started))
+        with samples_lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    threads = [threading.Thread(target=worker, args=(worker_id, deadline)) for worker_id in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    for error in errors:
+        print(f'⚠️  {error}')
+    return samples, elapsed
+
+
+def print_report(report, elapsed, concurrency):
+    total = sum(stats['requests'] for stats in report.values())
+    print(f'\n{total:,} requests in {elapsed:.1f} s ({total / elapsed:.1f} req/s) with concurrency {concurrency}\n')
+    print(f'{"endpoint":<22} {"reqs":>7} {"errors":>6} {"rps":>8} {"mean":>9} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+    for name, stats in report.items():
+        print(f'{name:<22} {stats["requests"]:>7} {stats["errors"]:>6} {stats["rps"]:>8.1f} '
+              f'{stats["mean_ms"]:>9.2f} {stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} '
+              f'{stats["p99_ms"]:>9.2f} {stats["max_ms"]:>9.2f}')
+    print('(latencies in ms)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join('database', 'bench.db'),
+                        help='Dataset from generate_dataset.py (served in-process, or read for ids with --url)')
+    parser.add_argument('--url', help='Base URL of a running server; omit to run in-process')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, help='Total requests (default 2000 unless --duration is set)')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a request count')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per worker before measuring')
+    parser.add_argument('--only', help='Comma-separated scenario names (weight 0 scenarios get weight 1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--ai-stub', action='store_true',
+                        help='In-process: answer AI requests with the offline stub provider (AI_PROVIDER=stub)')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f'{args.db} not found; create it with benchmarks/generate_dataset.py')
+    if not args.requests and not args.duration:
+        args.requests = 2000
+
+    scenarios = [scenario for scenario in SCENARIOS if scenario.weight]
+    if args.only:
+        names = set(args.only.split(','))
+        unknown = names - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+        for scenario in scenarios:
+            scenario.weight = scenario.weight or 1
+
+    dataset = load_dataset(args.db)
+
+    if args.url:
+        def make_client():
+            return HTTPClient(args.url)
+        target = args.url
+    else:
+        if args.ai_stub:
+            os.environ['AI_PROVIDER'] = 'stub'
+        from backend import database
+        database.DB_PATH = os.path.abspath(args.db)
+        from backend.app import create_app
+        # Query budget tracing adds per-statement work that would skew timings
+        app = create_app({'INIT_DB': False, 'QUERY_BUDGET_MODE': 'off'})
+
+        def make_client():
+            return InProcessClient(app)
+        target = 'in-process'
+
+    status, body = make_client().request('POST', '/api/admin/login',
+                                         {'username': BENCH_ADMIN[0], 'password': BENCH_ADMIN[1]})
+    admin_token = body['data']['token'] if status == 200 and body else None
+    if admin_token is None:
+        print('⚠️  Admin login failed; admin scenarios will return 401')
+
+    print(f'🚀 {target}: {", ".join(scenario.name for scenario in scenarios)}')
+    samples, elapsed = run(make_client, scenarios, dataset, args.concurrency, args.requests, args.duration,
+                           args.seed, admin_token, args.warmup)
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed, args.concurrency)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'target': target,
+                'concurrency': args.concurrency,
+                'seed': args.seed,
+                'elapsed_seconds': round(elapsed, 3),
+                'endpoints': report
+            }, f, indent=2, ensure_ascii=False)
+        print(f'\n📄 Report written to {args.json_path}')
+
+
+if __name__ == '__main__':
+    main()
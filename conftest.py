@@ -0,0 +1,44 @@
+"""
+Shared setup for the pytest suites: a throwaway database, the offline stub
+AI provider (no API key or network needed) and a logged-in admin
+"""
+
+import os
+import tempfile
+
+import pytest
+
+os.environ.update(AI_PROVIDER='stub', AI_STUB_LATENCY='0', AI_STUB_TOKENS_PER_SECOND='0')
+
+import backend.database as database
+
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'test.db')
+
+# Script-style checks, run directly (test_server.py needs a running server)
+collect_ignore = ['test_server.py', 'test_imports.py']
+
+
+@pytest.fixture(scope='session', autouse=True)
+def app():
+    """The app, created once; creating it also sets up the database tables"""
+    from backend.app import create_app
+
+    return create_app({'TESTING': True})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def admin(app):
+    """The test admin and the headers of its session"""
+    from backend.models import Admin
+
+    admin_id = Admin.create('test-admin', 'test-password')
+    response = app.test_client().post('/api/admin/login', json={
+        'username': 'test-admin', 'password': 'test-password'
+    })
+    token = response.get_json()['data']['token']
+    return {'id': admin_id, 'username': 'test-admin', 'headers': {'Authorization': f'Bearer {token}'}}
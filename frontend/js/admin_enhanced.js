@@ -8,7 +8,8 @@ const ENHANCED_API_BASE = window.location.origin + '/api';
 
 // AI Assistant functionality
 const AIAssistant = {
-    conversationHistory: [],
+    // Server-side chat session; the server rebuilds (and summarises) the history
+    sessionId: null,
 
     init() {
         const aiSendBtn = document.getElementById('aiSendBtn');
@@ -36,6 +37,27 @@ const AIAssistant = {
         });
     },
 
+    async ensureSession() {
+        if (this.sessionId) return this.sessionId;
+        try {
+            const response = await fetch(`${ENHANCED_API_BASE}/ai/sessions`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${state.token}`
+                },
+                body: JSON.stringify({})
+            });
+            if (response.ok) {
+                const data = await response.json();
+                this.sessionId = data.session.id;
+            }
+        } catch (error) {
+            console.error('AI session error:', error);
+        }
+        return this.sessionId;
+    },
+
     async sendMessage() {
         const aiInput = document.getElementById('aiInput');
         const message = aiInput.value.trim();
@@ -46,6 +68,92 @@ const AIAssistant = {
         this.addMessage(message, 'user');
         aiInput.value = '';
 
+        // Show loading
+        const bubble = this.addMessage('Thinking...', 'assistant', true);
+
+        try {
+            await this.ensureSession();
+            const response = await fetch(`${ENHANCED_API_BASE}/ai/chat/stream`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${state.token}`
+                },
+                body: JSON.stringify({
+                    message: message,
+                    session_id: this.sessionId
+                })
+            });
+
+            // All streaming slots busy (or no stream support): use the regular endpoint
+            if (response.status === 503 || !response.body) {
+                bubble.remove();
+                return this.sendMessageBlocking(message);
+            }
+
+            if (!response.ok) {
+                const data = await response.json().catch(() => ({}));
+                bubble.remove();
+                this.addMessage(`Error: ${data.error || 'Failed to get response'}`, 'system');
+                return;
+            }
+
+            const paragraph = bubble.querySelector('p');
+            let text = '';
+            let failed = null;
+            await this.readEvents(response, (event, data) => {
+                if (event === 'delta') {
+                    if (!text) bubble.classList.remove('loading');
+                    text += data.text;
+                    paragraph.textContent = text;
+                    bubble.parentElement.scrollTop = bubble.parentElement.scrollHeight;
+                } else if (event === 'error') {
+                    failed = data.error;
+                }
+            });
+
+            if (failed) {
+                bubble.remove();
+                this.addMessage(`Error: ${failed}`, 'system');
+                return;
+            }
+
+            bubble.classList.remove('loading');
+        } catch (error) {
+            console.error('AI Chat error:', error);
+            bubble.remove();
+            this.addMessage('Failed to connect to AI assistant. Please try again.', 'system');
+        }
+    },
+
+    async readEvents(response, onEvent) {
+        // Minimal Server-Sent Events parser for a fetch() body (EventSource cannot POST)
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    },
+
+    async sendMessageBlocking(message) {
         // Show loading
         this.addMessage('Thinking...', 'assistant', true);
 
@@ -58,7 +166,7 @@ const AIAssistant = {
                 },
                 body: JSON.stringify({
                     message: message,
-                    history: this.conversationHistory
+                    session_id: this.sessionId
                 })
             });
 
@@ -73,10 +181,6 @@ const AIAssistant = {
 
             if (response.ok) {
                 this.addMessage(data.response, 'assistant');
-                this.conversationHistory.push(
-                    { role: 'user', content: message },
-                    { role: 'assistant', content: data.response }
-                );
             } else {
                 this.addMessage(`Error: ${data.error || 'Failed to get response'}`, 'system');
             }
@@ -98,6 +202,7 @@ const AIAssistant = {
 
         messages.appendChild(messageDiv);
         messages.scrollTop = messages.scrollHeight;
+        return messageDiv;
     }
 };
 
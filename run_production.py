@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+Production Server Runner
+Run this script to start the multi-process production server
+(see python run_production.py --help for options)
+"""
+
+from backend.server import main
+
+if __name__ == '__main__':
+    main()
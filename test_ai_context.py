@@ -0,0 +1,89 @@
+"""
+Tests for session chat context (backend/ai_context.py): history trimming and
+compaction of older turns into a running summary
+"""
+
+import pytest
+
+from backend.ai_context import ConversationContext, estimate_tokens, trim_history
+from backend.database import get_db
+
+TURN = 'words ' * 20
+
+
+@pytest.fixture
+def context():
+    context = ConversationContext()
+    context.configure(context_tokens=400, keep_ratio=0.5, summary_max_tokens=60)
+    return context
+
+
+def _session(context, admin, turns):
+    session = context.create_session(admin['id'])
+    with get_db() as conn:
+        conn.executemany('''
+            INSERT INTO ai_conversations (admin_id, message, response, session_id) VALUES (?, ?, ?, ?)
+        ''', [(admin['id'], f'question {n} {TURN}', f'answer {n} {TURN}', session['id']) for n in range(turns)])
+    return session['id']
+
+
+def test_trim_history_keeps_the_newest_messages():
+    history = [{'role': 'user' if n % 2 == 0 else 'assistant', 'content': f'{n} {TURN}'} for n in range(10)]
+
+    kept = trim_history(history, budget=100)
+
+    assert kept == history[-len(kept):]
+    assert 0 < len(kept) < len(history)
+    assert kept[0]['role'] == 'user'
+
+
+def test_short_session_is_sent_verbatim(context, admin):
+    session_id = _session(context, admin, 2)
+
+    built = context.build(session_id, admin['id'])
+
+    assert built['turns'] == 2
+    assert not built['summarized']
+    assert [message['role'] for message in built['history']] == ['user', 'assistant'] * 2
+    assert context.counters['compactions'] == 0
+
+
+def test_long_session_is_compacted(context, admin):
+    session_id = _session(context, admin, 12)
+
+    built = context.build(session_id, admin['id'])
+
+    assert built['summarized']
+    assert built['summary_tokens_used'] > 0
+    assert built['tokens'] <= 400
+    assert built['history'][0]['role'] == 'system'
+    # Newest turns are kept verbatim, within keep_ratio of the budget
+    assert built['history'][-2]['content'].startswith('question 11 ')
+    kept_tokens = sum(estimate_tokens(message['content']) for message in built['history'][1:])
+    assert kept_tokens <= 200
+    session = context.get_session(session_id)
+    assert session['summary'] and session['summary_upto']
+    assert context.counters['compactions'] == 1
+
+    # Within budget now: the next build reuses the summary and this process's cache
+    again = context.build(session_id, admin['id'])
+    assert again['history'] == built['history']
+    assert context.counters['compactions'] == 1
+    assert context.counters['cache_hits'] == 1
+
+
+def test_build_without_compaction_leaves_old_turns_out(context, admin):
+    session_id = _session(context, admin, 12)
+
+    built = context.build(session_id, admin['id'], compact=False)
+
+    assert not built['summarized']
+    assert 0 < built['turns'] < 12
+    assert built['tokens'] <= 400
+    assert context.get_session(session_id)['summary'] is None
+
+
+def test_session_of_another_admin_is_not_built(context, admin):
+    session_id = _session(context, admin, 1)
+
+    assert context.build(session_id, admin['id'] + 1000) is None
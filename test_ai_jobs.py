@@ -0,0 +1,92 @@
+"""
+Tests for background AI jobs (/api/ai/jobs): timeout and session validation,
+and following a job as Server-Sent Events
+"""
+
+import time
+
+import pytest
+
+import backend.routes.ai as ai_routes
+from backend.ai_context import ai_context
+from backend.ai_jobs import _job_events, ai_jobs
+from backend.ai_stream import AIStreamPool
+
+
+def _submit(client, admin, **body):
+    return client.post('/api/ai/jobs', headers=admin['headers'], json={'kind': 'chat', 'message': 'Hello', **body})
+
+
+def _wait(job_id, admin_id, seconds=10):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        job = ai_jobs.get(job_id, admin_id)
+        if job['finished_at']:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+@pytest.mark.parametrize('timeout', ['abc', -1, 0, 'nan', [5]])
+def test_invalid_timeout_is_rejected(client, admin, timeout):
+    response = _submit(client, admin, timeout=timeout)
+
+    assert response.status_code == 400
+    assert 'timeout' in response.get_json()['error']
+
+
+def test_timeout_is_capped_at_the_configured_limit(client, admin):
+    response = _submit(client, admin, timeout=1e9)
+
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert job['deadline'] - job['created_at'] <= ai_jobs.settings['timeout'] + 1
+    _wait(job['id'], admin['id'])
+
+
+def test_session_of_another_admin_is_not_found(client, admin):
+    session = ai_context.create_session(admin['id'] + 1000)
+
+    response = _submit(client, admin, session_id=session['id'])
+
+    assert response.status_code == 404
+
+
+def test_job_events_need_the_owners_session(admin):
+    session = ai_context.create_session(admin['id'])
+
+    with pytest.raises(ValueError, match='Session not found'):
+        _job_events('chat', {'message': 'Hi', 'session_id': session['id']}, True, admin['id'] + 1000)
+
+
+def test_stream_follows_the_job_to_the_end(client, admin):
+    job = _submit(client, admin).get_json()['job']
+
+    response = client.get(f"/api/ai/jobs/{job['id']}/stream", headers=admin['headers'])
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert 'event: status' in body
+    assert body.rstrip().split('\n\n')[-1].startswith('event: done')
+    assert ai_jobs.get(job['id'], admin['id'])['status'] == 'completed'
+
+
+def test_stream_is_refused_when_slots_are_taken(client, admin, monkeypatch):
+    job = _submit(client, admin).get_json()['job']
+    pool = AIStreamPool(workers=1)
+    monkeypatch.setattr(ai_routes, 'ai_streams', pool)
+    pool._acquire()
+
+    response = client.get(f"/api/ai/jobs/{job['id']}/stream", headers=admin['headers'])
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert f"/api/ai/jobs/{job['id']}" in response.get_json()['error']
+    _wait(job['id'], admin['id'])
+
+
+def test_stream_of_unknown_job_is_not_found(client, admin):
+    response = client.get('/api/ai/jobs/missing/stream', headers=admin['headers'])
+
+    assert response.status_code == 404
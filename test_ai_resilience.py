@@ -0,0 +1,166 @@
+"""
+Tests for AI provider retries and the circuit breaker (backend/ai_resilience.py)
+"""
+
+import time
+
+import pytest
+
+from backend.ai_providers import AIProviderError, AIProviderTimeout, StubProvider
+from backend.ai_resilience import AICircuitOpen, AIResilience, is_retryable
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+@pytest.fixture
+def resilience():
+    resilience = AIResilience()
+    resilience.configure(retry_attempts=3, retry_base_delay=0, retry_max_delay=0, total_timeout=0,
+                         breaker_failures=3, breaker_reset_seconds=0.2)
+    return resilience
+
+
+def _failing(times, error=None):
+    """fn for call()/stream() that fails `times` times, then answers 'ok'"""
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) <= times:
+            raise error or AIProviderError('unavailable', retryable=True)
+        return 'ok'
+    return fn, calls
+
+
+def _open(resilience):
+    fn, _ = _failing(10)
+    with pytest.raises(AIProviderError):
+        resilience.call(fn)
+    assert resilience.state == 'open'
+
+
+def test_retryable_errors():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(HTTPError(429))
+    assert is_retryable(HTTPError(503))
+    assert is_retryable(AIProviderError('x', retryable=True))
+    assert not is_retryable(HTTPError(400))
+    assert not is_retryable(AIProviderError('x'))
+
+
+def test_transient_errors_are_retried(resilience):
+    fn, calls = _failing(2)
+
+    assert resilience.call(fn) == 'ok'
+    assert len(calls) == 3
+    assert resilience.counters['retries'] == 2
+    assert resilience.state == 'closed'
+
+
+def test_request_errors_are_not_retried(resilience):
+    fn, calls = _failing(1, HTTPError(400))
+
+    with pytest.raises(HTTPError):
+        resilience.call(fn)
+    assert len(calls) == 1
+    assert resilience.state == 'closed'
+
+
+def test_breaker_opens_then_fails_fast(resilience):
+    _open(resilience)
+
+    fn, calls = _failing(0)
+    with pytest.raises(AICircuitOpen) as error:
+        resilience.call(fn)
+    assert calls == []
+    assert error.value.retry_after >= 1
+    assert resilience.counters['rejected'] == 1
+    assert resilience.counters['opened'] == 1
+
+
+def test_successful_probe_closes_the_breaker(resilience):
+    _open(resilience)
+    time.sleep(0.25)
+    assert resilience.state == 'half_open'
+
+    assert resilience.call(_failing(0)[0]) == 'ok'
+    assert resilience.state == 'closed'
+
+
+def test_failed_probe_reopens_the_breaker(resilience):
+    _open(resilience)
+    time.sleep(0.25)
+    resilience.configure(retry_attempts=1)
+
+    with pytest.raises(AIProviderError):
+        resilience.call(_failing(1)[0])
+    assert resilience.state == 'open'
+    assert resilience.counters['opened'] == 2
+
+
+def test_interrupted_probe_lets_the_next_call_probe(resilience):
+    _open(resilience)
+    time.sleep(0.25)
+
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        resilience.call(interrupted)
+
+    assert resilience.state == 'half_open'
+    assert resilience.call(_failing(0)[0]) == 'ok'
+
+
+def test_stream_retries_errors_raised_when_opening(resilience):
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise AIProviderError('refused', retryable=True)
+        return (event for event in [{'type': 'delta', 'text': 'hi'}])
+
+    assert list(resilience.stream(fn)) == [{'type': 'delta', 'text': 'hi'}]
+    assert len(calls) == 2
+
+
+def test_stream_is_not_retried_after_its_first_event(resilience):
+    provider = StubProvider(latency=0, tokens_per_second=0)
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        for event in provider.stream([{'role': 'user', 'content': 'Hi'}], 10):
+            yield event
+            raise AIProviderError('dropped', retryable=True)
+
+    events = resilience.stream(fn)
+    assert next(events)['type'] == 'delta'
+    with pytest.raises(AIProviderError):
+        next(events)
+    assert len(calls) == 1
+
+
+def test_total_timeout_bounds_all_attempts(resilience):
+    resilience.configure(total_timeout=0.3, breaker_failures=10)
+    provider = resilience.wrap(StubProvider(latency=5, tokens_per_second=0, read_timeout=60))
+
+    started = time.monotonic()
+    with pytest.raises(AIProviderTimeout):
+        provider.complete([{'role': 'user', 'content': 'Hi'}], 10)
+    assert time.monotonic() - started < 1
+    assert resilience.counters['retries'] == 0
+
+
+def test_attempts_get_the_time_left(resilience):
+    resilience.configure(total_timeout=30)
+    fn, calls = _failing(2)
+
+    resilience.call(fn)
+
+    assert all(0 < timeout <= 30 for timeout in calls)
+    assert calls == sorted(calls, reverse=True)
@@ -0,0 +1,76 @@
+"""
+Tests for the AI retrieval index (backend/ai_retrieval.py): queued content
+changes are indexed on sync, and passages that merely echo the query are skipped
+"""
+
+import pytest
+
+from backend.ai_retrieval import RetrievalIndex, tokenize
+from backend.database import get_db
+from backend.models import Product
+
+DESCRIPTION = 'Walnut jewellery box carved by hand with brass hinges and velvet lining'
+
+
+@pytest.fixture
+def index():
+    index = RetrievalIndex()
+    index.sync(force=True)
+    return index
+
+
+def _ids(results, source='product'):
+    return [result['id'] for result in results if result['source'] == source]
+
+
+def test_tokenize_drops_stopwords_numbers_and_unifies_letters():
+    assert tokenize('<b>The</b> box 2024 for كيك') == ['box', 'کیک']
+
+
+def test_new_products_are_indexed_on_sync(index):
+    product = Product.create('Zanjireh box', 10, description_en='Zanjireh pattern inlay')
+
+    assert index.sync(force=True) >= 1
+    results = index.search('zanjireh')
+    assert _ids(results) == [product]
+    assert results[0]['title'] == 'Zanjireh box'
+
+
+def test_changes_and_hidden_rows_are_synced(index):
+    product = Product.create('Firouzeh tray', 10, description_en='Firouzeh enamel')
+    index.sync(force=True)
+
+    with get_db() as conn:
+        conn.execute("UPDATE products SET description_en = 'Minakari enamel' WHERE id = ?", (product,))
+    index.sync(force=True)
+    assert _ids(index.search('minakari')) == [product]
+
+    with get_db() as conn:
+        conn.execute('UPDATE products SET is_available = 0 WHERE id = ?', (product,))
+    index.sync(force=True)
+    assert _ids(index.search('firouzeh minakari')) == []
+
+
+def test_sources_filter(index):
+    product = Product.create('Termeh cushion', 10, description_en='Termeh silk')
+    index.sync(force=True)
+
+    assert _ids(index.search('termeh', sources=['product'])) == [product]
+    assert index.search('termeh', sources=['shop_page']) == []
+
+
+def test_passages_echoing_the_query_are_skipped(index):
+    product = Product.create('Walnut box', 10, description_en=DESCRIPTION)
+    index.sync(force=True)
+
+    # Asking about the product's own text should not retrieve that text back
+    assert product not in _ids(index.search(f'Walnut box {DESCRIPTION}'))
+    assert product in _ids(index.search('walnut hinges'))
+
+
+def test_each_row_contributes_one_passage(index):
+    index.configure(passage_words=5)
+    product = Product.create('Khatam frame', 10, description_en=' '.join(['khatam inlay frame'] * 10))
+    index.sync(force=True)
+
+    assert _ids(index.search('khatam', k=5)) == [product]
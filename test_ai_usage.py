@@ -0,0 +1,70 @@
+"""
+Tests for AI token budgets (backend/ai_usage.py)
+"""
+
+import pytest
+
+from backend.ai_usage import AIBudgetExceeded, AIUsage, ai_usage
+
+
+@pytest.fixture
+def usage():
+    return AIUsage()
+
+
+def test_no_limits_never_refuse(usage):
+    usage.configure(daily_tokens=0, monthly_tokens=0, monthly_tokens_total=0)
+    usage.record(9001, 'chat', tokens=10 ** 9)
+
+    usage.check_budget(9001)
+
+
+def test_daily_budget_counts_pending_and_flushed_usage(usage):
+    usage.configure(daily_tokens=100, monthly_tokens=0, monthly_tokens_total=0)
+    usage.record(9002, 'chat', tokens=60)
+    usage.check_budget(9002)
+
+    assert usage.flush() == 1
+    usage.record(9002, 'seo', tokens=40)
+
+    assert usage.usage_for(9002)['daily'] == 100
+    with pytest.raises(AIBudgetExceeded) as error:
+        usage.check_budget(9002)
+    assert error.value.period == 'daily'
+    assert usage.rejections == 1
+    # Budgets are per admin
+    usage.check_budget(9003)
+
+
+def test_monthly_budget_is_checked_per_admin(usage):
+    usage.configure(daily_tokens=0, monthly_tokens=50, monthly_tokens_total=0)
+    usage.record(9004, 'chat', tokens=50)
+
+    with pytest.raises(AIBudgetExceeded) as error:
+        usage.check_budget(9004)
+    assert error.value.period == 'monthly'
+
+
+def test_site_wide_budget_counts_every_admin(usage):
+    base = usage.usage_for(9005)['monthly_total']
+    usage.configure(daily_tokens=0, monthly_tokens=0, monthly_tokens_total=base + 30)
+    usage.record(9005, 'chat', tokens=20)
+    usage.check_budget(9006)
+
+    usage.record(9006, 'chat', tokens=10)
+
+    with pytest.raises(AIBudgetExceeded) as error:
+        usage.check_budget(9007)
+    assert error.value.period == 'monthly_total'
+
+
+def test_exhausted_budget_refuses_ai_endpoints(client, admin, monkeypatch):
+    monkeypatch.setitem(ai_usage.settings, 'daily_tokens', 1)
+    ai_usage.record(admin['id'], 'chat', tokens=5)
+
+    for path, body in (('/api/ai/chat', {'message': 'Hi'}),
+                       ('/api/ai/chat/stream', {'message': 'Hi'}),
+                       ('/api/ai/jobs', {'kind': 'chat', 'message': 'Hi'})):
+        response = client.post(path, headers=admin['headers'], json=body)
+        assert response.status_code == 429, path
+        assert response.get_json()['budget_exceeded']
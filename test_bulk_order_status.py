@@ -0,0 +1,78 @@
+"""
+Tests for bulk order status updates (PATCH /api/shop/orders/bulk-status):
+stock is moved once per product across all orders, and only admins may call it
+"""
+
+import sqlite3
+
+import backend.database as database
+from backend.models import Order, Product
+
+
+def _order(*lines):
+    """Order for (product_id, quantity) lines"""
+    items = [{'product_id': product_id, 'product_name': 'p', 'quantity': quantity, 'price': 10}
+             for product_id, quantity in lines]
+    return Order.create('Customer', 'customer@example.com', items)['order_id']
+
+
+def _history(product_id):
+    with sqlite3.connect(database.DB_PATH) as conn:
+        return conn.execute('''
+            SELECT quantity_change, previous_quantity, new_quantity, change_type, created_by
+            FROM inventory_history WHERE product_id = ? ORDER BY id
+        ''', (product_id,)).fetchall()
+
+
+def test_stock_is_aggregated_per_product():
+    first = Product.create('a', 10, stock_quantity=10)
+    second = Product.create('b', 20, stock_quantity=5)
+    orders = [_order((first, 2), (second, 1)) for _ in range(3)]
+
+    results = Order.bulk_update_status(orders, 'processing', 'tester')
+
+    assert all(result['success'] for result in results)
+    assert Product.get_by_id(first)['stock_quantity'] == 4
+    assert Product.get_by_id(second)['stock_quantity'] == 2
+    # One history row per product, not per order
+    assert _history(first) == [(-6, 10, 4, 'sale', 'tester')]
+    assert _history(second) == [(-3, 5, 2, 'sale', 'tester')]
+
+    Order.bulk_update_status(orders, 'cancelled', 'tester')
+    assert Product.get_by_id(first)['stock_quantity'] == 10
+    assert _history(first)[-1] == (6, 4, 10, 'return', 'tester')
+
+
+def test_orders_beyond_remaining_stock_are_skipped():
+    product = Product.create('c', 10, stock_quantity=3)
+    orders = [_order((product, 2)), _order((product, 1)), _order((product, 1))]
+
+    results = Order.bulk_update_status(orders + [orders[0], 999999], 'processing')
+
+    assert [result['success'] for result in results] == [True, True, False, False]
+    assert results[-1]['order_id'] == 999999
+    assert Product.get_by_id(product)['stock_quantity'] == 0
+    assert Order.get_by_id(orders[2])['status'] == 'pending'
+
+
+def test_endpoint_requires_admin(client):
+    product = Product.create('d', 10, stock_quantity=5)
+    orders = [_order((product, 1))]
+
+    response = client.patch('/api/shop/orders/bulk-status', json={'order_ids': orders, 'status': 'processing'})
+
+    assert response.status_code == 401
+    assert Order.get_by_id(orders[0])['status'] == 'pending'
+
+
+def test_endpoint_records_the_session_admin(client, admin):
+    product = Product.create('e', 10, stock_quantity=5)
+    orders = [_order((product, 1)), _order((product, 1))]
+
+    response = client.patch('/api/shop/orders/bulk-status', headers=admin['headers'], json={
+        'order_ids': orders, 'status': 'processing', 'admin_user': 'someone-else'
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 2
+    assert _history(product) == [(-2, 5, 3, 'sale', admin['username'])]
@@ -0,0 +1,29 @@
+"""
+Tests for product image uploads (POST /api/shop/products/<id>/images)
+"""
+
+import io
+
+from backend.models import Product, ProductImage
+
+
+def _upload(client, product_id, data=b'not an image', headers=None):
+    return client.post(f'/api/shop/products/{product_id}/images', headers=headers,
+                       data={'image': (io.BytesIO(data), 'photo.jpg')})
+
+
+def test_upload_requires_admin(client):
+    product = Product.create('a', 10)
+
+    response = _upload(client, product)
+
+    assert response.status_code == 401
+    assert ProductImage.get_by_product(product) == []
+
+
+def test_upload_is_validated_for_admins(client, admin):
+    product = Product.create('b', 10)
+
+    assert _upload(client, 999999, headers=admin['headers']).status_code == 404
+    assert _upload(client, product, headers=admin['headers']).status_code == 400
+    assert _upload(client, product, b'x' * (11 * 1024 * 1024), headers=admin['headers']).status_code == 413
@@ -0,0 +1,55 @@
+"""
+Tests for reading SEO suggestions out of AI answers (backend/seo_batch.py)
+"""
+
+import json
+
+import pytest
+
+from backend.seo_batch import parse_suggestions, seo_page_key
+
+
+def test_fields_are_read_from_json_wrapped_in_text():
+    answer = 'Here you go:\n```json\n' + json.dumps({
+        'suggested_meta_title': 'Handmade rugs',
+        'Meta Description': 'Rugs woven by hand.',
+        'relevant_keywords': ['rug', 'handmade'],
+    }) + '\n```\nGood luck!'
+
+    assert parse_suggestions(answer) == {
+        'title': 'Handmade rugs',
+        'description': 'Rugs woven by hand.',
+        'keywords': 'rug, handmade',
+    }
+
+
+def test_long_fields_are_cut_to_meta_tag_lengths():
+    parsed = parse_suggestions(json.dumps({'title': 't' * 100, 'description': 'd' * 300, 'keywords': 'a, b'}))
+
+    assert len(parsed['title']) == 70
+    assert len(parsed['description']) == 200
+    assert parsed['keywords'] == 'a, b'
+
+
+def test_description_alone_is_enough():
+    assert parse_suggestions('{"meta_description": "Only this"}') == {
+        'title': None, 'description': 'Only this', 'keywords': None
+    }
+
+
+@pytest.mark.parametrize('answer', [
+    None,
+    '',
+    'No JSON in this answer',
+    '{not valid json}',
+    '{"keywords": ["only", "keywords"]}',
+    '{"title": ""}',
+])
+def test_unusable_answers_give_none(answer):
+    assert parse_suggestions(answer) is None
+
+
+def test_page_keys():
+    assert seo_page_key('product', 7) == 'product/7'
+    assert seo_page_key('shop_page', 'about') == 'shop/about'
+    assert seo_page_key('seo_page', 'home') == 'home'